@@ -0,0 +1,123 @@
+"""Batch mode throughput and memory against the mock Groq server.
+
+Generates JSONL prompt files of each --rows size, runs
+`python main.py batch` on them with the mock upstream, and reports
+rows/sec and the batch process's peak RSS. Peak memory should stay the
+same as the input grows.
+
+With --check-resume, the largest run is interrupted (SIGINT) halfway
+and started again. The combined output is then checked to have every
+row exactly once.
+
+    python benchmarks/batch_benchmark.py --rows 1000 10000 50000 --check-resume
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from load_test import ROOT, MemorySampler, git_revision
+from mock_groq import MockGroqServer, make_reply
+
+
+def write_input(path, rows):
+    with open(path, "w") as f:
+        for i in range(rows):
+            # Distinct prompts of varying length, so nothing is coalesced or cached
+            f.write(json.dumps({"id": i, "prompt": f"Question {i}: " + "how do token buckets refill? " * (1 + i % 8)}) + "\n")
+
+
+def run_batch(workdir, input_path, output_path, concurrency, upstream_url, interrupt_after=None):
+    """Run main.py batch; returns (seconds, peak RSS in MiB, exit code)"""
+    env = dict(os.environ, GROQ_BASE_URL=upstream_url, PYTHONUNBUFFERED="1")
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "main.py"), "batch", input_path, output_path,
+         "--concurrency", str(concurrency)],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    sampler = MemorySampler(proc.pid, interval=0.1)
+    try:
+        proc.wait(timeout=interrupt_after)
+    except subprocess.TimeoutExpired:
+        proc.send_signal(signal.SIGINT)
+        proc.wait()
+    elapsed = time.perf_counter() - start
+    return elapsed, sampler.stop(), proc.returncode
+
+
+def read_output(path):
+    lines = []
+    with open(path) as f:
+        for line in f:
+            lines.append(json.loads(line)["line"])
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.05, help="mock upstream latency in seconds")
+    parser.add_argument("--reply-tokens", type=int, default=50, help="mock reply length in words")
+    parser.add_argument("--check-resume", action="store_true", help="interrupt and resume the largest run")
+    args = parser.parse_args()
+
+    upstream = MockGroqServer(latency=args.latency, reply=make_reply(args.reply_tokens)).start()
+    workdir = tempfile.mkdtemp(prefix="chatbot-batch-")
+    with open(os.path.join(workdir, ".env"), "w") as f:
+        # Measure batch mode itself, not the client-side Groq rate limits
+        f.write("GroqAPIKey=test\nRequestsPerMinute=0\nTokensPerMinute=0\nLogLevel=WARNING\n")
+        f.write(f"MaxInflightRequests={args.concurrency}\n")
+
+    results = []
+    for rows in args.rows:
+        input_path = os.path.join(workdir, f"in-{rows}.jsonl")
+        output_path = os.path.join(workdir, f"out-{rows}.jsonl")
+        write_input(input_path, rows)
+        resume = args.check_resume and rows == max(args.rows)
+        interrupted_at = None
+        if resume:
+            # A first run estimates the duration; the second starts over and is stopped halfway
+            seconds, _, _ = run_batch(workdir, input_path, output_path, args.concurrency, upstream.base_url)
+            os.remove(output_path)
+            os.remove(output_path + ".checkpoint")
+            _, first_peak, code = run_batch(workdir, input_path, output_path, args.concurrency,
+                                            upstream.base_url, interrupt_after=seconds / 2)
+            interrupted_at = len(read_output(output_path))
+        seconds, peak, code = run_batch(workdir, input_path, output_path, args.concurrency, upstream.base_url)
+        lines = read_output(output_path)
+        result = {
+            "rows": rows,
+            "input_mb": round(os.path.getsize(input_path) / 1024 / 1024, 2),
+            "exit_code": code,
+            "output_rows": len(lines),
+            "seconds": round(seconds, 2),
+            "rows_per_sec": round((rows - (interrupted_at or 0)) / seconds, 1),
+            "peak_rss_mb": max(peak, first_peak) if resume else peak,
+        }
+        if resume:
+            result.update({
+                "rows_before_interrupt": interrupted_at,
+                "duplicates": len(lines) - len(set(lines)),
+                "missing": rows - len(set(lines)),
+            })
+        results.append(result)
+
+    print(json.dumps({
+        "revision": git_revision(),
+        "settings": {
+            "concurrency": args.concurrency,
+            "upstream_latency_s": args.latency,
+            "reply_tokens": args.reply_tokens,
+        },
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""Helpers shared by the benchmark scripts."""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(**settings):
+    """Import main.py in-process with the given .env settings and build the app.
+
+    main.py reads .env from the working directory at import time, so this
+    writes one into a scratch directory, imports from there and calls
+    create_app().
+    """
+    workdir = tempfile.mkdtemp(prefix="chatbot-bench-")
+    settings.setdefault("GroqAPIKey", "test")
+    with open(os.path.join(workdir, ".env"), "w") as f:
+        for key, value in settings.items():
+            f.write(f"{key}={value}\n")
+
+    os.chdir(workdir)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import main
+    main.create_app()
+    return main
@@ -0,0 +1,49 @@
+"""Cost of building the prompt as a session's history grows.
+
+Fills one in-memory session with 10 to 5000 messages of mixed length and
+times GroqChatBot.build_messages for it. With the token-budgeted context
+builder the per-request cost should stay flat, since only the newest
+ContextMaxMessages messages are ever looked at.
+
+    python benchmarks/context_benchmark.py
+"""
+import argparse
+import json
+import random
+import time
+
+from common import load_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = load_app(MaxMessagesPerSession=max(args.sizes), ConversationMemoryMB=1024)
+    rng = random.Random(0)
+    results = []
+
+    for size in args.sizes:
+        session_id = f"bench-{size}"
+        for i in range(size):
+            role = "user" if i % 2 == 0 else "assistant"
+            app.conversations.append(session_id, role, "word " * rng.randint(5, 400))
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            messages = app.chatbot.build_messages(session_id)
+        elapsed = time.perf_counter() - start
+
+        results.append({
+            "history_messages": size,
+            "context_messages": len(messages) - 1,
+            "us_per_build": round(elapsed / args.repeat * 1e6, 2),
+        })
+
+    print(json.dumps({"prompt_token_budget": app.PromptTokenBudget, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
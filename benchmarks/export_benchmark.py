@@ -0,0 +1,170 @@
+"""History export throughput and memory: GET /api/sessions/export on a large SQLite store.
+
+Fills a SQLite conversation database with each --messages count (split
+into sessions of --session-messages), starts main.py on it and streams
+the NDJSON export, plain and gzip-compressed. Reports messages/sec, MB/sec
+of NDJSON, the bytes on the wire, the server's RSS before and at its peak,
+and the latency of /healthz probes sent while the export runs, which
+stays low only if the export doesn't hold up the event loop. Peak RSS
+should stay the same as the store grows.
+
+    python benchmarks/export_benchmark.py --messages 100000 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import zlib
+
+from load_test import ROOT, MemorySampler, free_port, git_revision, percentile, rss_mb, start_app, stop_app
+from mock_groq import MockGroqServer
+
+TOKEN = "bench-export-token"
+
+
+def build_store(path, messages, session_messages):
+    """Write `messages` messages into a new conversation database at path"""
+    sys.path.insert(0, ROOT)
+    from main import SQLiteConversationStore
+    # The store creates the schema; rows go in directly, since append() trims per session
+    store = SQLiteConversationStore(path, max_messages=session_messages)
+    now = time.time()
+    sessions = (messages + session_messages - 1) // session_messages
+
+    def rows():
+        for i in range(messages):
+            session = f"bench-session-{i // session_messages:08d}"
+            role = "user" if i % 2 == 0 else "assistant"
+            content = f"Message {i}: how does a token bucket refill? " * (1 + i % 4)
+            yield session, role, content, now, len(content) // 4 + 5
+
+    store.db.execute("BEGIN")
+    store.db.executemany(
+        "INSERT INTO messages (session_id, role, content, timestamp, tokens) VALUES (?, ?, ?, ?, ?)", rows()
+    )
+    store.db.executemany(
+        "INSERT INTO sessions (session_id, last_active) VALUES (?, ?)",
+        ((f"bench-session-{s:08d}", now) for s in range(sessions))
+    )
+    store.db.execute("COMMIT")
+    store.db.close()
+
+
+class Prober:
+    """Times GET /healthz every interval seconds until stopped"""
+
+    def __init__(self, url, interval=0.05):
+        self.url = url
+        self.interval = interval
+        self.latencies = []
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(self.url, timeout=30) as response:
+                    response.read()
+                self.latencies.append(time.perf_counter() - start)
+            except OSError:
+                pass
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        return sorted(self.latencies)
+
+
+def export(base, compress):
+    """Stream the export; returns (lines, NDJSON bytes, wire bytes, transfer encoding)"""
+    headers = {"Authorization": f"Bearer {TOKEN}", "Accept-Encoding": "gzip" if compress else "identity"}
+    request = urllib.request.Request(f"{base}/api/sessions/export", headers=headers)
+    decompressor = zlib.decompressobj(31) if compress else None
+    lines = ndjson_bytes = wire_bytes = 0
+    with urllib.request.urlopen(request, timeout=600) as response:
+        encoding = response.headers.get("Transfer-Encoding")
+        while True:
+            block = response.read(64 * 1024)
+            if not block:
+                break
+            wire_bytes += len(block)
+            if decompressor is not None:
+                block = decompressor.decompress(block)
+            ndjson_bytes += len(block)
+            lines += block.count(b"\n")
+    return lines, ndjson_bytes, wire_bytes, encoding
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--session-messages", type=int, default=200, help="messages per session")
+    args = parser.parse_args()
+
+    upstream = MockGroqServer(latency=0.01).start()
+    workdir = tempfile.mkdtemp(prefix="chatbot-export-")
+    results = []
+    for messages in args.messages:
+        path = os.path.join(workdir, f"history-{messages}.db")
+        started = time.perf_counter()
+        build_store(path, messages, args.session_messages)
+        build_seconds = time.perf_counter() - started
+
+        port = free_port()
+        proc = start_app(upstream.base_url, port, {
+            "ConversationBackend": "sqlite",
+            "SQLitePath": path,
+            "MaxMessagesPerSession": args.session_messages,
+            "SessionIdleTTL": 86400,
+            "ExportToken": TOKEN,
+            "LogLevel": "WARNING",
+        })
+        base = f"http://127.0.0.1:{port}"
+        try:
+            time.sleep(1)
+            for compress in [False, True]:
+                rss_before = rss_mb(proc.pid)
+                sampler = MemorySampler(proc.pid, interval=0.1)
+                prober = Prober(f"{base}/healthz")
+                start = time.perf_counter()
+                lines, ndjson_bytes, wire_bytes, encoding = export(base, compress)
+                seconds = time.perf_counter() - start
+                probes = prober.stop()
+                peak = sampler.stop()
+                results.append({
+                    "messages": messages,
+                    "db_mb": round(os.path.getsize(path) / 1024 / 1024, 1),
+                    "gzip": compress,
+                    "exported_lines": lines,
+                    "transfer_encoding": encoding,
+                    "seconds": round(seconds, 2),
+                    "messages_per_sec": round(lines / seconds),
+                    "ndjson_mb_per_sec": round(ndjson_bytes / 1024 / 1024 / seconds, 1),
+                    "wire_mb": round(wire_bytes / 1024 / 1024, 1),
+                    "rss_before_mb": rss_before,
+                    "peak_rss_mb": peak,
+                    "healthz_probes": len(probes),
+                    "healthz_p99_ms": percentile(probes, 0.99),
+                    "healthz_max_ms": round(probes[-1] * 1000, 1) if probes else None,
+                    "build_seconds": round(build_seconds, 1),
+                })
+        finally:
+            stop_app(proc)
+        os.remove(path)
+
+    print(json.dumps({
+        "revision": git_revision(),
+        "settings": {"session_messages": args.session_messages},
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
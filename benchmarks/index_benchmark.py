@@ -0,0 +1,74 @@
+"""Requests/sec for the chat page: per-hit template rendering vs the cached page.
+
+"before" registers a route that renders the page the old way, calling
+render_template_string on the full template (styles and script inline)
+for every request. "after" is the real `/` route, which serves the page
+rendered once at startup, precompressed, with an ETag for revalidation.
+Requests go through Flask's test client, so this measures the app's own
+cost per hit without network effects.
+
+    python benchmarks/index_benchmark.py
+"""
+import argparse
+import json
+import time
+
+from common import load_app
+
+
+def measure(client, path, repeat, headers=None):
+    response = client.get(path, headers=headers or {})
+    size = len(response.data)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        client.get(path, headers=headers or {})
+    elapsed = time.perf_counter() - start
+    return {
+        "status": response.status_code,
+        "bytes": size,
+        "requests_per_sec": round(repeat / elapsed, 1),
+        "us_per_request": round(elapsed / repeat * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3000)
+    args = parser.parse_args()
+
+    app = load_app()
+    from flask import render_template_string # type: ignore
+
+    # The page as one template, the way it was served before
+    inline_template = (
+        app.HTML_TEMPLATE
+        .replace('<link href="{{ stylesheet_url }}" rel="stylesheet">', "<style>" + app.STYLESHEET + "</style>")
+        .replace('<script src="{{ script_url }}"></script>', "<script>" + app.CLIENT_SCRIPT + "</script>")
+    )
+
+    @app.app.route("/bench-before")
+    def before():
+        return render_template_string(
+            inline_template,
+            assistantname=app.Assistantname,
+            socketio_url=app.SOCKETIO_CDN,
+            fontawesome_url=app.FONTAWESOME_CDN,
+        )
+
+    client = app.app.test_client()
+    etag = client.get("/", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    results = {
+        "before_render_per_hit": measure(client, "/bench-before", args.repeat),
+        "after_identity": measure(client, "/", args.repeat),
+        "after_gzip": measure(client, "/", args.repeat, {"Accept-Encoding": "gzip"}),
+        "after_revalidated_304": measure(
+            client, "/", args.repeat, {"Accept-Encoding": "gzip", "If-None-Match": etag}
+        ),
+    }
+    if app.brotli is not None:
+        results["after_brotli"] = measure(client, "/", args.repeat, {"Accept-Encoding": "br"})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""Socket.IO load generator for the chatbot against the mock Groq server.
+
+Starts benchmarks/mock_groq.py in-process, launches main.py as a
+subprocess pointed at it, then opens N concurrent Socket.IO clients that
+each send a fixed number of `user_message` events back to back. Clients
+are green threads, so a single process can simulate thousands of users.
+
+For every concurrency level it reports throughput, p50/p95/p99 reply
+latency, time to first token (first `ai_response_chunk`), error counts,
+`server_busy` rejections (timed separately, since they are meant to be
+fast) and the server's resident memory before, during and after the run. The
+results are printed as JSON (and written to --output) so runs can be
+compared across changes to main.py.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/load_test.py --concurrency 1 10 100 1000 --output before.json
+"""
+# Green threads let one process hold thousands of client connections
+try:
+    import eventlet # type: ignore
+    eventlet.monkey_patch()
+except ImportError:
+    eventlet = None
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import socketio # type: ignore
+
+from mock_groq import LATENCY_DISTRIBUTIONS, REPLY, MockGroqServer, make_reply
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Replies main.py sends in place of an answer when a request fails
+ERROR_PREFIXES = ("❌", "⏰", "💳", "🔑")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def raise_fd_limit():
+    """Allow as many sockets as the hard limit permits (inherited by the app subprocess)"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def start_app(upstream_url, port, extra_env=None):
+    """Run main.py in a scratch directory with its own .env, returning the process"""
+    workdir = tempfile.mkdtemp(prefix="chatbot-load-")
+    settings = {
+        "GroqAPIKey": "test",
+        "Port": port,
+        "Host": "127.0.0.1",
+        "Debug": "false",
+        # Measure the server itself, not the client-side Groq rate limits
+        "RequestsPerMinute": 0,
+        "TokensPerMinute": 0,
+    }
+    settings.update(extra_env or {})
+    with open(os.path.join(workdir, ".env"), "w") as f:
+        for key, value in settings.items():
+            f.write(f"{key}={value}\n")
+
+    env = dict(os.environ, GROQ_BASE_URL=upstream_url, PYTHONUNBUFFERED="1")
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "main.py")],
+        cwd=workdir, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    stop_app(proc)
+    raise RuntimeError("app did not start listening in time")
+
+
+def stop_app(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    proc.wait(timeout=10)
+
+
+def rss_mb(pid):
+    """Resident memory of a process in MiB, or None where /proc is unavailable"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class MemorySampler:
+    """Samples a process's RSS in the background to find its peak during a run"""
+
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak = rss_mb(pid)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            rss = rss_mb(self.pid)
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        return self.peak
+
+
+def run_client(url, messages, delay, stats, client_id=0):
+    """Connect after `delay` seconds, then send messages one after another, waiting for each reply"""
+    client = socketio.Client(reconnection=False)
+    done = threading.Event()
+    current = {"start": 0.0, "first": None, "reply": "", "busy": False}
+
+    def on_chunk(data):
+        if current["first"] is None:
+            current["first"] = time.perf_counter()
+        current["reply"] += data["chunk"]
+
+    def on_response(data):
+        current["reply"] = data["message"]
+        done.set()
+
+    def on_busy(data):
+        current["busy"] = True
+        done.set()
+
+    client.on("ai_response_chunk", on_chunk)
+    client.on("server_busy", on_busy)
+    client.on("ai_response_done", lambda data: done.set())
+    client.on("ai_response", on_response)
+    time.sleep(delay)
+    try:
+        client.connect(url, transports=["websocket"])
+        for i in range(messages):
+            done.clear()
+            current.update(start=time.perf_counter(), first=None, reply="", busy=False)
+            # Distinct per client so single-flight doesn't merge the whole level into a few calls
+            client.emit("user_message", {"message": f"load test message {i} from client {client_id}"})
+            if not done.wait(120):
+                raise RuntimeError("timed out waiting for a reply")
+            finished = time.perf_counter()
+            if current["busy"]:
+                stats["busy"].append(finished - current["start"])
+                continue
+            stats["latencies"].append(finished - current["start"])
+            if current["first"] is not None:
+                stats["ttft"].append(current["first"] - current["start"])
+            if current["reply"].lstrip().startswith(ERROR_PREFIXES):
+                stats["error_replies"] += 1
+    except Exception as e:
+        stats["errors"].append(f"{type(e).__name__}: {e}")
+    finally:
+        client.disconnect()
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list, in milliseconds"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return round(sorted_values[index] * 1000, 1)
+
+
+def summarize(name, values):
+    values.sort()
+    return {
+        f"{name}_p50_ms": percentile(values, 0.50),
+        f"{name}_p95_ms": percentile(values, 0.95),
+        f"{name}_p99_ms": percentile(values, 0.99),
+        f"{name}_max_ms": percentile(values, 1.0),
+    }
+
+
+def run_level(url, concurrency, messages, upstream, app_pid, ramp=0.0):
+    stats = {"latencies": [], "ttft": [], "busy": [], "errors": [], "error_replies": 0}
+    threads = [
+        threading.Thread(target=run_client, args=(url, messages, ramp * i / concurrency, stats, i))
+        for i in range(concurrency)
+    ]
+    upstream_before = upstream.request_count
+    rss_before = rss_mb(app_pid)
+    sampler = MemorySampler(app_pid)
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    rss_peak = sampler.stop()
+    rss_after = rss_mb(app_pid)
+    upstream_requests = upstream.request_count - upstream_before
+
+    result = {
+        "concurrency": concurrency,
+        "messages": len(stats["latencies"]),
+        "failed_clients": len(stats["errors"]),
+        "errors": stats["errors"][:10],
+        "error_replies": stats["error_replies"],
+        "busy_rejections": len(stats["busy"]),
+        "seconds": round(elapsed, 3),
+        "messages_per_sec": round(len(stats["latencies"]) / elapsed, 2),
+        "upstream_requests": upstream_requests,
+        "upstream_qps": round(upstream_requests / elapsed, 2),
+    }
+    result.update(summarize("latency", stats["latencies"]))
+    result.update(summarize("ttft", stats["ttft"]))
+    result.update(summarize("busy", stats["busy"]))
+    result.update({
+        "server_rss_before_mb": rss_before,
+        "server_rss_peak_mb": rss_peak,
+        "server_rss_after_mb": rss_after,
+        "server_rss_growth_mb": round(rss_after - rss_before, 1) if rss_before and rss_after else None,
+    })
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--messages", type=int, default=5, help="messages per client")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which clients connect")
+    parser.add_argument("--latency", type=float, default=0.2, help="mean mock upstream latency in seconds")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--tokens-per-sec", type=float, default=0, help="mock generation speed (0 = instant)")
+    parser.add_argument("--reply-tokens", type=int, default=0, help="mock reply length in words")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of upstream requests that fail")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-inflight", type=int, default=16)
+    parser.add_argument("--no-stream", action="store_true", help="run the app with StreamResponses=false")
+    parser.add_argument("--admission", choices=("on", "off"), default="on",
+                        help="run the app with AdmissionControl on or off")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    upstream = MockGroqServer(
+        latency=args.latency,
+        latency_dist=args.latency_dist,
+        tokens_per_sec=args.tokens_per_sec,
+        reply=make_reply(args.reply_tokens) if args.reply_tokens else REPLY,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    ).start()
+    port = free_port()
+    app = start_app(upstream.base_url, port, {
+        "MaxInflightRequests": args.max_inflight,
+        "StreamResponses": "false" if args.no_stream else "true",
+        "AdmissionControl": "true" if args.admission == "on" else "false",
+    })
+    try:
+        results = [
+            run_level(f"http://127.0.0.1:{port}", n, args.messages, upstream, app.pid, args.ramp)
+            for n in args.concurrency
+        ]
+    finally:
+        stop_app(app)
+
+    report = {
+        "revision": git_revision(),
+        "settings": {
+            "messages_per_client": args.messages,
+            "ramp_s": args.ramp,
+            "upstream_latency_s": args.latency,
+            "latency_dist": args.latency_dist,
+            "tokens_per_sec": args.tokens_per_sec,
+            "reply_tokens": args.reply_tokens,
+            "error_rate": args.error_rate,
+            "max_inflight": args.max_inflight,
+            "stream": not args.no_stream,
+            "admission": args.admission,
+        },
+        "upstream_injected_errors": upstream.injected_error_count,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
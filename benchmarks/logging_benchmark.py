@@ -0,0 +1,116 @@
+"""Per-message logging overhead: synchronous prints vs the queued structured logger.
+
+Times, on the calling thread, the log output one chat message produces:
+the four print() calls the handlers used to make versus the log_event()
+calls that replaced them (JSON records handed to a background writer
+thread). Each is measured against two sinks: a line-buffered file, and
+a slow sink that stalls every write for --stall-us, like a congested
+terminal or log shipper. The queued logger is also shown with INFO
+sampling at 10%.
+
+    python benchmarks/logging_benchmark.py
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from common import load_app
+
+USER_ID = "Qu9C0XtOMPc3b1zCAAAA"
+USER_MESSAGE = "Can you explain how a token bucket rate limiter works in a few sentences?"
+AI_MESSAGE = "A token bucket holds up to N tokens and refills at a fixed rate. " * 4
+
+
+class SlowSink:
+    """File-like object whose writes block the writing thread"""
+
+    def __init__(self, stall, sleep):
+        self.stall = stall
+        self.sleep = sleep
+
+    def write(self, text):
+        self.sleep(self.stall)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def print_message(user_id, user_message, ai_message):
+    """The per-message prints the handlers made before structured logging"""
+    print(f'📨 Message from {user_id}: {user_message}')
+    print(f"📨 Processing message: {user_message[:50]}...")
+    print(f"🔄 Making streaming Groq API request...")
+    print(f"✅ Streamed response: {ai_message[:50]}...")
+
+
+def log_message(app, user_id, user_message, ai_message):
+    """The structured events that replaced them"""
+    app.log_event("message_received", session=user_id, content=user_message)
+    app.log_event("processing_message", app.logging.DEBUG, session=user_id, content=user_message)
+    app.log_event("upstream_request", app.logging.DEBUG, session=user_id, stream=True)
+    app.log_event("reply_complete", session=user_id, stream=True, content=ai_message)
+
+
+def time_per_message(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def wait_for_drain(app):
+    while not app.log_writer.queue.empty():
+        app.time.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5000)
+    parser.add_argument("--stall-us", type=float, default=200, help="delay per write for the slow sink")
+    args = parser.parse_args()
+
+    app = load_app(LogFormat="json", LogQueueSize=args.repeat * 4)
+    real_sleep = app.eventlet.patcher.original("time").sleep if app.eventlet else time.sleep
+    stdout = sys.stdout
+    results = []
+
+    log_file = tempfile.NamedTemporaryFile("w", buffering=1, suffix=".log", delete=False)
+    sinks = {"file": log_file, "slow": SlowSink(args.stall_us / 1e6, real_sleep)}
+    for sink_name, sink in sinks.items():
+        # Before: print() straight to stdout on the handler's thread
+        sys.stdout = sink
+        try:
+            before = time_per_message(lambda: print_message(USER_ID, USER_MESSAGE, AI_MESSAGE), args.repeat)
+        finally:
+            sys.stdout = stdout
+
+        # After: records are queued and written from the background thread
+        app.log_writer.handler.setStream(sink)
+        for sampling in [None, 0.1]:
+            app.log_handler.filters = []
+            if sampling is not None:
+                app.log_handler.addFilter(app.SamplingFilter({app.logging.INFO: sampling}))
+            dropped = app.log_handler.dropped
+            after = time_per_message(lambda: log_message(app, USER_ID, USER_MESSAGE, AI_MESSAGE), args.repeat)
+            wait_for_drain(app)
+            results.append({
+                "sink": sink_name,
+                "info_sampling": sampling if sampling is not None else 1.0,
+                "print_us_per_message": round(before, 2),
+                "structured_us_per_message": round(after, 2),
+                "speedup": round(before / after, 1),
+                "dropped_records": app.log_handler.dropped - dropped,
+            })
+        app.log_writer.handler.setStream(stdout)
+
+    log_file.close()
+    os.unlink(log_file.name)
+    print(json.dumps({"repeat": args.repeat, "stall_us": args.stall_us, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Minimal Groq-compatible HTTP stub for load tests and benchmarks.
+
+Serves POST /openai/v1/chat/completions with a canned reply after a
+configurable delay, in both regular and streaming (SSE) form, so the
+chatbot can be exercised without spending real API quota. With --max-rps
+it also answers 429 with a retry-after header once more than that many
+requests arrive within a second, like Groq's own rate limiter.
+
+The time to first byte can follow a fixed, uniform, exponential or
+lognormal distribution around --latency, tokens are generated at
+--tokens-per-sec (also for non-streaming replies), and --error-rate
+injects a random share of 429/500/503 responses.
+
+Run standalone:  python benchmarks/mock_groq.py --port 8001 --latency 0.2
+Then start the app with GROQ_BASE_URL=http://127.0.0.1:8001
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "This is a canned reply from the mock Groq server."
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+INJECTED_ERRORS = (429, 500, 503)
+
+
+def make_reply(tokens):
+    """A reply of roughly `tokens` words built by repeating the canned reply"""
+    words = REPLY.split(" ")
+    return " ".join(words[i % len(words)] for i in range(tokens))
+
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        # /openai/v1/models, used for connection warmup and keep-alive pings
+        payload = json.dumps({"object": "list", "data": [{"id": "mock", "object": "model"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.count_lock:
+            self.server.request_count += 1
+            retry_after = self.server.check_rate_limit()
+
+        if retry_after is not None:
+            self.send_rate_limited(retry_after)
+            return
+
+        if body.get("model") in self.server.failing_models:
+            self.send_error_response(503, "Model is overloaded")
+            return
+
+        injected = self.server.injected_error()
+        if injected == 429:
+            self.send_rate_limited(1.0)
+            return
+        if injected is not None:
+            self.send_error_response(injected, "Injected failure")
+            return
+
+        time.sleep(self.server.sample_latency())
+
+        if body.get("stream"):
+            self.send_stream(body)
+        else:
+            self.send_completion(body)
+
+    def send_error_response(self, status, message):
+        payload = json.dumps({"error": {"message": message, "type": "server_error"}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_rate_limited(self, retry_after):
+        payload = json.dumps({
+            "error": {"message": "Rate limit reached", "type": "rate_limit_exceeded", "code": "rate_limit_exceeded"}
+        }).encode()
+        self.send_response(429)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("retry-after", f"{retry_after:.2f}")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_completion(self, body):
+        # Non-streaming replies still take as long to generate as streamed ones
+        time.sleep(self.server.token_delay * len(self.server.reply.split(" ")))
+        payload = json.dumps({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.server.reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+        }).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up waiting (e.g. a cancelled generation)
+            pass
+
+    def send_stream(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        try:
+            for word in self.server.reply.split(" "):
+                chunk = {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "mock"),
+                    "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(self.server.token_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream early (e.g. a cancelled generation)
+            pass
+
+
+class MockGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.1, token_delay=0.0, reply=REPLY, max_rps=0, failing_models=(),
+                 latency_dist="fixed", tokens_per_sec=0, error_rate=0.0, seed=None):
+        super().__init__(("127.0.0.1", port), MockGroqHandler)
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_dist must be one of {LATENCY_DISTRIBUTIONS}")
+        self.latency = latency
+        self.latency_dist = latency_dist
+        # tokens_per_sec, when set, takes precedence over a raw per-chunk delay
+        self.token_delay = 1.0 / tokens_per_sec if tokens_per_sec else token_delay
+        self.reply = reply
+        self.max_rps = max_rps
+        self.failing_models = set(failing_models)
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.request_count = 0
+        self.rate_limited_count = 0
+        self.injected_error_count = 0
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.count_lock = threading.Lock()
+
+    def check_rate_limit(self):
+        """Return seconds until the next window if this request is over the limit (call under count_lock)"""
+        if not self.max_rps:
+            return None
+        now = time.monotonic()
+        if now - self.window_start >= 1.0:
+            self.window_start = now
+            self.window_count = 0
+        self.window_count += 1
+        if self.window_count <= self.max_rps:
+            return None
+        self.rate_limited_count += 1
+        return 1.0 - (now - self.window_start)
+
+    def sample_latency(self):
+        """Seconds before the first byte, drawn from the configured distribution with mean `latency`"""
+        if self.latency <= 0 or self.latency_dist == "fixed":
+            return max(self.latency, 0.0)
+        with self.count_lock:
+            if self.latency_dist == "uniform":
+                return self.random.uniform(0, 2 * self.latency)
+            if self.latency_dist == "exponential":
+                return self.random.expovariate(1.0 / self.latency)
+            # Lognormal with sigma 0.5 has a long right tail; mu is chosen to keep the mean at `latency`
+            sigma = 0.5
+            return self.random.lognormvariate(math.log(self.latency) - sigma ** 2 / 2, sigma)
+
+    def injected_error(self):
+        """An HTTP status to fail this request with, or None"""
+        if not self.error_rate:
+            return None
+        with self.count_lock:
+            if self.random.random() >= self.error_rate:
+                return None
+            self.injected_error_count += 1
+            return self.random.choice(INJECTED_ERRORS)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        """Serve from a daemon thread and return self"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds before the first byte")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed",
+                        help="distribution of the first-byte delay, with --latency as its mean")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--tokens-per-sec", type=float, default=0, help="generation speed (overrides --token-delay)")
+    parser.add_argument("--reply-tokens", type=int, default=0, help="reply length in words (default: canned reply)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failed with 429/500/503")
+    parser.add_argument("--max-rps", type=int, default=0, help="answer 429 past this many requests a second")
+    parser.add_argument("--fail-model", action="append", default=[], help="answer 503 for this model (repeatable)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for reproducible runs")
+    args = parser.parse_args()
+
+    server = MockGroqServer(args.port, args.latency, args.token_delay,
+                            reply=make_reply(args.reply_tokens) if args.reply_tokens else REPLY,
+                            max_rps=args.max_rps, failing_models=args.fail_model,
+                            latency_dist=args.latency_dist, tokens_per_sec=args.tokens_per_sec,
+                            error_rate=args.error_rate, seed=args.seed)
+    print(f"Mock Groq server listening on {server.base_url}")
+    server.serve_forever()
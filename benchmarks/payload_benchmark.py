@@ -0,0 +1,94 @@
+"""Request body construction cost: SDK serialization vs cached JSON fragments.
+
+Times building the chat completion body for a conversation with 1, 100
+and 10,000 history messages. "sdk" is what chat.completions.create did
+on every request: run the whole message list through the SDK's
+maybe_transform, then json.dumps it as httpx does ("json_only" is that
+last step alone). "cached" is PayloadBuilder: "cold" is the first
+request of a session, when every message is encoded once, and
+"next_turn" is a follow-up request where only the newest message is new.
+
+    python benchmarks/payload_benchmark.py
+"""
+import argparse
+import json
+import time
+
+from groq._utils import maybe_transform # type: ignore
+from groq.types.chat import completion_create_params # type: ignore
+
+from common import load_app
+
+PARAMS = {"model": "llama3-8b-8192", "max_tokens": 500, "temperature": 0.7}
+
+
+def make_history(app, size):
+    """System prompt plus `size` alternating user/assistant messages of a few sentences"""
+    messages = [{"role": "system", "content": app.chatbot.system_message}]
+    for i in range(size):
+        role = "user" if i % 2 == 0 else "assistant"
+        content = f"Message {i}: how does a token bucket rate limiter refill? " * 3
+        messages.append({"role": role, "content": content})
+    return messages
+
+
+def sdk_body(messages):
+    body = maybe_transform(dict(PARAMS, messages=messages), completion_create_params.CompletionCreateParams)
+    return json.dumps(body).encode()
+
+
+def time_us(func, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        func(i)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--budget", type=float, default=0.5, help="seconds of timing per measurement")
+    args = parser.parse_args()
+
+    app = load_app(PayloadCacheSize=max(args.sizes) * 2)
+    results = []
+    for size in args.sizes:
+        messages = make_history(app, size)
+        # Enough iterations for a stable mean without the 10k case taking minutes
+        once = time_us(lambda i: sdk_body(messages), 1)
+        repeat = max(3, int(args.budget * 1e6 / max(once, 1)))
+
+        sdk = time_us(lambda i: sdk_body(messages), repeat)
+        json_only = time_us(lambda i: json.dumps(dict(PARAMS, messages=messages)).encode(), repeat)
+
+        def cold(i):
+            app.PayloadBuilder(app.chatbot.system_message, max_fragments=size * 2).body(messages, PARAMS)
+
+        builder = app.PayloadBuilder(app.chatbot.system_message, max_fragments=size * 2 + repeat)
+        builder.body(messages, PARAMS)
+
+        def next_turn(i):
+            # A new question replaces the newest message, so exactly one fragment misses
+            messages[-1] = {"role": "user", "content": f"follow-up question {i}"}
+            builder.body(messages, PARAMS)
+
+        cold_us = time_us(cold, repeat)
+        next_turn_us = time_us(next_turn, repeat)
+        body = builder.body(messages, PARAMS)
+        assert json.loads(body) == dict(PARAMS, messages=messages)
+        results.append({
+            "history_messages": size,
+            "body_bytes": len(body),
+            "repeat": repeat,
+            "sdk_us": round(sdk, 2),
+            "json_only_us": round(json_only, 2),
+            "cached_cold_us": round(cold_us, 2),
+            "cached_next_turn_us": round(next_turn_us, 2),
+            "speedup_vs_sdk": round(sdk / next_turn_us, 1),
+        })
+
+    print(json.dumps({"params": PARAMS, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
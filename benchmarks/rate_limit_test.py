@@ -0,0 +1,98 @@
+"""Burst test of the upstream scheduler against a rate-limited mock Groq.
+
+The mock answers 429 (with retry-after) past --upstream-rps requests a
+second. A burst of clients all send at once; with the scheduler's retries
+and client-side budget every message should still get a real reply, and
+clients receive queue_status events while they wait.
+
+    python benchmarks/rate_limit_test.py --clients 20 --upstream-rps 5
+"""
+# Share load_test's green threads; patching must happen before anything else is imported
+try:
+    import eventlet # type: ignore
+    eventlet.monkey_patch()
+except ImportError:
+    eventlet = None
+
+import argparse
+import json
+import threading
+import time
+
+import socketio # type: ignore
+
+from load_test import free_port, start_app, stop_app
+from mock_groq import REPLY, MockGroqServer
+
+
+def run_client(url, results):
+    client = socketio.Client()
+    done = threading.Event()
+    result = {"status_events": 0, "reply": ""}
+
+    def on_status(data):
+        result["status_events"] += 1
+
+    def on_chunk(data):
+        result["reply"] += data["chunk"]
+
+    client.on("queue_status", on_status)
+    client.on("ai_response_chunk", on_chunk)
+    client.on("ai_response_done", lambda data: done.set())
+    start = time.perf_counter()
+    try:
+        client.connect(url, transports=["websocket"])
+        client.emit("user_message", {"message": f"burst message {id(result)}"})
+        result["completed"] = done.wait(120)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        client.disconnect()
+    result["seconds"] = time.perf_counter() - start
+    results.append(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--upstream-rps", type=int, default=5)
+    parser.add_argument("--rpm", type=int, default=0, help="client-side RequestsPerMinute budget (0 = rely on retries)")
+    args = parser.parse_args()
+
+    upstream = MockGroqServer(latency=0.05, max_rps=args.upstream_rps).start()
+    port = free_port()
+    app = start_app(upstream.base_url, port, {
+        "RequestsPerMinute": args.rpm,
+        "UpstreamMaxRetries": 8,
+        "MaxInflightRequests": args.clients,
+    })
+    results = []
+    try:
+        threads = [
+            threading.Thread(target=run_client, args=(f"http://127.0.0.1:{port}", results))
+            for _ in range(args.clients)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        stop_app(app)
+
+    ok = [r for r in results if r.get("completed") and r["reply"].strip() == REPLY]
+    print(json.dumps({
+        "clients": args.clients,
+        "upstream_rps_limit": args.upstream_rps,
+        "successful_replies": len(ok),
+        "failed": len(results) - len(ok),
+        "upstream_requests": upstream.request_count,
+        "upstream_429s": upstream.rate_limited_count,
+        "clients_with_status_events": sum(1 for r in results if r["status_events"]),
+        "seconds": round(elapsed, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Throughput vs worker count for the multi-process launcher.
+
+Runs main.py with Workers=1, 2, 4, ... behind its sticky proxy, with a
+fakeredis TCP server standing in for Redis as both the Socket.IO message
+queue and the shared conversation store, and drives each setup with the
+same Socket.IO load against the mock Groq server. Reports messages/sec
+per worker count and the scaling efficiency relative to one worker.
+Scaling is bounded by the number of CPU cores, which the report includes.
+
+    pip install -r benchmarks/requirements.txt fakeredis
+    python benchmarks/scaling_benchmark.py --workers 1 2 4 --clients 200
+"""
+# Share load_test's green threads; patching must happen before anything else is imported
+try:
+    import eventlet # type: ignore
+    eventlet.monkey_patch()
+except ImportError:
+    eventlet = None
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from load_test import free_port, raise_fd_limit, run_level, start_app, stop_app
+from mock_groq import MockGroqServer
+
+
+def wait_for_ports(ports, timeout=60):
+    deadline = time.time() + timeout
+    for port in ports:
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise RuntimeError(f"worker on port {port} did not start")
+                time.sleep(0.2)
+
+
+def start_redis_stand_in():
+    """A Redis-compatible server in its own process, or (None, None) without fakeredis"""
+    try:
+        import fakeredis # type: ignore # noqa: F401
+    except ImportError:
+        return None, None
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, "-c",
+        "import sys; from fakeredis import TcpFakeServer; "
+        "TcpFakeServer(('127.0.0.1', int(sys.argv[1])), server_type='redis').serve_forever()",
+        str(port),
+    ])
+    wait_for_ports([port])
+    return process, f"redis://127.0.0.1:{port}/0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=5, help="messages per client")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock upstream latency in seconds")
+    parser.add_argument("--tokens-per-sec", type=float, default=2000)
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    redis_process, redis_url = start_redis_stand_in()
+    if redis_url is None:
+        print("fakeredis is not installed; workers will run without a message queue and share SQLite")
+    upstream = MockGroqServer(latency=args.latency, tokens_per_sec=args.tokens_per_sec).start()
+
+    results = []
+    for workers in args.workers:
+        port = free_port()
+        settings = {"Workers": workers, "MaxInflightRequests": 64}
+        if redis_url is not None:
+            settings.update(MessageQueue=redis_url, ConversationBackend="redis", RedisURL=redis_url)
+        app = start_app(upstream.base_url, port, settings)
+        try:
+            if workers > 1:
+                wait_for_ports([port + 1 + index for index in range(workers)])
+            level = run_level(f"http://127.0.0.1:{port}", args.clients, args.messages, upstream, app.pid)
+        finally:
+            stop_app(app)
+        results.append({
+            "workers": workers,
+            "messages": level["messages"],
+            "failed_clients": level["failed_clients"],
+            "errors": level["errors"],
+            "messages_per_sec": level["messages_per_sec"],
+            "latency_p50_ms": level["latency_p50_ms"],
+            "latency_p99_ms": level["latency_p99_ms"],
+        })
+
+    if redis_process is not None:
+        redis_process.terminate()
+
+    baseline = results[0]["messages_per_sec"] / results[0]["workers"]
+    for result in results:
+        result["scaling_efficiency"] = round(result["messages_per_sec"] / (baseline * result["workers"]), 2)
+
+    print(json.dumps({
+        "cpu_count": os.cpu_count(),
+        "clients": args.clients,
+        "messages_per_client": args.messages,
+        "message_queue": "fakeredis" if redis_url is not None else None,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
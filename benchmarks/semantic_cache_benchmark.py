@@ -0,0 +1,72 @@
+"""Semantic cache lookup latency at 10k / 100k / 1M entries.
+
+Fills a SemanticCache with random unit vectors, then queries it with
+slightly perturbed copies of stored vectors (paraphrase stand-ins) and
+unrelated vectors. Reports mean and p99 lookup time and the hit rate for
+each index type, so the exact scan can be compared with the LSH index
+at large sizes. Needs numpy; 1M entries at 256 dimensions take ~1 GB.
+
+    python benchmarks/semantic_cache_benchmark.py --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import time
+
+import numpy as np # type: ignore
+
+from common import load_app
+
+
+def unit(rows):
+    return rows / np.linalg.norm(rows, axis=-1, keepdims=True)
+
+
+def run(app, index, size, queries, rng):
+    cache = app.SemanticCache(app.HashingEmbedder(), threshold=0.9, capacity=size, index=index)
+    dim = cache.embedder.dim
+
+    # Insert in blocks to keep the random matrix small
+    for start in range(0, size, 10000):
+        block = unit(rng.standard_normal((min(10000, size - start), dim)).astype(np.float32))
+        for i, vector in enumerate(block):
+            cache.add_vector(vector, start + i)
+
+    stored = cache.vectors[rng.integers(0, size, queries)]
+    paraphrases = unit(stored + 0.02 * rng.standard_normal(stored.shape).astype(np.float32))
+    unrelated = unit(rng.standard_normal((queries, dim)).astype(np.float32))
+
+    timings = []
+    hits = 0
+    for vector in np.concatenate([paraphrases, unrelated]):
+        start = time.perf_counter()
+        reply = cache.lookup_vector(vector)
+        timings.append(time.perf_counter() - start)
+        hits += reply is not None
+
+    timings.sort()
+    return {
+        "index": index,
+        "entries": size,
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+        "p99_ms": round(timings[int(0.99 * (len(timings) - 1))] * 1000, 3),
+        "paraphrase_hit_rate": round(hits / queries, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--indexes", nargs="+", default=["exact", "lsh"])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    app = load_app()
+    results = []
+    for size in args.sizes:
+        for index in args.indexes:
+            results.append(run(app, index, size, args.queries, np.random.default_rng(0)))
+    print(json.dumps({"results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Cold start: import cost, app construction and time until the server is ready.
+
+Measures, as the median of --repeat fresh interpreters:
+
+- `import main` under `python -X importtime`. Reports main's cumulative
+  import time and the slowest modules it pulls in, and whether the
+  import also works in a directory with no .env (no credentials).
+- `main.create_app()`, which loads eventlet, Flask, Socket.IO and the
+  Groq SDK and builds every component.
+- `python main.py` against the mock Groq server: time until /healthz
+  answers and until /readyz reports ready (connections warmed up, store
+  and upstream checked), plus the server's RSS at that point.
+
+The import time is checked against --import-budget-ms, and the import
+must not load any of the libraries create_app() defers; the script exits
+with status 1 if either check fails. --main points at another copy of
+main.py (e.g. `git show HEAD~1:main.py > /tmp/old/main.py`) to compare
+revisions.
+
+    python benchmarks/startup_benchmark.py --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from load_test import ROOT, free_port, git_revision, rss_mb, stop_app
+from mock_groq import MockGroqServer
+
+# Libraries create_app() imports; `import main` must not
+DEFERRED_MODULES = ("eventlet", "flask", "flask_socketio", "groq", "httpx")
+
+
+def scratch_dir(settings=None):
+    workdir = tempfile.mkdtemp(prefix="chatbot-startup-")
+    if settings is not None:
+        with open(os.path.join(workdir, ".env"), "w") as f:
+            for key, value in settings.items():
+                f.write(f"{key}={value}\n")
+    return workdir
+
+
+def measure_import(main_dir, settings=None):
+    """One `python -X importtime -c "import main"` run, with a .env of these settings if given"""
+    code = f"import sys; sys.path.insert(0, {main_dir!r}); import main"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=scratch_dir(settings), capture_output=True, text=True
+    )
+    # Each module is listed after everything it imported, indented one level deeper
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            rows.append((len(name) - len(name.lstrip()), name.strip(), int(cumulative) / 1000))
+        except ValueError:
+            continue
+    main_ms, children = None, {}
+    for index, (depth, name, ms) in enumerate(rows):
+        if name == "main":
+            main_ms = ms
+            for child_depth, child, child_ms in reversed(rows[:index]):
+                if child_depth <= depth:
+                    break
+                if child_depth == depth + 2:
+                    children[child] = child_ms
+    imported = {name for _, name, _ in rows}
+    return {
+        "ok": proc.returncode == 0,
+        "main_ms": main_ms,
+        "children": children,
+        "deferred_loaded": sorted(m for m in DEFERRED_MODULES if m in imported),
+    }
+
+
+def measure_create_app(main_dir):
+    """Seconds spent in create_app() in a fresh interpreter, or None if main.py has no factory"""
+    code = (
+        f"import sys, time; sys.path.insert(0, {main_dir!r}); import main\n"
+        "if not hasattr(main, 'create_app'): print('null'); sys.exit()\n"
+        "start = time.perf_counter(); main.create_app(); print(time.perf_counter() - start)"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=scratch_dir({"GroqAPIKey": "test", "LogLevel": "WARNING"}),
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    value = json.loads(proc.stdout.strip().splitlines()[-1])
+    return round(value * 1000, 1) if value is not None else None
+
+
+def get_status(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def measure_server(main_path, upstream_url, timeout=60):
+    """Seconds from starting main.py until /healthz answers and until /readyz says ready"""
+    port = free_port()
+    workdir = scratch_dir({
+        "GroqAPIKey": "test",
+        "Host": "127.0.0.1",
+        "Port": port,
+        "Debug": "false",
+        "LogLevel": "WARNING",
+    })
+    env = dict(os.environ, GROQ_BASE_URL=upstream_url, PYTHONUNBUFFERED="1")
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, main_path], cwd=workdir, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+    base = f"http://127.0.0.1:{port}"
+    listening = ready = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if listening is None:
+                # Revisions without /healthz answer 404, which still means the server is up
+                if get_status(f"{base}/healthz") is not None:
+                    listening = time.perf_counter() - start
+            else:
+                status = get_status(f"{base}/readyz")
+                if status == 200:
+                    ready = time.perf_counter() - start
+                    break
+                if status == 404:
+                    break
+            time.sleep(0.01)
+        rss = rss_mb(proc.pid)
+    finally:
+        stop_app(proc)
+    if listening is None:
+        raise RuntimeError("server did not start listening in time")
+    return {
+        "listening_ms": round(listening * 1000, 1),
+        "ready_ms": round(ready * 1000, 1) if ready is not None else None,
+        "rss_mb": rss,
+    }
+
+
+def median(values):
+    values = [v for v in values if v is not None]
+    return round(statistics.median(values), 1) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=150)
+    parser.add_argument("--top", type=int, default=10, help="slowest modules main imports to list")
+    parser.add_argument("--main", default=os.path.join(ROOT, "main.py"), help="main.py to measure")
+    args = parser.parse_args()
+
+    main_path = os.path.abspath(args.main)
+    main_dir = os.path.dirname(main_path)
+    upstream = MockGroqServer(latency=0.01).start()
+
+    without_env = measure_import(main_dir)
+    imports = [measure_import(main_dir, {"GroqAPIKey": "test"}) for _ in range(args.repeat)]
+    factory = [measure_create_app(main_dir) for _ in range(args.repeat)]
+    servers = [measure_server(main_path, upstream.base_url) for _ in range(args.repeat)]
+
+    import_ms = median([run["main_ms"] for run in imports])
+    slowest = sorted(imports[-1]["children"].items(), key=lambda item: item[1], reverse=True)[:args.top]
+    failures = []
+    if not without_env["ok"]:
+        failures.append("import main failed without a .env")
+    if import_ms is None or import_ms > args.import_budget_ms:
+        failures.append(f"import main took {import_ms} ms, budget {args.import_budget_ms} ms")
+    if imports[-1]["deferred_loaded"]:
+        failures.append(f"import main loaded {', '.join(imports[-1]['deferred_loaded'])}")
+
+    report = {
+        "revision": git_revision(),
+        "main": main_path,
+        "repeat": args.repeat,
+        "import": {
+            "imports_without_env": without_env["ok"],
+            "main_cumulative_ms": import_ms,
+            "budget_ms": args.import_budget_ms,
+            "deferred_modules_loaded": imports[-1]["deferred_loaded"],
+            "slowest_imports_ms": {name: round(ms, 1) for name, ms in slowest},
+        },
+        "create_app_ms": median(factory),
+        "server": {
+            "listening_ms": median([run["listening_ms"] for run in servers]),
+            "ready_ms": median([run["ready_ms"] for run in servers]),
+            "rss_mb": median([run["rss_mb"] for run in servers]),
+        },
+        "failures": failures,
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
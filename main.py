@@ -1,38 +1,89 @@
+import argparse
+import atexit
+import bisect
+import gzip
+import hashlib
+import importlib
+import json
 import os
+import random
+import re
+import secrets
+import signal
+import socket
+import sqlite3
+import subprocess
 import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from contextlib import closing
 from datetime import datetime
 import logging
+import logging.handlers
+from queue import Full, Queue
 from dotenv import dotenv_values # type: ignore
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configured by configure_logging() once settings are loaded
 logger = logging.getLogger(__name__)
 
-try:
-    from groq import Groq # type: ignore
-    from flask import Flask, render_template_string, request # type: ignore
-    from flask_socketio import SocketIO, emit # type: ignore
-except ImportError as e:
-    print(f"❌ Import error: {e}")
-    print("Please install required packages: pip install groq flask flask-socketio python-dotenv")
-    sys.exit(1)
+# eventlet, the Groq SDK, httpx, Flask and Flask-SocketIO take most of a second to
+# import, so they are loaded by create_app() instead of when this module is imported
+eventlet = None
+
+class StartupError(Exception):
+    """The server can't start with the current settings or installed packages"""
+
+def patch_stdlib():
+    """Import eventlet and patch the standard library for cooperative I/O, so a slow
+    Groq request only blocks its own green thread instead of the whole server"""
+    global eventlet
+    if eventlet is not None:
+        return
+    try:
+        import eventlet # type: ignore
+    except ImportError:
+        return
+    eventlet.monkey_patch()
+
+def unpatched(name):
+    """A standard library module as it is before eventlet.monkey_patch(), whether or not that has run"""
+    patcher = sys.modules.get("eventlet.patcher")
+    return patcher.original(name) if patcher is not None else importlib.import_module(name)
+
+def import_dependencies():
+    """Import the Groq SDK, httpx, Flask and Flask-SocketIO into this module"""
+    global httpx, APIConnectionError, APIError, APIStatusError, APITimeoutError, AuthenticationError
+    global Groq, RateLimitError, Stream, ChatCompletion, ChatCompletionChunk, PreparedGroq
+    global Flask, Response, abort, jsonify, request, send_from_directory
+    global SocketIO, emit, join_room, leave_room
+    try:
+        import httpx # type: ignore
+        from groq import APIConnectionError, APIError, APIStatusError, APITimeoutError, AuthenticationError, Groq, RateLimitError, Stream # type: ignore
+        from groq.types.chat import ChatCompletion # type: ignore
+        try:
+            from groq.types.chat import ChatCompletionChunk # type: ignore
+        except ImportError:
+            # Older SDKs define the chunk type outside groq.types
+            from groq.lib.chat_completion_chunk import ChatCompletionChunk # type: ignore
+        from flask import Flask, Response, abort, jsonify, request, send_from_directory # type: ignore
+        from flask_socketio import SocketIO, emit, join_room, leave_room # type: ignore
+    except ImportError as e:
+        raise StartupError(f"Import error: {e}\nPlease install required packages: "
+                           "pip install groq flask flask-socketio python-dotenv") from e
+    # The SDK class only exists once groq is imported
+    PreparedGroq = type("PreparedGroq", (PreparedBodyMixin, Groq), {"__doc__": PreparedBodyMixin.__doc__})
 
 # Load environment variables
 env_vars = dotenv_values(".env")
 
-app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
-
 # Get environment variables
 Username = env_vars.get("Username")
 Assistantname = env_vars.get("Assistantname")
+# Checked when the server starts; without it the app still builds but never reports ready
 GroqAPIKey = env_vars.get("GroqAPIKey")
 
-# Check if API key is loaded properly
-if not GroqAPIKey:
-    print("❌ GroqAPIKey not found in .env file")
-    sys.exit(1)
-
 if not Username:
     print("⚠ Username not found in .env file, using default")
     Username = "User"
@@ -41,868 +92,4997 @@ if not Assistantname:
     print("⚠ Assistantname not found in .env file, using default")
     Assistantname = "AI Assistant"
 
-# Store conversation history
-conversations = {}
-
-class GroqChatBot:
-    def __init__(self):
-        # Initialize Groq client
-        try:
-            self.client = Groq(api_key=GroqAPIKey)
-            print("✅ Groq API client initialized")
-        except Exception as e:
-            print(f"❌ Failed to initialize Groq client: {e}")
-            sys.exit(1)
-        
-        # System message template
-        self.system_message = f"""Hello, I am {Username}, You are a very accurate and advanced AI chatbot named {Assistantname} which also has real-time up-to-date information from the internet.
-*** Do not tell time until I ask, do not talk too much, just answer the question.***
-*** Reply in only English, even if the question is in Hindi, reply in English.***
-*** Do not provide notes in the output, just answer the question and never mention your training data. ***"""
-    
-    def get_ai_response(self, user_message, user_id):
-        try:
-            print(f"📨 Processing message: {user_message[:50]}...")
-            
-            # Add user message to history
-            if user_id not in conversations:
-                conversations[user_id] = []
-            
-            conversations[user_id].append({
-                "role": "user",
-                "content": user_message,
-                "timestamp": datetime.now().isoformat()
-            })
-            
-            # Prepare messages for Groq
-            messages = [
-                {"role": "system", "content": self.system_message}
-            ]
-            
-            # Add recent conversation history (limited for context)
-            recent_messages = conversations[user_id][-5:]  # Last 5 messages for context
-            for msg in recent_messages:
-                if msg["role"] in ["user", "assistant"]:
-                    messages.append({
-                        "role": msg["role"],
-                        "content": msg["content"]
-                    })
-            
-            print(f"🔄 Making Groq API request...")
-            
-            # Make API call to Groq
-            ai_message = self.make_groq_api_call(messages)
-            
-            print(f"✅ Received response: {ai_message[:50]}...")
-            
-            # Add AI response to history
-            conversations[user_id].append({
-                "role": "assistant",
-                "content": ai_message,
-                "timestamp": datetime.now().isoformat()
-            })
-            
-            return ai_message
-            
-        except Exception as e:
-            error_msg = str(e)
-            print(f"❌ Error: {error_msg}")
-            logger.error(f"Chatbot error: {error_msg}")
-            
-            if "rate" in error_msg.lower() or "limit" in error_msg.lower():
-                return "⏰ Rate limit exceeded. Please wait and try again."
-            elif "quota" in error_msg.lower():
-                return "💳 API quota exceeded. Please check your account."
-            elif "API key" in error_msg:
-                return "🔑 API key error. Please check your configuration."
-            else:
-                return f"❌ Sorry, there was an error: {error_msg}"
-    
-    def make_groq_api_call(self, messages):
-        """Make API call to Groq"""
-        try:
-            response = self.client.chat.completions.create(
-                model="llama3-8b-8192",  # Fast Groq model
-                messages=messages,
-                max_tokens=500,
-                temperature=0.7
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"❌ Groq API call failed: {e}")
-            raise e
-
-# Initialize chatbot
-print("🤖 Initializing Groq chatbot...")
-chatbot = GroqChatBot()
-
-# Modern HTML template with contemporary design
-HTML_TEMPLATE = '''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{{ assistantname }} - Advanced AI Chat</title>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/socket.io/4.0.1/socket.io.js"></script>
-    <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
-    <style>
-        :root {
-            --primary-gradient: linear-gradient(135deg, #667eea 0%, #764ba2 50%, #f093fb 100%);
-            --secondary-gradient: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
-            --dark-bg: #0f0f23;
-            --card-bg: rgba(255, 255, 255, 0.95);
-            --glass-bg: rgba(255, 255, 255, 0.1);
-            --text-primary: #2d3748;
-            --text-secondary: #718096;
-            --border-color: rgba(255, 255, 255, 0.2);
-            --success-color: #48bb78;
-            --error-color: #f56565;
-            --shadow-light: 0 20px 60px rgba(0, 0, 0, 0.1);
-            --shadow-heavy: 0 30px 80px rgba(0, 0, 0, 0.3);
-        }
-
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
+# Optional directory with local copies of socket.io.min.js and Font Awesome
+# (css/all.min.css plus webfonts/), used instead of the CDNs
+VendorDir = env_vars.get("VendorDir")
 
-        body {
-            font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background: var(--dark-bg);
-            background-image: 
-                radial-gradient(circle at 20% 50%, rgba(120, 119, 198, 0.3) 0%, transparent 50%),
-                radial-gradient(circle at 80% 20%, rgba(255, 119, 198, 0.3) 0%, transparent 50%),
-                radial-gradient(circle at 40% 80%, rgba(120, 219, 226, 0.3) 0%, transparent 50%);
-            min-height: 100vh;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            padding: 20px;
-            overflow: hidden;
-            animation: backgroundShift 20s ease-in-out infinite alternate;
-        }
+# Stream responses token by token unless explicitly disabled
+StreamResponses = (env_vars.get("StreamResponses") or "true").lower() not in ["0", "false", "no", "off"]
 
-        @keyframes backgroundShift {
-            0% {
-                background-position: 0% 0%, 100% 100%, 50% 50%;
-            }
-            100% {
-                background-position: 100% 100%, 0% 0%, 25% 75%;
-            }
-        }
+def read_int_setting(name, default, minimum=1):
+    """Read an integer from .env, falling back to the default if it is missing or invalid"""
+    value = env_vars.get(name)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = None
+    if number is None or number < minimum:
+        print(f"⚠ {name} must be an integer of at least {minimum}, using default {default}")
+        return default
+    return number
 
-        .chat-container {
-            background: var(--glass-bg);
-            backdrop-filter: blur(20px);
-            border: 1px solid var(--border-color);
-            border-radius: 24px;
-            box-shadow: var(--shadow-heavy);
-            width: 100%;
-            max-width: 900px;
-            height: 90vh;
-            display: flex;
-            flex-direction: column;
-            overflow: hidden;
-            position: relative;
-            animation: slideInUp 0.8s cubic-bezier(0.16, 1, 0.3, 1);
-        }
+# Maximum number of Groq requests in flight at once; extra messages wait for a free slot
+MaxInflightRequests = read_int_setting("MaxInflightRequests", 8)
 
-        @keyframes slideInUp {
-            from {
-                opacity: 0;
-                transform: translateY(60px);
-            }
-            to {
-                opacity: 1;
-                transform: translateY(0);
-            }
-        }
+Host = env_vars.get("Host") or "0.0.0.0"
+Port = read_int_setting("Port", 5000)
+Debug = (env_vars.get("Debug") or "true").lower() not in ["0", "false", "no", "off"]
 
-        .chat-header {
-            background: var(--primary-gradient);
-            padding: 25px 30px;
-            text-align: center;
-            position: relative;
-            overflow: hidden;
-        }
+# Multi-process mode: a supervisor on Port routes each Socket.IO session to one of
+# Workers processes listening on Port+1..Port+Workers. Workers are told their index
+# and port through the environment.
+Workers = read_int_setting("Workers", 1)
+WorkerID = os.environ.get("CHATBOT_WORKER_ID")
+WorkerPort = int(os.environ.get("CHATBOT_WORKER_PORT") or 0)
+# Socket.IO message queue shared by the workers, e.g. redis://localhost:6379/1
+MessageQueue = env_vars.get("MessageQueue")
+if Workers > 1 and not MessageQueue:
+    print("⚠ Workers > 1 without MessageQueue: emits only reach clients on the same worker")
 
-        .chat-header::before {
-            content: '';
-            position: absolute;
-            top: -50%;
-            left: -50%;
-            width: 200%;
-            height: 200%;
-            background: linear-gradient(45deg, transparent, rgba(255,255,255,0.1), transparent);
-            transform: rotate(45deg);
-            animation: shimmer 3s linear infinite;
-        }
+# Structured logging: JSON (or plain text) records written from a background thread
+LogFormat = (env_vars.get("LogFormat") or "json").lower()
+LogLevel = (env_vars.get("LogLevel") or "INFO").upper()
+# User messages and replies are only logged when explicitly enabled
+LogContent = (env_vars.get("LogContent") or "false").lower() not in ["0", "false", "no", "off"]
+LogQueueSize = read_int_setting("LogQueueSize", 10000)
 
-        @keyframes shimmer {
-            0% { transform: translateX(-100%) rotate(45deg); }
-            100% { transform: translateX(100%) rotate(45deg); }
-        }
+def read_log_sampling(value):
+    """Parse LogSampling, e.g. "DEBUG=0.01,INFO=0.1", into {level number: keep fraction}"""
+    rates = {}
+    for entry in (value or "").split(","):
+        if not entry.strip():
+            continue
+        level, _, rate = entry.partition("=")
+        level_number = logging.getLevelName(level.strip().upper())
+        try:
+            rate = float(rate)
+        except ValueError:
+            rate = None
+        if not isinstance(level_number, int) or rate is None or not 0 <= rate <= 1:
+            print(f"⚠ Ignoring LogSampling entry '{entry.strip()}' (expected LEVEL=fraction)")
+            continue
+        if level_number >= logging.WARNING:
+            print(f"⚠ LogSampling ignores {level.strip().upper()}; warnings and errors are always kept")
+            continue
+        rates[level_number] = rate
+    return rates
 
-        .chat-header-content {
-            position: relative;
-            z-index: 2;
-        }
+LogSampling = read_log_sampling(env_vars.get("LogSampling"))
 
-        .chat-header h1 {
-            font-size: 2rem;
-            font-weight: 700;
-            color: white;
-            margin-bottom: 8px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            gap: 12px;
-        }
+if LogFormat not in ["json", "text"]:
+    print(f"⚠ Unknown LogFormat '{LogFormat}', using json")
+    LogFormat = "json"
+if not isinstance(logging.getLevelName(LogLevel), int):
+    print(f"⚠ Unknown LogLevel '{LogLevel}', using INFO")
+    LogLevel = "INFO"
 
-        .ai-icon {
-            width: 40px;
-            height: 40px;
-            background: rgba(255,255,255,0.2);
-            border-radius: 12px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            animation: pulse 2s ease-in-out infinite;
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, event and any structured fields"""
+    
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage()
         }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
 
-        @keyframes pulse {
-            0%, 100% { transform: scale(1); }
-            50% { transform: scale(1.05); }
-        }
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = getattr(record, "fields", None) or {}
+        extra = " ".join(f"{key}={value}" for key, value in fields.items())
+        return f"{super().format(record)} {extra}".rstrip()
 
-        .status {
-            font-size: 0.95rem;
-            color: rgba(255,255,255,0.9);
-            font-weight: 500;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            gap: 8px;
-        }
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of records per level; unlisted levels and warnings and above always pass"""
+    
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self.random = random.Random()
+    
+    def filter(self, record):
+        rate = self.rates.get(record.levelno)
+        return rate is None or self.random.random() < rate
 
-        .status-indicator {
-            width: 8px;
-            height: 8px;
-            background: var(--success-color);
-            border-radius: 50%;
-            animation: statusPulse 2s ease-in-out infinite;
-        }
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread; drops them instead of blocking when the queue is full"""
+    
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+    
+    def prepare(self, record):
+        # Sole root handler, so the record is passed on as-is rather than copied;
+        # formatting happens on the writer thread
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
 
-        @keyframes statusPulse {
-            0%, 100% { opacity: 1; }
-            50% { opacity: 0.5; }
-        }
+class BackgroundLogWriter:
+    """Drains the log queue into the real handler from a dedicated OS thread"""
+    
+    def __init__(self, queue, handler):
+        self.queue = queue
+        self.handler = handler
+        # Log writes happen on a real OS thread so slow stdout never stalls the green threads
+        self.thread = unpatched("threading").Thread(target=self.run, name="log-writer", daemon=True)
+        self.thread.start()
+    
+    def run(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            try:
+                self.handler.handle(record)
+            except Exception:
+                self.handler.handleError(record)
+    
+    def stop(self):
+        """Flush what is queued, then stop the thread"""
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+        self.handler.flush()
 
-        .chat-messages {
-            flex: 1;
-            padding: 30px;
-            overflow-y: auto;
-            background: transparent;
-            scroll-behavior: smooth;
-        }
+def configure_logging():
+    # Thread and process names are never logged, and looking up the current
+    # thread is expensive under eventlet
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    # Records never show file/line, so skip the stack walk that finds the caller
+    logging._srcfile = None
+    
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LogFormat == "json" else TextFormatter("%(asctime)s %(levelname)s %(message)s"))
+    
+    log_queue = unpatched("queue").Queue(LogQueueSize)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    if LogSampling:
+        queue_handler.addFilter(SamplingFilter(LogSampling))
+    
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LogLevel)
+    # httpx logs every request at INFO; only show its chatter when debugging
+    if LogLevel != "DEBUG":
+        for name in ["httpx", "httpcore"]:
+            logging.getLogger(name).setLevel(logging.WARNING)
+    
+    writer = BackgroundLogWriter(log_queue, output)
+    atexit.register(writer.stop)
+    return queue_handler, writer
 
-        .message {
-            margin-bottom: 25px;
-            display: flex;
-            align-items: flex-end;
-            gap: 12px;
-            animation: messageSlide 0.5s cubic-bezier(0.16, 1, 0.3, 1);
-        }
+# Set up by setup_logging() when the server or supervisor starts
+log_handler = log_writer = None
 
-        @keyframes messageSlide {
-            from {
-                opacity: 0;
-                transform: translateY(20px);
-            }
-            to {
-                opacity: 1;
-                transform: translateY(0);
-            }
-        }
+def setup_logging():
+    global log_handler, log_writer
+    if log_writer is None:
+        log_handler, log_writer = configure_logging()
 
-        .message.user {
-            flex-direction: row-reverse;
-        }
+def log_event(event, level=logging.INFO, **fields):
+    """Log a structured event; `content` is replaced by its length unless LogContent is on"""
+    if not logger.isEnabledFor(level):
+        return
+    if "content" in fields and not LogContent:
+        fields["content_chars"] = len(fields.pop("content") or "")
+    logger.log(level, event, extra={"fields": fields})
 
-        .message-avatar {
-            width: 40px;
-            height: 40px;
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 1.2rem;
-            font-weight: 600;
-            flex-shrink: 0;
-        }
+# Conversation store limits
+MaxMessagesPerSession = read_int_setting("MaxMessagesPerSession", 200)
+SessionIdleTTL = read_int_setting("SessionIdleTTL", 3600)  # seconds
+# How long a conversation with no connected socket waits to be resumed before it is dropped
+SessionResumeTTL = read_int_setting("SessionResumeTTL", 1800)  # seconds
+HistoryPageSize = read_int_setting("HistoryPageSize", 50)
+# Messages a session can have waiting behind the reply in progress, and what to do past that:
+# reject_newest, drop_oldest (with a depth of 0 that is the reply in progress) or merge
+MessageQueueDepth = read_int_setting("MessageQueueDepth", 4, minimum=0)
+MessageShedPolicy = (env_vars.get("MessageShedPolicy") or "reject_newest").lower()
+if MessageShedPolicy not in ["reject_newest", "drop_oldest", "merge"]:
+    print(f"⚠ Unknown MessageShedPolicy '{MessageShedPolicy}', using reject_newest")
+    MessageShedPolicy = "reject_newest"
+ConversationMemoryMB = read_int_setting("ConversationMemoryMB", 64)
 
-        .message.ai .message-avatar {
-            background: var(--secondary-gradient);
-            color: white;
-        }
+# Where conversation history lives: "memory", "sqlite" or "redis"
+ConversationBackend = (env_vars.get("ConversationBackend") or "memory").lower()
+if Workers > 1 and ConversationBackend == "memory":
+    print("⚠ Workers > 1 needs a shared ConversationBackend (sqlite or redis), using sqlite")
+    ConversationBackend = "sqlite"
+SQLitePath = env_vars.get("SQLitePath") or "conversations.db"
+RedisURL = env_vars.get("RedisURL") or "redis://localhost:6379/0"
 
-        .message.user .message-avatar {
-            background: var(--primary-gradient);
-            color: white;
-        }
+# Prompt sizing: the model's context window, the most prompt tokens we spend
+# per request, and how many stored messages the context builder looks at
+ContextWindow = read_int_setting("ContextWindow", 8192)
+PromptTokenBudget = read_int_setting("PromptTokenBudget", 3000)
+ContextMaxMessages = read_int_setting("ContextMaxMessages", 100)
 
-        .message-bubble {
-            max-width: 70%;
-            position: relative;
-        }
+# Fold turns that age out of the prompt into a running summary
+SummarizeHistory = (env_vars.get("SummarizeHistory") or "true").lower() not in ["0", "false", "no", "off"]
+SummaryMinMessages = read_int_setting("SummaryMinMessages", 6)
+SummaryMaxTokens = read_int_setting("SummaryMaxTokens", 200)
 
-        .message-content {
-            padding: 16px 22px;
-            border-radius: 18px;
-            position: relative;
-            word-wrap: break-word;
-            line-height: 1.5;
-            font-size: 0.95rem;
-            backdrop-filter: blur(10px);
-            border: 1px solid rgba(255,255,255,0.1);
-        }
+# Response cache: "off", "deterministic" (only when temperature is 0) or "on"
+ResponseCacheMode = (env_vars.get("ResponseCache") or "off").lower()
+ResponseCacheSize = read_int_setting("ResponseCacheSize", 1000)
+ResponseCacheTTL = read_int_setting("ResponseCacheTTL", 3600)  # seconds
+ResponseCachePath = env_vars.get("ResponseCachePath")  # optional SQLite file for a second tier
 
-        .message.user .message-content {
-            background: var(--primary-gradient);
-            color: white;
-            border-bottom-right-radius: 6px;
-            box-shadow: 0 8px 32px rgba(102, 126, 234, 0.3);
-        }
+# Semantic cache for first-turn questions (needs numpy): "off" or "on"
+SemanticCacheMode = (env_vars.get("SemanticCache") or "off").lower()
+SemanticCacheSize = read_int_setting("SemanticCacheSize", 100000)
+SemanticCacheIndex = (env_vars.get("SemanticCacheIndex") or "exact").lower()  # "exact" or "lsh"
 
-        .message.ai .message-content {
-            background: var(--card-bg);
-            color: var(--text-primary);
-            border-bottom-left-radius: 6px;
-            box-shadow: var(--shadow-light);
-        }
+# Share one upstream call between identical requests that are in flight at the same time
+CoalesceRequests = (env_vars.get("CoalesceRequests") or "true").lower() not in ["0", "false", "no", "off"]
 
-        .message-time {
-            font-size: 0.75rem;
-            color: rgba(255,255,255,0.7);
-            margin-top: 6px;
-            text-align: right;
-        }
+# Groq rate limits enforced client-side (0 disables a limit) and retry policy
+RequestsPerMinute = read_int_setting("RequestsPerMinute", 30, minimum=0)
+TokensPerMinute = read_int_setting("TokensPerMinute", 30000, minimum=0)
+UpstreamMaxRetries = read_int_setting("UpstreamMaxRetries", 3, minimum=0)
+if WorkerID is not None and Workers > 1:
+    # Each worker enforces its share of the account-wide limits
+    RequestsPerMinute = -(-RequestsPerMinute // Workers)
+    TokensPerMinute = -(-TokensPerMinute // Workers)
 
-        .message.ai .message-time {
-            color: var(--text-secondary);
-            text-align: left;
-        }
+# Admission control: an adaptive limit on replies in progress (between AdmissionMinLimit and
+# MaxInflightRequests); excess messages wait at most AdmissionMaxWait seconds, or are turned
+# away at once while waits have been above AdmissionQueueTarget seconds for a while
+AdmissionControl = (env_vars.get("AdmissionControl") or "true").lower() not in ["0", "false", "no", "off"]
+AdmissionMinLimit = min(read_int_setting("AdmissionMinLimit", 2), MaxInflightRequests)
+try:
+    AdmissionMaxWait = float(env_vars.get("AdmissionMaxWait") or 2.0)
+    AdmissionQueueTarget = float(env_vars.get("AdmissionQueueTarget") or 0.5)
+except ValueError:
+    print("⚠ AdmissionMaxWait and AdmissionQueueTarget must be numbers, using defaults 2 and 0.5")
+    AdmissionMaxWait, AdmissionQueueTarget = 2.0, 0.5
 
-        .typing-indicator {
-            display: none;
-            padding: 20px 30px;
-            color: rgba(255,255,255,0.8);
-            font-style: italic;
-        }
+# Model routing: an optional JSON file replacing DEFAULT_MODEL_TABLE, and the
+# estimated prompt size above which a question goes to the "large" tier
+ModelsFile = env_vars.get("ModelsFile")
+HeavyQueryTokens = read_int_setting("HeavyQueryTokens", 300)
 
-        .typing-indicator.show {
-            display: flex;
-            align-items: center;
-            gap: 10px;
-        }
+# Upstream HTTP transport: connection pool, timeouts, warmup and keep-alive pings
+PoolSize = read_int_setting("PoolSize", 20)
+KeepAliveConnections = read_int_setting("KeepAliveConnections", 10, minimum=0)
+KeepAliveExpiry = read_int_setting("KeepAliveExpiry", 60)  # seconds an idle connection stays open
+ConnectTimeout = read_int_setting("ConnectTimeout", 5)  # seconds
+ReadTimeout = read_int_setting("ReadTimeout", 60)  # seconds
+WarmupConnections = read_int_setting("WarmupConnections", 2, minimum=0)
+KeepAlivePingInterval = read_int_setting("KeepAlivePingInterval", 30, minimum=0)  # seconds, 0 disables
+# Bearer token for GET /api/sessions/export, the NDJSON dump of every conversation; empty disables it
+ExportToken = env_vars.get("ExportToken") or ""
 
-        .typing-dots {
-            display: flex;
-            gap: 4px;
-        }
+# How often the readiness checks behind /readyz probe Groq and the conversation store
+HealthCheckInterval = read_int_setting("HealthCheckInterval", 30)  # seconds
+UseHTTP2 = (env_vars.get("HTTP2") or "false").lower() not in ["0", "false", "no", "off"]
 
-        .typing-dots span {
-            width: 8px;
-            height: 8px;
-            background: var(--secondary-gradient);
-            border-radius: 50%;
-            animation: typingDots 1.4s ease-in-out infinite both;
-        }
+# Serialized messages kept for building request bodies; each is encoded once and reused every turn
+PayloadCacheSize = read_int_setting("PayloadCacheSize", 10000)
 
-        .typing-dots span:nth-child(1) { animation-delay: -0.32s; }
-        .typing-dots span:nth-child(2) { animation-delay: -0.16s; }
+DEFAULT_MODEL_TABLE = [
+    {"name": "llama3-8b-8192", "tier": "fast", "max_tokens": 500, "temperature": 0.7, "timeout": 20},
+    {"name": "llama3-70b-8192", "tier": "large", "max_tokens": 1000, "temperature": 0.7, "timeout": 60}
+]
+try:
+    SemanticCacheThreshold = float(env_vars.get("SemanticCacheThreshold") or 0.9)
+except ValueError:
+    print("⚠ SemanticCacheThreshold must be a number, using default 0.9")
+    SemanticCacheThreshold = 0.9
 
-        @keyframes typingDots {
-            0%, 80%, 100% {
-                transform: scale(0);
-            }
-            40% {
-                transform: scale(1);
-            }
-        }
+# Approximate tokenizer: roughly four characters per token for English text,
+# plus a few tokens of chat-format framing per message
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
 
-        .chat-input-container {
-            padding: 25px 30px;
-            background: rgba(255,255,255,0.05);
-            backdrop-filter: blur(20px);
-            border-top: 1px solid var(--border-color);
-        }
+def count_tokens(text):
+    """Cheaply estimate the number of tokens a message's content takes"""
+    return len(text) // CHARS_PER_TOKEN + 1 + MESSAGE_OVERHEAD_TOKENS
 
-        .input-wrapper {
-            display: flex;
-            gap: 12px;
-            align-items: center;
-            background: var(--card-bg);
-            border-radius: 50px;
-            padding: 8px 8px 8px 24px;
-            box-shadow: var(--shadow-light);
-            border: 1px solid rgba(255,255,255,0.2);
-            transition: all 0.3s cubic-bezier(0.16, 1, 0.3, 1);
+class ChatMessage:
+    """A single stored message; slots and an epoch timestamp keep it compact"""
+    __slots__ = ("role", "content", "timestamp", "tokens", "seq")
+    
+    # Approximate per-message overhead on top of the content string
+    OVERHEAD_BYTES = 120
+    
+    def __init__(self, role, content, timestamp=None, tokens=None, seq=None):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        # Token count is computed once and stored with the message
+        self.tokens = tokens if tokens is not None else count_tokens(content)
+        # Position in the session's history, increasing; used as the history cursor
+        self.seq = seq
+    
+    @property
+    def size(self):
+        return self.OVERHEAD_BYTES + sys.getsizeof(self.content)
+    
+    def to_dict(self):
+        return {
+            "seq": self.seq,
+            "role": self.role,
+            "content": self.content,
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat()
         }
 
-        .input-wrapper:focus-within {
-            box-shadow: 0 0 0 2px rgba(102, 126, 234, 0.3), var(--shadow-light);
-            border-color: rgba(102, 126, 234, 0.5);
-        }
+class ConversationSession:
+    __slots__ = ("messages", "size", "last_active", "appended")
+    
+    def __init__(self, max_messages):
+        self.messages = deque(maxlen=max_messages)
+        self.size = 0
+        self.last_active = time.time()
+        self.appended = 0
 
-        #messageInput {
-            flex: 1;
-            border: none;
-            outline: none;
-            font-size: 1rem;
-            background: transparent;
-            color: var(--text-primary);
-            padding: 12px 0;
-        }
+class ConversationStore:
+    """Interface shared by the conversation history backends"""
+    
+    def append(self, session_id, role, content):
+        """Store a message and return it as a ChatMessage"""
+        raise NotImplementedError
+    
+    def recent(self, session_id, limit):
+        """Return up to limit of the session's most recent messages, oldest first"""
+        raise NotImplementedError
+    
+    def page(self, session_id, before=None, after=None, limit=50):
+        """Return up to limit messages with seq below `before` (the newest such) or above
+        `after` (the oldest such), oldest first, each with its seq set"""
+        raise NotImplementedError
+    
+    def last_seq(self, session_id):
+        """Seq of the session's newest message, or 0 if it has none"""
+        raise NotImplementedError
+    
+    def session_ids(self):
+        """Iterate over the ids of every stored session, without holding them all at once
+        where the backend allows"""
+        raise NotImplementedError
+    
+    def remove(self, session_id):
+        """Drop a session and all its messages"""
+        raise NotImplementedError
+    
+    def evict_idle(self):
+        """Drop every session that has been idle for longer than the idle TTL"""
+        raise NotImplementedError
+    
+    def stats(self):
+        """Return a dict with at least sessions, messages and approx_bytes"""
+        raise NotImplementedError
+    
+    def flush(self):
+        """Write out any buffered messages"""
+    
+    def ping(self):
+        """Raise if the backend can't be reached (the readiness check)"""
 
-        #messageInput::placeholder {
-            color: var(--text-secondary);
-        }
+class MemoryConversationStore(ConversationStore):
+    """Bounded in-memory conversation history.
+    
+    Each session keeps at most max_messages messages. Sessions idle for longer
+    than idle_ttl seconds are dropped, and when the total size passes
+    max_bytes the least recently used sessions are evicted whole.
+    """
+    
+    # Minimum seconds between idle sweeps triggered from append()
+    SWEEP_INTERVAL = 30
+    
+    def __init__(self, max_messages=200, idle_ttl=3600, max_bytes=64 * 1024 * 1024):
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.sessions = OrderedDict()
+        self.total_bytes = 0
+        self.evicted_sessions = 0
+        self.lock = threading.Lock()
+        self.last_sweep = time.time()
+    
+    def append(self, session_id, role, content):
+        """Store a message, evicting old messages and sessions as needed"""
+        message = ChatMessage(role, content)
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = ConversationSession(self.max_messages)
+            else:
+                self.sessions.move_to_end(session_id)
+            
+            # A full deque drops its oldest message on append
+            if len(session.messages) == session.messages.maxlen:
+                dropped = session.messages[0].size
+                session.size -= dropped
+                self.total_bytes -= dropped
+            
+            session.appended += 1
+            message.seq = session.appended
+            session.messages.append(message)
+            session.size += message.size
+            session.last_active = message.timestamp
+            self.total_bytes += message.size
+            
+            self._enforce_budget(keep=session_id)
+            if message.timestamp - self.last_sweep > self.SWEEP_INTERVAL:
+                self._evict_idle(message.timestamp)
+        return message
+    
+    def recent(self, session_id, limit):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return []
+            self.sessions.move_to_end(session_id)
+            session.last_active = time.time()
+            count = min(limit, len(session.messages))
+            return [session.messages[i] for i in range(len(session.messages) - count, len(session.messages))]
+    
+    def page(self, session_id, before=None, after=None, limit=50):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return []
+            messages = list(session.messages)
+        if after is not None:
+            return [m for m in messages if m.seq > after][:limit]
+        if before is not None:
+            messages = [m for m in messages if m.seq < before]
+        return messages[-limit:]
+    
+    def last_seq(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            return session.appended if session is not None else 0
+    
+    def session_ids(self):
+        # The ids are bounded by max_bytes anyway; the messages are paged separately
+        with self.lock:
+            ids = list(self.sessions)
+        return iter(ids)
+    
+    def remove(self, session_id):
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+            if session is not None:
+                self.total_bytes -= session.size
+    
+    def evict_idle(self):
+        with self.lock:
+            self._evict_idle(time.time())
+    
+    def stats(self):
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "messages": sum(len(session.messages) for session in self.sessions.values()),
+                "approx_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "evicted_sessions": self.evicted_sessions
+            }
+    
+    def _evict_idle(self, now):
+        self.last_sweep = now
+        cutoff = now - self.idle_ttl
+        # Sessions are kept in least-recently-used order, so stop at the first active one
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.last_active >= cutoff:
+                break
+            self.sessions.popitem(last=False)
+            self.total_bytes -= session.size
+            self.evicted_sessions += 1
+    
+    def _enforce_budget(self, keep):
+        while self.total_bytes > self.max_bytes and len(self.sessions) > 1:
+            session_id, session = next(iter(self.sessions.items()))
+            if session_id == keep:
+                break
+            self.sessions.popitem(last=False)
+            self.total_bytes -= session.size
+            self.evicted_sessions += 1
 
-        .action-buttons {
-            display: flex;
-            gap: 8px;
+class SQLiteConversationStore(ConversationStore):
+    """Conversation history in a WAL-mode SQLite database.
+    
+    Appends are buffered and written in one transaction once batch_size
+    messages are pending or flush_interval seconds have passed; reads flush
+    first and use the (session_id, id) index so they only touch recent rows.
+    Several worker processes can share the same database file.
+    """
+    
+    def __init__(self, path, max_messages=200, idle_ttl=3600, batch_size=32, flush_interval=0.5):
+        self.path = path
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.last_flush = time.time()
+        self.last_sweep = time.time()
+        self.lock = threading.Lock()
+        
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                tokens INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id);
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                last_active REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active);
+        """)
+        # Databases created before token counts were stored get the column added
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(messages)")]
+        if "tokens" not in columns:
+            self.db.execute("ALTER TABLE messages ADD COLUMN tokens INTEGER")
+        atexit.register(self.flush)
+    
+    def append(self, session_id, role, content):
+        message = ChatMessage(role, content)
+        with self.lock:
+            self.pending.append((session_id, message))
+            if len(self.pending) >= self.batch_size or message.timestamp - self.last_flush > self.flush_interval:
+                self._flush()
+        if message.timestamp - self.last_sweep > MemoryConversationStore.SWEEP_INTERVAL:
+            self.evict_idle()
+        return message
+    
+    def recent(self, session_id, limit):
+        with self.lock:
+            self._flush()
+            rows = self.db.execute(
+                "SELECT role, content, timestamp, tokens FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+        return [ChatMessage(*row) for row in reversed(rows)]
+    
+    def page(self, session_id, before=None, after=None, limit=50):
+        # Row ids increase across the whole table, so they serve as each session's seq
+        with self.lock:
+            self._flush()
+            if after is not None:
+                rows = self.db.execute(
+                    "SELECT role, content, timestamp, tokens, id FROM messages "
+                    "WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?",
+                    (session_id, after, limit)
+                ).fetchall()
+                return [ChatMessage(*row) for row in rows]
+            rows = self.db.execute(
+                "SELECT role, content, timestamp, tokens, id FROM messages "
+                "WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (session_id, before if before is not None else sys.maxsize, limit)
+            ).fetchall()
+        return [ChatMessage(*row) for row in reversed(rows)]
+    
+    def last_seq(self, session_id):
+        with self.lock:
+            self._flush()
+            seq, = self.db.execute("SELECT MAX(id) FROM messages WHERE session_id = ?", (session_id,)).fetchone()
+        return seq or 0
+    
+    def session_ids(self, batch_size=500):
+        # Keyset pages, so no cursor (or the lock) stays open while the caller works
+        last = ""
+        while True:
+            with self.lock:
+                self._flush()
+                rows = self.db.execute(
+                    "SELECT session_id FROM sessions WHERE session_id > ? ORDER BY session_id LIMIT ?",
+                    (last, batch_size)
+                ).fetchall()
+            for session_id, in rows:
+                yield session_id
+            if len(rows) < batch_size:
+                return
+            last = rows[-1][0]
+    
+    def remove(self, session_id):
+        with self.lock:
+            self._flush()
+            self.db.execute("BEGIN")
+            self.db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self.db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self.db.execute("COMMIT")
+    
+    def evict_idle(self):
+        self.last_sweep = time.time()
+        cutoff = self.last_sweep - self.idle_ttl
+        with self.lock:
+            self._flush()
+            self.db.execute("BEGIN")
+            self.db.execute(
+                "DELETE FROM messages WHERE session_id IN (SELECT session_id FROM sessions WHERE last_active < ?)",
+                (cutoff,)
+            )
+            self.db.execute("DELETE FROM sessions WHERE last_active < ?", (cutoff,))
+            self.db.execute("COMMIT")
+    
+    def stats(self):
+        with self.lock:
+            self._flush()
+            sessions, = self.db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            messages, = self.db.execute("SELECT COUNT(*) FROM messages").fetchone()
+            page_count, = self.db.execute("PRAGMA page_count").fetchone()
+            page_size, = self.db.execute("PRAGMA page_size").fetchone()
+        return {
+            "sessions": sessions,
+            "messages": messages,
+            "approx_bytes": page_count * page_size
         }
+    
+    def flush(self):
+        with self.lock:
+            self._flush()
+    
+    def ping(self):
+        with self.lock:
+            self.db.execute("SELECT 1").fetchone()
+    
+    def _flush(self):
+        self.last_flush = time.time()
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        
+        last_active = {}
+        for session_id, message in pending:
+            last_active[session_id] = message.timestamp
+        
+        self.db.execute("BEGIN")
+        self.db.executemany(
+            "INSERT INTO messages (session_id, role, content, timestamp, tokens) VALUES (?, ?, ?, ?, ?)",
+            [(session_id, m.role, m.content, m.timestamp, m.tokens) for session_id, m in pending]
+        )
+        self.db.executemany(
+            "INSERT INTO sessions (session_id, last_active) VALUES (?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET last_active = excluded.last_active",
+            list(last_active.items())
+        )
+        # Keep only the newest max_messages rows of each session that grew
+        for session_id in last_active:
+            self.db.execute(
+                "DELETE FROM messages WHERE session_id = ? AND id <= "
+                "(SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (session_id, session_id, self.max_messages)
+            )
+        self.db.execute("COMMIT")
 
-        .btn {
-            border: none;
-            border-radius: 50px;
-            cursor: pointer;
-            font-weight: 600;
-            font-size: 0.9rem;
-            display: flex;
-            align-items: center;
-            gap: 8px;
-            transition: all 0.3s cubic-bezier(0.16, 1, 0.3, 1);
-            position: relative;
-            overflow: hidden;
-        }
+class RedisConversationStore(ConversationStore):
+    """Conversation history in Redis, shared by every worker behind a load balancer.
+    
+    Each session is a list of JSON messages trimmed to max_messages, with the
+    idle TTL applied as a key expiry. Any client with the redis-py interface
+    works, so tests can pass in a fakeredis.FakeRedis instance.
+    """
+    
+    KEY_PREFIX = "chat:history:"
+    SEQ_PREFIX = "chat:seq:"
+    
+    def __init__(self, client, max_messages=200, idle_ttl=3600):
+        self.client = client
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+    
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        try:
+            import redis # type: ignore
+        except ImportError:
+            raise StartupError("ConversationBackend=redis needs the redis package: pip install redis")
+        return cls(redis.Redis.from_url(url), **kwargs)
+    
+    def append(self, session_id, role, content):
+        message = ChatMessage(role, content)
+        key = self.KEY_PREFIX + session_id
+        seq_key = self.SEQ_PREFIX + session_id
+        message.seq = self.client.incr(seq_key)
+        record = json.dumps([message.role, message.content, message.timestamp, message.tokens, message.seq])
+        
+        # One round trip for the push, trim and expiries
+        pipe = self.client.pipeline(transaction=False)
+        pipe.rpush(key, record)
+        pipe.ltrim(key, -self.max_messages, -1)
+        pipe.expire(key, self.idle_ttl)
+        pipe.expire(seq_key, self.idle_ttl)
+        pipe.execute()
+        return message
+    
+    def recent(self, session_id, limit):
+        records = self.client.lrange(self.KEY_PREFIX + session_id, -limit, -1)
+        return [ChatMessage(*json.loads(record)) for record in records]
+    
+    def page(self, session_id, before=None, after=None, limit=50):
+        # Lists are capped at max_messages, so filtering the whole list stays cheap
+        messages = [ChatMessage(*json.loads(record)) for record in self.client.lrange(self.KEY_PREFIX + session_id, 0, -1)]
+        messages = [m for m in messages if m.seq is not None]
+        if after is not None:
+            return [m for m in messages if m.seq > after][:limit]
+        if before is not None:
+            messages = [m for m in messages if m.seq < before]
+        return messages[-limit:]
+    
+    def last_seq(self, session_id):
+        return int(self.client.get(self.SEQ_PREFIX + session_id) or 0)
+    
+    def session_ids(self):
+        for key in self.client.scan_iter(match=self.KEY_PREFIX + "*", count=500):
+            if isinstance(key, bytes):
+                key = key.decode("utf-8")
+            yield key[len(self.KEY_PREFIX):]
+    
+    def remove(self, session_id):
+        self.client.delete(self.KEY_PREFIX + session_id, self.SEQ_PREFIX + session_id)
+    
+    def evict_idle(self):
+        # Idle sessions expire on their own
+        pass
+    
+    def stats(self):
+        sessions = 0
+        messages = 0
+        approx_bytes = 0
+        for key in self.client.scan_iter(match=self.KEY_PREFIX + "*", count=500):
+            records = self.client.lrange(key, 0, -1)
+            sessions += 1
+            messages += len(records)
+            approx_bytes += sum(len(record) for record in records)
+        return {"sessions": sessions, "messages": messages, "approx_bytes": approx_bytes}
+    
+    def ping(self):
+        self.client.ping()
 
-        .btn::before {
-            content: '';
-            position: absolute;
-            top: 50%;
-            left: 50%;
-            width: 0;
-            height: 0;
-            background: rgba(255,255,255,0.2);
-            border-radius: 50%;
-            transition: all 0.3s cubic-bezier(0.16, 1, 0.3, 1);
-            transform: translate(-50%, -50%);
-        }
+class ContextBuilder:
+    """Packs as much recent history as fits the prompt token budget.
+    
+    Walks the session's stored messages from newest to oldest using their
+    cached token counts, so the cost per request depends on max_messages
+    and not on how long the session's history is. Room for the completion
+    is always reserved out of the model's context window.
+    """
+    
+    def __init__(self, prompt_budget=3000, context_window=8192, max_messages=100):
+        self.prompt_budget = prompt_budget
+        self.context_window = context_window
+        self.max_messages = max_messages
+    
+    def budget(self, completion_tokens):
+        return min(self.prompt_budget, self.context_window - completion_tokens)
+    
+    def build(self, system_message, history, completion_tokens, summary=None):
+        """Return the messages to send, their estimated prompt token count, and the
+        history messages that no longer fit (and aren't covered by the summary)"""
+        budget = self.budget(completion_tokens)
+        used = count_tokens(system_message)
+        covered_until = 0
+        if summary is not None:
+            used += summary.tokens
+            covered_until = summary.covered_until
+        selected = []
+        cutoff = 0
+        
+        for index in range(len(history) - 1, -1, -1):
+            msg = history[index]
+            if msg.timestamp <= covered_until:
+                # Everything from here back is already in the summary
+                break
+            if msg.role not in ["user", "assistant"]:
+                continue
+            if used + msg.tokens > budget:
+                cutoff = index + 1
+                if not selected:
+                    # The newest message always goes in, cut down to the space left
+                    room = max(0, budget - used - MESSAGE_OVERHEAD_TOKENS) * CHARS_PER_TOKEN
+                    content = msg.content[:room]
+                    selected.append({"role": msg.role, "content": content})
+                    used += count_tokens(content)
+                    cutoff = index
+                break
+            selected.append({"role": msg.role, "content": msg.content})
+            used += msg.tokens
+        
+        selected.reverse()
+        messages = [{"role": "system", "content": system_message}]
+        if summary is not None:
+            messages.append({"role": "system", "content": summary.message})
+        
+        dropped = [
+            msg for msg in history[:cutoff]
+            if msg.timestamp > covered_until and msg.role in ["user", "assistant"]
+        ]
+        return messages + selected, used, dropped
 
-        .btn:hover::before {
-            width: 120%;
-            height: 120%;
-        }
+class ConversationSummary:
+    __slots__ = ("text", "message", "tokens", "covered_until", "covered_tokens")
+    
+    def __init__(self, text, covered_until, covered_tokens):
+        self.text = text
+        self.message = f"Summary of the earlier conversation: {text}"
+        self.tokens = count_tokens(self.message)
+        # Timestamp of the newest message folded into the summary, and the
+        # tokens those messages would take if sent as-is
+        self.covered_until = covered_until
+        self.covered_tokens = covered_tokens
 
-        .btn:active {
-            transform: scale(0.95);
-        }
+class ConversationSummarizer:
+    """Keeps a running summary of the turns that have aged out of the prompt.
+    
+    Once at least min_messages turns have fallen out of the context window,
+    they are folded into the session's summary by a Groq call in a background
+    task. The summary is only recomputed when more turns age out, and is
+    injected right after the system prompt on every request.
+    """
+    
+    PROMPT = (
+        "You maintain a running summary of a chat between a user and an AI assistant. "
+        "Merge the new turns into the current summary. Keep facts, names, preferences and "
+        "open questions; drop pleasantries. Reply with the updated summary only."
+    )
+    
+    def __init__(self, spawn, min_messages=6, max_tokens=200):
+        self.spawn = spawn
+        self.min_messages = min_messages
+        self.max_tokens = max_tokens
+        self.summaries = {}
+        self.pending = set()
+        self.saved_tokens = {}
+        self.summaries_built = 0
+        self.failures = 0
+        # Updates skipped because the server was too busy; they are retried as more turns age out
+        self.deferred = 0
+        self.lock = threading.Lock()
+    
+    def get(self, session_id):
+        return self.summaries.get(session_id)
+    
+    def maybe_update(self, session_id, dropped, call_model):
+        """Schedule a summary update if enough turns have aged out"""
+        if len(dropped) < self.min_messages:
+            return
+        with self.lock:
+            if session_id in self.pending:
+                return
+            self.pending.add(session_id)
+        self.spawn(self.update, session_id, dropped, call_model)
+    
+    def update(self, session_id, dropped, call_model):
+        """Fold the dropped turns into the session's summary"""
+        previous = self.summaries.get(session_id)
+        turns = "\n".join(f"{msg.role.capitalize()}: {msg.content}" for msg in dropped)
+        messages = [
+            {"role": "system", "content": self.PROMPT},
+            {"role": "user", "content": f"Current summary: {previous.text if previous else '(none)'}\n\nNew turns:\n{turns}"}
+        ]
+        try:
+            text = call_model(messages, max_tokens=self.max_tokens, temperature=0.2)
+            covered_tokens = sum(msg.tokens for msg in dropped) + (previous.covered_tokens if previous else 0)
+            summary = ConversationSummary(text.strip(), dropped[-1].timestamp, covered_tokens)
+            with self.lock:
+                # The session may have been forgotten while the call was running
+                if session_id in self.pending:
+                    self.summaries[session_id] = summary
+                    self.summaries_built += 1
+        except ServerBusy:
+            self.deferred += 1
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Summary update failed for {session_id}: {e}")
+        finally:
+            with self.lock:
+                self.pending.discard(session_id)
+    
+    def record_usage(self, session_id, summary):
+        """Count the prompt tokens a request saved by sending the summary"""
+        saved = summary.covered_tokens - summary.tokens
+        if saved > 0:
+            with self.lock:
+                self.saved_tokens[session_id] = self.saved_tokens.get(session_id, 0) + saved
+    
+    def forget(self, session_id):
+        with self.lock:
+            self.summaries.pop(session_id, None)
+            self.pending.discard(session_id)
+            self.saved_tokens.pop(session_id, None)
+    
+    def stats(self):
+        with self.lock:
+            return {
+                "sessions": len(self.summaries),
+                "summaries_built": self.summaries_built,
+                "failures": self.failures,
+                "deferred": self.deferred,
+                "prompt_tokens_saved": sum(self.saved_tokens.values()),
+                "prompt_tokens_saved_by_session": dict(self.saved_tokens)
+            }
 
-        #sendButton {
-            background: var(--secondary-gradient);
-            color: white;
-            padding: 12px 20px;
-            box-shadow: 0 4px 20px rgba(79, 172, 254, 0.3);
-        }
+class ResponseCache:
+    """LRU + TTL cache of completions keyed on the normalized request.
+    
+    The key is a hash of the message list (whitespace-collapsed and
+    case-folded) plus the model parameters. Entries live in memory and,
+    when a path is given, in a SQLite file that survives restarts and is
+    shared between workers; disk hits are promoted back into memory.
+    """
+    
+    # Expired disk entries are pruned once every this many stores
+    PRUNE_EVERY = 100
+    
+    def __init__(self, max_entries=1000, ttl=3600, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        self.puts = 0
+        
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    latency REAL NOT NULL,
+                    expires REAL NOT NULL
+                )
+            """)
+    
+    @staticmethod
+    def make_key(messages, params):
+        normalized = [
+            [msg["role"], " ".join(msg["content"].split()).casefold()]
+            for msg in messages
+        ]
+        payload = json.dumps([normalized, sorted(params.items())], separators=(",", ":"))
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def get(self, key):
+        """Return the cached response or None"""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                response, latency, expires = entry
+                if expires > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    self.latency_saved += latency
+                    return response
+                del self.entries[key]
+            
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT response, latency, expires FROM responses WHERE key = ? AND expires > ?",
+                    (key, now)
+                ).fetchone()
+                if row is not None:
+                    self._put(key, row)
+                    self.disk_hits += 1
+                    self.latency_saved += row[1]
+                    return row[0]
+            
+            self.misses += 1
+            return None
+    
+    def put(self, key, response, latency):
+        """Store a response along with how long the upstream call took"""
+        entry = (response, latency, time.time() + self.ttl)
+        with self.lock:
+            self._put(key, entry)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key,) + entry)
+                self.puts += 1
+                if self.puts % self.PRUNE_EVERY == 0:
+                    self.db.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+    
+    def _put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "latency_saved_seconds": round(self.latency_saved, 3)
+            }
 
-        #sendButton:hover {
-            box-shadow: 0 8px 30px rgba(79, 172, 254, 0.4);
-            transform: translateY(-2px);
-        }
+class HashingEmbedder:
+    """CPU-only text embedding: hashed bag of words and word bigrams.
+    
+    Stop words are dropped so that "what's the capital of France" and
+    "capital of france?" land on the same vector. Vectors are L2-normalized,
+    so a dot product is the cosine similarity.
+    """
+    
+    STOP_WORDS = frozenset(
+        "a an and are can could do does i is it me of on please s tell the to what whats which who you".split()
+    )
+    WORD = re.compile(r"[a-z0-9]+")
+    
+    def __init__(self, dim=256):
+        self.dim = dim
+    
+    def embed(self, text):
+        import numpy as np # type: ignore
+        words = [w for w in self.WORD.findall(text.casefold()) if w not in self.STOP_WORDS]
+        features = words + [a + " " + b for a, b in zip(words, words[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in features:
+            h = zlib.crc32(feature.encode())
+            # The top bit picks the sign so collisions tend to cancel out
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
 
-        #sendButton:disabled {
-            opacity: 0.6;
-            cursor: not-allowed;
-            transform: none;
-        }
+class SemanticCache:
+    """Nearest-neighbour cache of replies to first-turn questions.
+    
+    Embeddings are rows of a NumPy matrix that grows in chunk_size blocks
+    up to capacity, after which the oldest entries are overwritten.
+    The "exact" index scores every row with one matrix-vector product; the
+    "lsh" index hashes vectors into several tables with random hyperplanes
+    and only scores rows in the query's buckets and their one-bit
+    neighbours, for large caches.
+    """
+    
+    def __init__(self, embedder, threshold=0.9, capacity=100000, index="exact",
+                 chunk_size=4096, lsh_tables=4, lsh_bits=12, seed=0):
+        import numpy as np # type: ignore
+        self.np = np
+        self.embedder = embedder
+        self.threshold = threshold
+        self.capacity = capacity
+        self.chunk_size = chunk_size
+        self.index = index
+        self.vectors = np.zeros((0, embedder.dim), dtype=np.float32)
+        self.responses = []
+        self.count = 0  # total entries ever added; slot = count % capacity
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        
+        if index == "lsh":
+            rng = np.random.default_rng(seed)
+            self.planes = rng.standard_normal((lsh_tables, lsh_bits, embedder.dim)).astype(np.float32)
+            self.bit_weights = 1 << np.arange(lsh_bits, dtype=np.int64)
+            self.buckets = [{} for _ in range(lsh_tables)]
+            self.slot_buckets = []
+    
+    def __len__(self):
+        return min(self.count, self.capacity)
+    
+    def add(self, text, response):
+        self.add_vector(self.embedder.embed(text), response)
+    
+    def add_vector(self, vector, response):
+        np = self.np
+        with self.lock:
+            slot = self.count % self.capacity
+            if slot >= len(self.vectors):
+                # Grow by whole chunks, at least half the current size each time so
+                # the copying stays linear in the number of entries
+                chunks = max(1, len(self.vectors) // (2 * self.chunk_size))
+                grown = min(len(self.vectors) + chunks * self.chunk_size, self.capacity)
+                vectors = np.zeros((grown, self.embedder.dim), dtype=np.float32)
+                vectors[:len(self.vectors)] = self.vectors
+                self.vectors = vectors
+            self.vectors[slot] = vector
+            
+            if slot < len(self.responses):
+                self.responses[slot] = response
+            else:
+                self.responses.append(response)
+            
+            if self.index == "lsh":
+                signatures = self._signatures(vector)
+                if slot < len(self.slot_buckets):
+                    # Overwriting the oldest entry: take it out of its old buckets
+                    for table, signature in zip(self.buckets, self.slot_buckets[slot]):
+                        table[signature].remove(slot)
+                    self.slot_buckets[slot] = signatures
+                else:
+                    self.slot_buckets.append(signatures)
+                for table, signature in zip(self.buckets, signatures):
+                    table.setdefault(signature, []).append(slot)
+            
+            self.count += 1
+    
+    def lookup(self, text):
+        """Return the cached reply to the most similar question, or None"""
+        return self.lookup_vector(self.embedder.embed(text))
+    
+    def lookup_vector(self, vector):
+        np = self.np
+        with self.lock:
+            size = len(self)
+            best = None
+            if size:
+                if self.index == "lsh":
+                    candidates = self._candidates(vector)
+                    if candidates:
+                        scores = self.vectors[candidates] @ vector
+                        i = int(np.argmax(scores))
+                        best = (float(scores[i]), candidates[i])
+                else:
+                    scores = self.vectors[:size] @ vector
+                    i = int(np.argmax(scores))
+                    best = (float(scores[i]), i)
+            
+            if best is not None and best[0] >= self.threshold:
+                self.hits += 1
+                return self.responses[best[1]]
+            self.misses += 1
+            return None
+    
+    def _signatures(self, vector):
+        # One signature per hash table, from the signs of the hyperplane projections
+        return tuple(int(bits) for bits in ((self.planes @ vector) > 0) @ self.bit_weights)
+    
+    def _candidates(self, vector):
+        # Multi-probe: in each table, the query's own bucket plus every bucket one bit away
+        candidates = set()
+        for table, signature in zip(self.buckets, self._signatures(vector)):
+            candidates.update(table.get(signature, ()))
+            for weight in self.bit_weights:
+                candidates.update(table.get(signature ^ int(weight), ()))
+        return list(candidates)
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self),
+                "index": self.index,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
 
-        #clearButton {
-            background: linear-gradient(135deg, #ff6b6b 0%, #ff8e8e 100%);
-            color: white;
-            padding: 12px 16px;
-            box-shadow: 0 4px 20px rgba(255, 107, 107, 0.3);
-        }
+def kill_task(task):
+    """Kill a task from socketio.start_background_task; False if it is an OS thread that can't be"""
+    # Engine.IO wraps eventlet's GreenThread in its own thread class
+    kill = getattr(getattr(task, "g", task), "kill", None)
+    if kill is None:
+        return False
+    kill()
+    return True
 
-        #clearButton:hover {
-            box-shadow: 0 8px 30px rgba(255, 107, 107, 0.4);
-            transform: translateY(-2px);
-        }
+class ReplyCancelled(Exception):
+    """Raised for requests that were waiting on a reply that got cancelled"""
 
-        .chat-info {
-            text-align: center;
-            padding: 15px;
-            font-size: 0.85rem;
-            color: rgba(255,255,255,0.7);
-            background: rgba(255,255,255,0.03);
-        }
+class Flight:
+    """One upstream call shared by every request that asked for the same thing"""
+    __slots__ = ("chunks", "result", "error", "done", "cond", "readers", "abandoned", "producer")
+    
+    def __init__(self):
+        self.chunks = []
+        self.result = None
+        self.error = None
+        self.done = False
+        self.cond = threading.Condition()
+        # Streams are read until every request reading them has gone away
+        self.readers = 0
+        self.abandoned = False
+        self.producer = None
+    
+    def append(self, chunk):
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+    
+    def finish(self):
+        with self.cond:
+            self.done = True
+            self.cond.notify_all()
+    
+    def wait(self):
+        with self.cond:
+            while not self.done:
+                self.cond.wait()
 
-        .powered-by {
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            gap: 8px;
+class SingleFlight:
+    """Deduplicates identical in-flight upstream requests.
+    
+    The first caller for a key makes the call and everyone who asks for the
+    same key before it finishes gets the same result or error. Streams are
+    read by a background producer into a shared buffer, so each waiter sees
+    every chunk from the start and can stop reading without affecting the
+    others; once the last one stops, the upstream stream is closed.
+    """
+    
+    def __init__(self, spawn):
+        self.spawn = spawn
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+    
+    @staticmethod
+    def make_key(kind, messages, params):
+        payload = json.dumps([kind, messages, sorted(params.items())], separators=(",", ":"))
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def _join(self, key):
+        """Return (flight, is_leader) for a key"""
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is not None and not flight.abandoned:
+                flight.readers += 1
+                self.coalesced += 1
+                return flight, False
+            flight = self.flights[key] = Flight()
+            flight.readers = 1
+            self.leaders += 1
+            return flight, True
+    
+    def _leave(self, key, flight):
+        with self.lock:
+            flight.readers -= 1
+            if flight.readers or flight.done:
+                return
+            flight.abandoned = True
+        # Stop the producer even while it waits for the next chunk, where it can be killed
+        if kill_task(flight.producer) and not flight.done:
+            # It never started, so it won't land the flight itself
+            self._land(key, flight)
+    
+    def _land(self, key, flight):
+        # New requests for the key start a fresh call from here on
+        with self.lock:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+        flight.finish()
+    
+    def call(self, key, fn):
+        flight, leader = self._join(key)
+        if leader:
+            try:
+                flight.result = fn()
+            except Exception as e:
+                flight.error = e
+            except BaseException:
+                # The leader's reply was cancelled; the requests waiting on it fail with it
+                flight.error = ReplyCancelled("the identical request this one was sharing was cancelled")
+                raise
+            finally:
+                self._land(key, flight)
+        else:
+            flight.wait()
+        
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    
+    def stream(self, key, open_stream):
+        flight, leader = self._join(key)
+        if leader:
+            flight.producer = self.spawn(self._produce, key, flight, open_stream)
+        
+        index = 0
+        try:
+            while True:
+                with flight.cond:
+                    while index >= len(flight.chunks) and not flight.done:
+                        flight.cond.wait()
+                    chunks = flight.chunks[index:]
+                    index = len(flight.chunks)
+                    done = flight.done
+                for chunk in chunks:
+                    yield chunk
+                if done:
+                    break
+        finally:
+            self._leave(key, flight)
+        
+        if flight.error is not None:
+            raise flight.error
+    
+    def _produce(self, key, flight, open_stream):
+        try:
+            with closing(open_stream()) as stream:
+                for chunk in stream:
+                    if flight.abandoned:
+                        # Nobody is reading any more: closing the stream frees the upstream slot
+                        break
+                    flight.append(chunk)
+        except Exception as e:
+            flight.error = e
+        finally:
+            self._land(key, flight)
+    
+    def stats(self):
+        with self.lock:
+            return {
+                "in_flight": len(self.flights),
+                "upstream_calls": self.leaders,
+                "coalesced_requests": self.coalesced
+            }
+
+class TokenBucket:
+    """Refills at per_minute / 60 units a second, holding at most one minute's worth"""
+    
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount):
+        """Seconds until amount units are available (0 if they are now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+    
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+    
+    def adjust(self, amount):
+        """Correct the level once the real cost of a request is known"""
+        self.level = min(self.capacity, self.level - amount)
+
+class UpstreamScheduler:
+    """Client-side admission for Groq requests.
+    
+    Requests-per-minute and tokens-per-minute budgets are tracked with token
+    buckets. When a budget is exhausted, waiting requests are admitted
+    round-robin across sessions so one busy session can't starve the rest,
+    and notify(session_id, status) is called with queue position and wait
+    time. Rate-limit, server and connection errors are retried with jittered
+    exponential backoff, honouring the upstream's retry-after header; a 429
+    also pauses admission for everyone until the hint has passed.
+    """
+    
+    def __init__(self, requests_per_minute=30, tokens_per_minute=30000, max_retries=3,
+                 base_delay=0.5, max_delay=30.0, notify=None):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.notify = notify
+        
+        self.cond = threading.Condition()
+        self.queues = OrderedDict()  # session_id -> deque of waiting tickets, in round-robin order
+        self.blocked_until = 0.0
+        
+        self.admitted = 0
+        self.queued = 0
+        self.total_wait = 0.0
+        self.retries = 0
+        self.rate_limited = 0
+    
+    def run(self, session_id, tokens, fn):
+        """Call fn once admitted, retrying retryable upstream errors"""
+        attempt = 0
+        while True:
+            self.acquire(session_id, tokens)
+            try:
+                return fn()
+            except (RateLimitError, APIStatusError, APIConnectionError) as e:
+                delay = self.retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Upstream error ({e.__class__.__name__}), retry {attempt} in {delay:.1f}s")
+                self._notify(session_id, {"retrying": attempt, "retry_in": round(delay, 1)})
+                time.sleep(delay)
+    
+    def retry_delay(self, error, attempt):
+        """Seconds to wait before retrying, or None if the error shouldn't be retried"""
+        if attempt >= self.max_retries:
+            return None
+        if isinstance(error, APIStatusError) and not (error.status_code == 429 or error.status_code >= 500):
+            return None
+        if isinstance(error, APITimeoutError):
+            # A slow model is better handled by falling back to another one
+            return None
+        
+        # Full jitter: anywhere up to the exponential backoff ceiling
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        
+        hint = None
+        if isinstance(error, APIStatusError):
+            try:
+                hint = float(error.response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                hint = None
+        if isinstance(error, RateLimitError):
+            self.rate_limited += 1
+            pause = hint if hint is not None else delay
+            with self.cond:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+        if hint is not None:
+            delay = max(delay, min(hint, self.max_delay))
+        return delay
+    
+    def acquire(self, session_id, tokens):
+        """Block until the request fits the rate budgets and it is this session's turn"""
+        ticket = object()
+        started = time.monotonic()
+        last_status = None
+        with self.cond:
+            self.queues.setdefault(session_id, deque()).append(ticket)
+            try:
+                while True:
+                    wait = self._try_admit(session_id, ticket, tokens)
+                    if wait == 0:
+                        break
+                    
+                    # Report queue position at most once a second while waiting
+                    now = time.monotonic()
+                    if last_status is None or now - last_status >= 1.0:
+                        if last_status is None:
+                            self.queued += 1
+                        last_status = now
+                        self._notify(session_id, {
+                            "position": self._position(session_id, ticket),
+                            "queue_depth": sum(len(q) for q in self.queues.values()),
+                            "waited": round(now - started, 1)
+                        })
+                    self.cond.wait(timeout=min(wait, 1.0))
+            except BaseException:
+                # Cancelled while waiting: give up the place so the queue behind it moves on
+                self._withdraw(session_id, ticket)
+                raise
+        
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self.total_wait += waited
+        return waited
+    
+    def record_usage(self, estimated_tokens, actual_tokens):
+        if self.token_bucket is not None and actual_tokens:
+            with self.cond:
+                self.token_bucket.adjust(actual_tokens - estimated_tokens)
+    
+    def _try_admit(self, session_id, ticket, tokens):
+        # Only the oldest ticket of the session at the head of the rotation may go
+        head_session = next(iter(self.queues))
+        if head_session != session_id or self.queues[session_id][0] is not ticket:
+            return 1.0
+        
+        wait = max(0.0, self.blocked_until - time.monotonic())
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.wait_time(1))
+        if self.token_bucket is not None:
+            wait = max(wait, self.token_bucket.wait_time(tokens))
+        if wait > 0:
+            return wait
+        
+        if self.request_bucket is not None:
+            self.request_bucket.take(1)
+        if self.token_bucket is not None:
+            self.token_bucket.take(tokens)
+        
+        queue = self.queues[session_id]
+        queue.popleft()
+        if queue:
+            self.queues.move_to_end(session_id)
+        else:
+            del self.queues[session_id]
+        self.cond.notify_all()
+        return 0
+    
+    def _withdraw(self, session_id, ticket):
+        queue = self.queues.get(session_id)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self.queues[session_id]
+            self.cond.notify_all()
+    
+    def _position(self, session_id, ticket):
+        """Approximate number of requests that will be admitted before this one"""
+        own = self.queues[session_id]
+        rank = next(i for i, t in enumerate(own) if t is ticket)
+        position = rank
+        before = True
+        for other, queue in self.queues.items():
+            if other == session_id:
+                before = False
+                continue
+            position += min(len(queue), rank + (1 if before else 0))
+        return position + 1
+    
+    def _notify(self, session_id, status):
+        if self.notify is not None and session_id is not None:
+            try:
+                self.notify(session_id, status)
+            except Exception as e:
+                logger.error(f"Queue status notification failed: {e}")
+    
+    def stats(self):
+        with self.cond:
+            return {
+                "queue_depth": sum(len(q) for q in self.queues.values()),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "average_wait_seconds": round(self.total_wait / self.admitted, 3) if self.admitted else 0.0,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited
+            }
+
+class ModelSpec:
+    """One routable model with its request parameters and rolling health"""
+    __slots__ = ("name", "tier", "max_tokens", "temperature", "timeout", "latencies", "outcomes", "calls", "failures")
+    
+    # Number of recent calls the latency percentiles and error rate cover
+    WINDOW = 200
+    
+    def __init__(self, name, tier, max_tokens=500, temperature=0.7, timeout=30):
+        self.name = name
+        self.tier = tier
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.timeout = timeout
+        self.latencies = deque(maxlen=self.WINDOW)
+        self.outcomes = deque(maxlen=self.WINDOW)
+        self.calls = 0
+        self.failures = 0
+    
+    @property
+    def params(self):
+        return {"model": self.name, "max_tokens": self.max_tokens, "temperature": self.temperature}
+    
+    def percentile(self, fraction):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 4)
+    
+    @property
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+class ServerBusy(Exception):
+    """Raised when the admission controller turns work away"""
+    
+    def __init__(self, reason, retry_after):
+        super().__init__(f"server busy ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Adaptive concurrency limit with a short, CoDel-style wait queue.
+    
+    The limit on work in flight follows a gradient: while recent latency
+    (time to the first token, or the whole reply when not streaming) stays
+    within TOLERANCE of the long-term average it grows by about the square
+    root of itself, and when latency rises it shrinks in proportion, down
+    to min_limit. Interactive work past the limit waits in FIFO order for
+    at most max_wait seconds; once waits have stayed above target for a
+    whole interval the queue is standing, and new work is rejected at once
+    until a wait comes back under target. Background work (summaries) never
+    waits and only runs while a quarter of the limit is left for users.
+    Rejections carry a retry-after hint from how long work holds a slot.
+    """
+    
+    TOLERANCE = 2.0
+    SMOOTHING = 0.2
+    BACKGROUND_SHARE = 0.75
+    
+    def __init__(self, min_limit=2, max_limit=8, max_wait=2.0, target=0.5):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.max_wait = max_wait
+        self.target = target
+        self.interval = 10 * target
+        self.in_flight = 0
+        self.waiters = deque()
+        self.cond = threading.Condition()
+        # Short- and long-term latency averages, and how long work holds a slot
+        self.short_latency = None
+        self.long_latency = None
+        self.hold_time = None
+        # CoDel state: when waits first went above target, and whether the queue is standing
+        self.above_since = None
+        self.standing = False
+        self.admitted = 0
+        self.rejected = {}
+    
+    def acquire(self, background=False):
+        """Take a slot, waiting briefly if interactive; raises ServerBusy when turned away"""
+        with self.cond:
+            if self.in_flight < self._capacity(background) and not self.waiters:
+                return self._admit(time.monotonic())
+            if background:
+                raise self._reject("background")
+            if self.standing:
+                raise self._reject("overloaded")
+            if len(self.waiters) >= max(1, int(self.limit)):
+                raise self._reject("queue_full")
+            
+            ticket = object()
+            arrived = time.monotonic()
+            deadline = arrived + self.max_wait
+            self.waiters.append(ticket)
+            try:
+                while self.waiters[0] is not ticket or self.in_flight >= int(self.limit):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._reject("timeout")
+                    self.cond.wait(timeout=remaining)
+            finally:
+                self.waiters.remove(ticket)
+                self.cond.notify_all()
+            now = time.monotonic()
+            self._track_wait(now - arrived, now)
+            return self._admit(now)
+    
+    def release(self, admitted_at, latency=None):
+        """Give the slot back; latency, when measured, adapts the limit"""
+        with self.cond:
+            self.in_flight -= 1
+            held = time.monotonic() - admitted_at
+            self.hold_time = held if self.hold_time is None else 0.9 * self.hold_time + 0.1 * held
+            if latency is not None:
+                self._adapt(latency)
+            if not self.waiters:
+                self.above_since = None
+                self.standing = False
+            self.cond.notify_all()
+    
+    def _capacity(self, background):
+        limit = max(1, int(self.limit))
+        return limit * self.BACKGROUND_SHARE if background else limit
+    
+    def _admit(self, now):
+        self.in_flight += 1
+        self.admitted += 1
+        return now
+    
+    def _track_wait(self, waited, now):
+        if waited < self.target:
+            self.above_since = None
+            self.standing = False
+        elif self.above_since is None:
+            self.above_since = now
+        elif now - self.above_since >= self.interval:
+            self.standing = True
+    
+    def _adapt(self, latency):
+        self.short_latency = latency if self.short_latency is None else 0.7 * self.short_latency + 0.3 * latency
+        if self.long_latency is None:
+            self.long_latency = latency
+        else:
+            self.long_latency = 0.98 * self.long_latency + 0.02 * latency
+            if self.long_latency > 2 * self.short_latency:
+                # Recovering from a spike: let the baseline come back down quickly
+                self.long_latency *= 0.95
+        gradient = max(0.5, min(1.0, self.TOLERANCE * self.long_latency / self.short_latency))
+        target_limit = self.limit * gradient + self.limit ** 0.5
+        self.limit = (1 - self.SMOOTHING) * self.limit + self.SMOOTHING * target_limit
+        self.limit = max(self.min_limit, min(self.max_limit, self.limit))
+    
+    def _reject(self, reason):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        rejected_requests.inc(label=reason)
+        # Roughly when a slot should be free for everyone already waiting
+        hold = self.hold_time or self.short_latency or 1.0
+        retry_after = max(1, min(60, round(hold * (len(self.waiters) + 1) / max(1, int(self.limit)))))
+        return ServerBusy(reason, retry_after)
+    
+    def stats(self):
+        with self.cond:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "waiting": len(self.waiters),
+                "standing_queue": self.standing,
+                "short_latency": round(self.short_latency, 3) if self.short_latency is not None else None,
+                "long_latency": round(self.long_latency, 3) if self.long_latency is not None else None,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected)
+            }
+
+class ModelRouter:
+    """Picks a model per request and falls back across the model table.
+    
+    A cheap heuristic classifies each request into a tier: long prompts and
+    questions that look like code, analysis or multi-step work go to
+    "large", everything else to "fast". Within a tier, healthy models are
+    tried in order of their rolling p95 latency; unhealthy ones (error rate
+    over half, once there are enough samples) and models of other tiers
+    follow as fallbacks.
+    """
+    
+    HEAVY_WORDS = re.compile(
+        r"\b(code|debug|function|algorithm|explain|analy[sz]e|compare|prove|derive|step by step|essay|detailed)\b",
+        re.IGNORECASE
+    )
+    MIN_SAMPLES = 5
+    
+    def __init__(self, table, heavy_tokens=300):
+        self.models = [ModelSpec(**entry) for entry in table]
+        self.default_tier = self.models[0].tier
+        self.heavy_tokens = heavy_tokens
+        self.lock = threading.Lock()
+        self.decisions = {}
+        self.fallbacks = 0
+    
+    @classmethod
+    def from_file(cls, path, heavy_tokens=300):
+        with open(path) as f:
+            return cls(json.load(f), heavy_tokens)
+    
+    @property
+    def max_completion_tokens(self):
+        return max(model.max_tokens for model in self.models)
+    
+    def tiers(self):
+        return {model.tier for model in self.models}
+    
+    def classify(self, messages):
+        """Pick the tier for a request from its latest user message and prompt size"""
+        question = messages[-1]["content"]
+        prompt_tokens = sum(count_tokens(msg["content"]) for msg in messages)
+        if "large" in self.tiers() and (prompt_tokens > self.heavy_tokens or self.HEAVY_WORDS.search(question)):
+            return "large"
+        return self.default_tier
+    
+    def params(self, tier):
+        """Request parameters of the first model in a tier"""
+        return next(model for model in self.models if model.tier == tier).params
+    
+    def candidates(self, tier):
+        """Models to try for a tier, best first, with every other model as a fallback"""
+        with self.lock:
+            self.decisions[tier] = self.decisions.get(tier, 0) + 1
+        
+        def rank(model):
+            unhealthy = len(model.outcomes) >= self.MIN_SAMPLES and model.error_rate > 0.5
+            p95 = model.percentile(0.95)
+            return (model.tier != tier, unhealthy, p95 if p95 is not None else 0.0)
+        
+        return sorted(self.models, key=rank)
+    
+    def record(self, model, latency, ok):
+        with self.lock:
+            model.calls += 1
+            model.outcomes.append(ok)
+            if ok:
+                model.latencies.append(latency)
+            else:
+                model.failures += 1
+    
+    def record_fallback(self):
+        with self.lock:
+            self.fallbacks += 1
+    
+    def stats(self):
+        with self.lock:
+            return {
+                "decisions": dict(self.decisions),
+                "fallbacks": self.fallbacks,
+                "models": {
+                    model.name: {
+                        "tier": model.tier,
+                        "calls": model.calls,
+                        "failures": model.failures,
+                        "error_rate": round(model.error_rate, 3),
+                        "p50_seconds": model.percentile(0.50),
+                        "p95_seconds": model.percentile(0.95)
+                    }
+                    for model in self.models
+                }
+            }
+
+def create_model_router():
+    """Build the router from ModelsFile, or the default table"""
+    if ModelsFile:
+        try:
+            return ModelRouter.from_file(ModelsFile, HeavyQueryTokens)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"⚠ Could not load ModelsFile {ModelsFile} ({e}), using default models")
+    return ModelRouter(DEFAULT_MODEL_TABLE, HeavyQueryTokens)
+
+class RequestTiming:
+    __slots__ = ("started", "connect", "ttfb", "total", "reused")
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.connect = None
+        self.ttfb = None
+        self.total = None
+        self.reused = True
+
+class UpstreamTransport:
+    """Explicit HTTP transport for the Groq client.
+    
+    Owns a pooled keep-alive httpx client with separate connect and read
+    timeouts, can open warmup connections at startup and ping the API
+    periodically so idle connections don't expire, and times every request
+    (connect, time to first byte, total) from httpcore's trace events.
+    """
+    
+    # Recent requests kept for the timing percentiles
+    WINDOW = 500
+    
+    def __init__(self, pool_size=20, keepalive_connections=10, keepalive_expiry=60,
+                 connect_timeout=5, read_timeout=60, http2=False):
+        self.connect_timeout = connect_timeout
+        if http2:
+            try:
+                import h2 # type: ignore
+            except ImportError:
+                print("⚠ HTTP2=true needs the h2 package (pip install httpx[http2]), using HTTP/1.1")
+                http2 = False
+        self.http2 = http2
+        self.limits = (pool_size, keepalive_connections, keepalive_expiry)
+        self.read_timeout = read_timeout
+        # Created on first use: loading the TLS certificates is most of the cost
+        self._client = None
+        self.lock = threading.Lock()
+        self.timings = deque(maxlen=self.WINDOW)
+        self.requests = 0
+        self.new_connections = 0
+        self.pings = 0
+        self.ping_failures = 0
+    
+    @property
+    def client(self):
+        if self._client is None:
+            with self.lock:
+                if self._client is None:
+                    pool_size, keepalive_connections, keepalive_expiry = self.limits
+                    self._client = httpx.Client(
+                        limits=httpx.Limits(
+                            max_connections=pool_size,
+                            max_keepalive_connections=keepalive_connections,
+                            keepalive_expiry=keepalive_expiry
+                        ),
+                        timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                        http2=self.http2,
+                        event_hooks={"request": [self._on_request]}
+                    )
+        return self._client
+    
+    def timeout(self, read_timeout):
+        """Per-request timeout that keeps the configured connect timeout"""
+        return httpx.Timeout(read_timeout, connect=self.connect_timeout)
+    
+    def _on_request(self, request):
+        timing = RequestTiming()
+        
+        def trace(event, info):
+            now = time.perf_counter()
+            if event == "connection.connect_tcp.started":
+                timing.reused = False
+            elif event in ["connection.connect_tcp.complete", "connection.start_tls.complete"]:
+                timing.connect = now - timing.started
+            elif event.endswith(".receive_response_headers.complete"):
+                timing.ttfb = now - timing.started
+            elif event.endswith(".response_closed.complete"):
+                timing.total = now - timing.started
+                self._record(timing)
+        
+        request.extensions["trace"] = trace
+    
+    def _record(self, timing):
+        with self.lock:
+            self.requests += 1
+            if not timing.reused:
+                self.new_connections += 1
+            self.timings.append(timing)
+    
+    def warmup(self, base_url, headers, connections):
+        """Open connections concurrently so the first real requests skip the handshake"""
+        threads = [
+            threading.Thread(target=self.ping, args=(base_url, headers))
+            for _ in range(connections)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    
+    def ping(self, base_url, headers):
+        """Cheap authenticated request that keeps a pooled connection alive"""
+        try:
+            self.client.get(f"{base_url.rstrip('/')}/openai/v1/models", headers=headers, timeout=self.timeout(10))
+            self.pings += 1
+        except httpx.HTTPError as e:
+            self.ping_failures += 1
+            logger.warning(f"Upstream keep-alive ping failed: {e}")
+    
+    def keep_alive_loop(self, base_url, headers, interval, sleep=time.sleep):
+        while True:
+            sleep(interval)
+            self.ping(base_url, headers)
+    
+    def stats(self):
+        def percentile(values, fraction):
+            if not values:
+                return None
+            values = sorted(values)
+            return round(values[min(len(values) - 1, int(fraction * len(values)))], 4)
+        
+        with self.lock:
+            timings = list(self.timings)
+            stats = {
+                "http2": self.http2,
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "pings": self.pings,
+                "ping_failures": self.ping_failures
+            }
+        for name in ["connect", "ttfb", "total"]:
+            values = [getattr(t, name) for t in timings if getattr(t, name) is not None]
+            stats[f"{name}_p50_seconds"] = percentile(values, 0.50)
+            stats[f"{name}_p95_seconds"] = percentile(values, 0.95)
+        return stats
+
+class HealthMonitor:
+    """Runs the readiness checks in the background so /readyz answers from memory.
+    
+    Each check is a callable that returns if its dependency is healthy and
+    raises otherwise. Results are kept with the time they were taken. A
+    check with no result for stale_after seconds (a hung probe or a stopped
+    loop) counts as failing, and a check that hasn't run yet as pending.
+    """
+    
+    def __init__(self, checks, stale_after=90):
+        self.checks = checks
+        self.stale_after = stale_after
+        self.started = time.time()
+        # name -> (checked at, duration, error or None)
+        self.results = {}
+    
+    def run_checks(self):
+        for name, check in self.checks.items():
+            started = time.perf_counter()
+            try:
+                check()
+                error = None
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            previous = self.results.get(name)
+            self.results[name] = (time.time(), time.perf_counter() - started, error)
+            if previous is None or (previous[2] is None) != (error is None):
+                if error is None:
+                    log_event("health_check", check=name, ok=True)
+                else:
+                    log_event("health_check", logging.WARNING, check=name, ok=False, error=error)
+    
+    def loop(self, interval, sleep=time.sleep):
+        while True:
+            self.run_checks()
+            sleep(interval)
+    
+    def report(self):
+        now = time.time()
+        checks = {}
+        for name in self.checks:
+            if name not in self.results:
+                checks[name] = {"ok": False, "error": "pending"}
+                continue
+            checked_at, duration, error = self.results[name]
+            age = now - checked_at
+            if error is None and age > self.stale_after:
+                error = f"no result for {round(age)}s"
+            checks[name] = {"ok": error is None, "age_seconds": round(age, 1), "duration_ms": round(duration * 1000, 1)}
+            if error is not None:
+                checks[name]["error"] = error
+        return {"ready": all(check["ok"] for check in checks.values()), "checks": checks}
+
+# Metric shards are keyed by OS thread, not green thread: green threads on one OS
+# thread only switch at I/O, so updating a shard never needs a lock
+current_os_thread = unpatched("_thread").get_ident
+
+def format_labels(label_name, label):
+    if label_name is None or label is None:
+        return ""
+    escaped = str(label).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'{label_name}="{escaped}"'
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """Base for metrics recorded into per-OS-thread shards and summed when scraped"""
+    
+    kind = "untyped"
+    
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.shards = {}
+        self.shard_lock = threading.Lock()
+    
+    def shard(self):
+        ident = current_os_thread()
+        shard = self.shards.get(ident)
+        if shard is None:
+            # Taken once per OS thread, never on the steady-state hot path
+            with self.shard_lock:
+                shard = self.shards.setdefault(ident, {})
+        return shard
+    
+    def snapshot(self):
+        """Copy of every shard; dict() copies under the GIL so writers never block"""
+        return [dict(shard) for shard in list(self.shards.values())]
+    
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+    
+    def inc(self, amount=1, label=None):
+        shard = self.shard()
+        shard[label] = shard.get(label, 0) + amount
+    
+    def values(self):
+        totals = {}
+        for shard in self.snapshot():
+            for label, value in shard.items():
+                totals[label] = totals.get(label, 0) + value
+        return totals
+    
+    def render(self):
+        lines = self.header()
+        for label, value in sorted(self.values().items(), key=lambda item: str(item[0])):
+            labels = format_labels(self.label, label)
+            lines.append(f"{self.name}{{{labels}}} {format_value(value)}" if labels else f"{self.name} {format_value(value)}")
+        return lines
+
+class Gauge(Counter):
+    """Up/down counter, e.g. open sockets"""
+    
+    kind = "gauge"
+    
+    def dec(self, amount=1, label=None):
+        self.inc(-amount, label)
+
+class CallbackGauge(Metric):
+    """Gauge whose values are read from a callback at scrape time"""
+    
+    kind = "gauge"
+    
+    def __init__(self, name, help_text, callback, label=None):
+        super().__init__(name, help_text, label)
+        self.callback = callback
+    
+    def render(self):
+        lines = self.header()
+        try:
+            values = self.callback()
+        except Exception as e:
+            logger.warning(f"Metric {self.name} unavailable: {e}")
+            return lines
+        if not isinstance(values, dict):
+            values = {None: values}
+        for label, value in sorted(values.items(), key=lambda item: str(item[0])):
+            labels = format_labels(self.label, label)
+            lines.append(f"{self.name}{{{labels}}} {format_value(value)}" if labels else f"{self.name} {format_value(value)}")
+        return lines
+
+class Histogram(Metric):
+    kind = "histogram"
+    
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+    
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, label=None):
+        super().__init__(name, help_text, label)
+        self.buckets = tuple(buckets)
+    
+    def observe(self, value, label=None):
+        shard = self.shard()
+        state = shard.get(label)
+        if state is None:
+            # [per-bucket counts (last is +Inf), sum, count]
+            state = shard[label] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+    
+    def mean(self, label=None):
+        """Average observed value, or None before the first observation"""
+        total = count = 0
+        for shard in self.snapshot():
+            state = shard.get(label)
+            if state is not None:
+                total += state[1]
+                count += state[2]
+        return total / count if count else None
+    
+    def total(self, label=None):
+        """Sum of the observed values"""
+        return sum(shard[label][1] for shard in self.snapshot() if label in shard)
+    
+    def render(self):
+        merged = {}
+        for shard in self.snapshot():
+            for label, (counts, total, count) in shard.items():
+                into = merged.setdefault(label, [[0] * (len(self.buckets) + 1), 0.0, 0])
+                into[0] = [a + b for a, b in zip(into[0], counts)]
+                into[1] += total
+                into[2] += count
+        
+        lines = self.header()
+        for label, (counts, total, count) in sorted(merged.items(), key=lambda item: str(item[0])):
+            labels = format_labels(self.label, label)
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Collects metrics and renders them in the Prometheus text exposition format"""
+    
+    def __init__(self):
+        self.metrics = []
+    
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+    
+    def counter(self, name, help_text, label=None):
+        return self.register(Counter(name, help_text, label))
+    
+    def gauge(self, name, help_text, label=None):
+        return self.register(Gauge(name, help_text, label))
+    
+    def histogram(self, name, help_text, buckets=Histogram.LATENCY_BUCKETS, label=None):
+        return self.register(Histogram(name, help_text, buckets, label))
+    
+    def callback_gauge(self, name, help_text, callback, label=None):
+        return self.register(CallbackGauge(name, help_text, callback, label))
+    
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+handler_latency = metrics.histogram(
+    "chatbot_handler_latency_seconds", "Time from receiving a message to the end of its reply", label="mode"
+)
+upstream_latency = metrics.histogram(
+    "chatbot_upstream_latency_seconds", "Groq completion latency per model", label="model"
+)
+time_to_first_token = metrics.histogram(
+    "chatbot_time_to_first_token_seconds", "Time from receiving a message to the first streamed chunk"
+)
+prompt_tokens = metrics.histogram(
+    "chatbot_prompt_tokens", "Prompt tokens per upstream request", Histogram.TOKEN_BUCKETS
+)
+completion_tokens = metrics.histogram(
+    "chatbot_completion_tokens", "Completion tokens per upstream request", Histogram.TOKEN_BUCKETS
+)
+messages_total = metrics.counter("chatbot_messages_total", "User messages received")
+errors_total = metrics.counter("chatbot_errors_total", "Errors returned to users by exception class", label="error")
+active_sockets = metrics.gauge("chatbot_active_sockets", "Connected Socket.IO clients")
+cancelled_generations = metrics.counter(
+    "chatbot_cancelled_generations_total", "Replies cancelled before they finished", label="reason"
+)
+cancelled_tokens_saved = metrics.counter(
+    "chatbot_cancelled_tokens_saved_total", "Estimated completion tokens not generated because replies were cancelled"
+)
+cancelled_seconds_saved = metrics.counter(
+    "chatbot_cancelled_seconds_saved_total", "Estimated worker-seconds not spent on cancelled replies"
+)
+rejected_requests = metrics.counter(
+    "chatbot_rejected_requests_total", "Work turned away by the admission controller", label="reason"
+)
+shed_messages = metrics.counter(
+    "chatbot_shed_messages_total", "Queued messages rejected, dropped, merged or discarded", label="action"
+)
+
+def create_semantic_cache():
+    """Build the semantic cache if it is enabled and numpy is available"""
+    if SemanticCacheMode != "on":
+        return None
+    try:
+        import numpy # type: ignore
+    except ImportError:
+        print("⚠ SemanticCache=on needs numpy (pip install numpy), semantic cache disabled")
+        return None
+    return SemanticCache(
+        HashingEmbedder(),
+        threshold=SemanticCacheThreshold,
+        capacity=SemanticCacheSize,
+        index=SemanticCacheIndex
+    )
+
+def create_conversation_store():
+    """Build the conversation store selected by ConversationBackend"""
+    if ConversationBackend == "sqlite":
+        return SQLiteConversationStore(SQLitePath, max_messages=MaxMessagesPerSession, idle_ttl=SessionIdleTTL)
+    if ConversationBackend == "redis":
+        return RedisConversationStore.from_url(RedisURL, max_messages=MaxMessagesPerSession, idle_ttl=SessionIdleTTL)
+    if ConversationBackend != "memory":
+        print(f"⚠ Unknown ConversationBackend '{ConversationBackend}', using memory")
+    return MemoryConversationStore(
+        max_messages=MaxMessagesPerSession,
+        idle_ttl=SessionIdleTTL,
+        max_bytes=ConversationMemoryMB * 1024 * 1024
+    )
+
+def export_history(store, compress=False, page_size=500, chunk_bytes=64 * 1024, pause=None):
+    """Yield every stored message as NDJSON, one {"session", "seq", "role", "content",
+    "timestamp"} object per line, in chunks of about chunk_bytes (gzip-compressed if asked).
+    
+    Each session is read page by page with its seq cursor, so memory stays at
+    one page and one chunk however much history there is. pause(0) runs after
+    every chunk, so a fast client can't keep the event loop to itself.
+    Messages appended during the export may or may not be included.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    started = time.perf_counter()
+    sessions_done = messages_done = sent = 0
+    completed = False
+    buffer = []
+    size = 0
+    
+    def emit(data):
+        nonlocal sent
+        if compressor is not None:
+            data = compressor.compress(data)
+        sent += len(data)
+        return data
+    
+    try:
+        for session_id in store.session_ids():
+            after = 0
+            while True:
+                messages = store.page(session_id, after=after, limit=page_size)
+                for message in messages:
+                    line = json.dumps(dict(session=session_id, **message.to_dict()), ensure_ascii=False) + "\n"
+                    buffer.append(line)
+                    size += len(line)
+                messages_done += len(messages)
+                if size >= chunk_bytes:
+                    data = emit("".join(buffer).encode("utf-8"))
+                    buffer, size = [], 0
+                    if data:
+                        yield data
+                    if pause is not None:
+                        pause(0)
+                if len(messages) < page_size:
+                    break
+                after = messages[-1].seq
+            sessions_done += 1
+        data = emit("".join(buffer).encode("utf-8"))
+        if compressor is not None:
+            tail = compressor.flush()
+            sent += len(tail)
+            data += tail
+        if data:
+            yield data
+        completed = True
+    finally:
+        # Also runs when the client disconnects and the server closes the generator
+        log_event("history_exported", sessions=sessions_done, messages=messages_done, bytes=sent,
+                  gzip=compress, completed=completed, seconds=round(time.perf_counter() - started, 3))
+
+
+class SessionRegistry:
+    """Maps Socket.IO sids to stable conversation tokens.
+    
+    Browsers keep the token they are issued and present it when they
+    reconnect, so a page refresh or network blip resumes the same
+    conversation instead of starting a new one under the new sid. Every sid
+    joins a room named after its token, and replies are emitted to that room.
+    A conversation left without any connected sid is dropped after
+    resume_ttl seconds.
+    """
+    
+    TOKEN_PATTERN = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+    
+    def __init__(self, store, resume_ttl=1800, summarizer=None, collect_orphans=True):
+        self.store = store
+        self.resume_ttl = resume_ttl
+        self.summarizer = summarizer
+        # With several workers a conversation may have moved to another process,
+        # so only the shared store's own idle expiry may drop it
+        self.collect_orphans = collect_orphans
+        self.tokens = {}
+        self.sids = {}
+        self.orphaned = {}
+        self.resumed = 0
+        self.collected = 0
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def new_token():
+        return secrets.token_urlsafe(24)
+    
+    def attach(self, sid, token=None):
+        """Bind a sid to the presented token (or a new one); returns (token, resumed)"""
+        resumed = False
+        if isinstance(token, str) and self.TOKEN_PATTERN.match(token):
+            with self.lock:
+                resumed = token in self.sids or token in self.orphaned
+            resumed = resumed or self.store.last_seq(token) > 0
+        else:
+            token = self.new_token()
+        with self.lock:
+            self.tokens[sid] = token
+            self.sids.setdefault(token, set()).add(sid)
+            self.orphaned.pop(token, None)
+            if resumed:
+                self.resumed += 1
+        return token, resumed
+    
+    def conversation(self, sid):
+        with self.lock:
+            return self.tokens.get(sid, sid)
+    
+    def detach(self, sid):
+        """Forget a sid; its conversation becomes an orphan if no other sid uses it"""
+        with self.lock:
+            token = self.tokens.pop(sid, None)
+            if token is None:
+                return None
+            sids = self.sids.get(token)
+            sids.discard(sid)
+            if not sids:
+                del self.sids[token]
+                self.orphaned[token] = time.time()
+        return token
+    
+    def connected(self, token):
+        """Whether any sid in this process still uses the conversation"""
+        with self.lock:
+            return token in self.sids
+    
+    def reset(self, sid):
+        """Drop the sid's conversation and move all of its sids to a new token.
+        
+        Returns (old token, new token, sids moved).
+        """
+        new_token = self.new_token()
+        with self.lock:
+            old_token = self.tokens.get(sid, sid)
+            moved = self.sids.pop(old_token, set()) or {sid}
+            for moved_sid in moved:
+                self.tokens[moved_sid] = new_token
+            self.sids[new_token] = moved
+        self.store.remove(old_token)
+        if self.summarizer:
+            self.summarizer.forget(old_token)
+        return old_token, new_token, moved
+    
+    def collect(self):
+        """Drop conversations that have been orphaned for longer than resume_ttl"""
+        cutoff = time.time() - self.resume_ttl
+        with self.lock:
+            expired = [token for token, since in self.orphaned.items() if since < cutoff]
+            for token in expired:
+                del self.orphaned[token]
+        if self.collect_orphans:
+            for token in expired:
+                self.store.remove(token)
+                if self.summarizer:
+                    self.summarizer.forget(token)
+        self.collected += len(expired)
+        return len(expired)
+    
+    def collect_loop(self, interval=60, sleep=time.sleep):
+        while True:
+            sleep(interval)
+            self.collect()
+    
+    def stats(self):
+        with self.lock:
+            return {
+                "connected_sids": len(self.tokens),
+                "active_conversations": len(self.sids),
+                "orphaned_conversations": len(self.orphaned),
+                "resumed": self.resumed,
+                "collected": self.collected
+            }
+
+class PayloadBuilder:
+    """Builds chat completion request bodies from cached JSON fragments.
+    
+    Every message is serialized once and kept in an LRU keyed on its role
+    and content, so a request only encodes the messages that are new since
+    the previous turn and the rest of the body is a join of cached bytes.
+    The system prompt is encoded up front and never looked up at all.
+    """
+    
+    OPEN = b'{"messages":['
+    
+    def __init__(self, system_message, max_fragments=10000):
+        self.system_message = system_message
+        self.system_fragment = self.encode("system", system_message)
+        self.max_fragments = max_fragments
+        self.fragments = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def encode(role, content):
+        return json.dumps({"role": role, "content": content}, ensure_ascii=False, separators=(",", ":")).encode()
+    
+    def body(self, messages, params, stream=False):
+        """Return the JSON request body for messages and model parameters as bytes"""
+        parts = []
+        misses = 0
+        with self.lock:
+            fragments = self.fragments
+            for message in messages:
+                content = message["content"]
+                if content is self.system_message:
+                    parts.append(self.system_fragment)
+                    continue
+                key = (message["role"], content)
+                fragment = fragments.get(key)
+                if fragment is None:
+                    misses += 1
+                    fragment = fragments[key] = self.encode(*key)
+                else:
+                    fragments.move_to_end(key)
+                parts.append(fragment)
+            while len(fragments) > self.max_fragments:
+                fragments.popitem(last=False)
+            self.hits += len(parts) - misses
+            self.misses += misses
+        
+        # The parameters are a handful of scalars, so they are cheap to encode each time
+        if stream:
+            params = dict(params, stream=True)
+        tail = json.dumps(params, separators=(",", ":")).encode()
+        return self.OPEN + b",".join(parts) + (b"]," + tail[1:] if len(tail) > 2 else b"]}")
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "fragments": len(self.fragments),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+class PreparedBodyMixin:
+    """Groq client that also accepts request bodies already serialized to JSON.
+    
+    The SDK passes bodies to httpx as Python objects to be encoded on every
+    request; a bytes body (from PayloadBuilder) is sent as it is. Mixed into
+    Groq as PreparedGroq by import_dependencies().
+    """
+    
+    def _build_request(self, options):
+        body = options.json_data
+        if not isinstance(body, bytes):
+            return super()._build_request(options)
+        options.json_data = None
+        try:
+            request = super()._build_request(options)
+        finally:
+            options.json_data = body
+        headers = request.headers.copy()
+        headers.pop("Content-Length", None)
+        headers["Content-Type"] = "application/json"
+        return httpx.Request(request.method, request.url, headers=headers, content=body, extensions=request.extensions)
+
+class Generation:
+    """One user message and the reply generated for it"""
+    __slots__ = ("id", "conversation", "message", "mode", "received", "started", "first_output", "streamed",
+                 "task", "cancelled", "done")
+    
+    def __init__(self, id, conversation, message, mode):
+        self.id = id
+        self.conversation = conversation
+        self.message = message
+        self.mode = mode
+        self.received = time.perf_counter()
+        self.started = None
+        self.first_output = None
+        # Characters streamed so far
+        self.streamed = 0
+        self.task = None
+        self.cancelled = None
+        self.done = False
+
+class GenerationRegistry:
+    """Per-conversation serial queue of messages and the reply in progress.
+    
+    A conversation generates one reply at a time, in the order its messages
+    arrived; up to max_queued more wait behind it. Past that the shed policy
+    decides: reject_newest refuses the new message, drop_oldest discards the
+    oldest waiting one (the reply in progress if nothing may wait) and merge
+    appends the new message to the newest waiting one. notify(conversation,
+    event, data) reports queue positions as they change, dropped messages
+    and cancelled replies.
+    
+    Cancelling kills the green thread producing the reply: the upstream
+    stream is closed and its slot freed straight away, and the partial reply
+    is neither stored nor emitted. Without eventlet the thread only notices
+    between chunks. The tokens and seconds saved are estimated from the
+    average completed reply.
+    """
+    
+    def __init__(self, spawn, max_queued=4, shed_policy="reject_newest", notify=None,
+                 expected_tokens=lambda: None, expected_seconds=lambda mode: None):
+        self.spawn = spawn
+        self.max_queued = max_queued
+        self.shed_policy = shed_policy
+        self.notify = notify
+        self.expected_tokens = expected_tokens
+        self.expected_seconds = expected_seconds
+        self.active = {}
+        # conversation -> deque of (generation, fn) waiting their turn
+        self.queued = {}
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.cancelled = {}
+        self.shed = {}
+        self.tokens_saved = 0
+        self.seconds_saved = 0.0
+    
+    def submit(self, conversation, message, mode, fn):
+        """Queue a message; fn(generation) generates its reply once earlier ones are done.
+        
+        Returns (status, generation, position): status is "started", "queued",
+        "merged" or "rejected", and position counts from 1 for the next to start.
+        """
+        dropped = superseded = None
+        with self.lock:
+            self.next_id += 1
+            generation = Generation(self.next_id, conversation, message, mode)
+            queue = self.queued.setdefault(conversation, deque())
+            if conversation not in self.active:
+                self.active[conversation] = generation
+                self._start(generation, fn)
+                return "started", generation, 0
+            
+            if len(queue) >= self.max_queued:
+                if self.shed_policy == "reject_newest" or (self.shed_policy == "merge" and not queue):
+                    self._count_shed("rejected")
+                    return "rejected", None, len(queue)
+                if self.shed_policy == "merge":
+                    newest = queue[-1][0]
+                    newest.message = f"{newest.message}\n\n{message}"
+                    self._count_shed("merged")
+                    return "merged", newest, len(queue)
+                if queue:
+                    dropped, _ = queue.popleft()
+                    self._count_shed("dropped")
+                else:
+                    superseded = self.active[conversation]
+            queue.append((generation, fn))
+            position = len(queue)
+        
+        if dropped is not None:
+            self._notify(conversation, "message_dropped", {"id": dropped.id})
+        if superseded is not None:
+            # Nothing may wait, so the newer message replaces the reply in progress
+            self.cancel(conversation, "superseded")
+            if generation.started is not None:
+                return "started", generation, 0
+        return "queued", generation, position
+    
+    def _start(self, generation, fn):
+        generation.started = time.perf_counter()
+        generation.task = self.spawn(self._run, generation, fn)
+    
+    def _run(self, generation, fn):
+        try:
+            fn(generation)
+        finally:
+            generation.done = True
+            self._advance(generation)
+    
+    def _advance(self, finished):
+        """Start the conversation's next queued message, if any, once a reply ends"""
+        conversation = finished.conversation
+        with self.lock:
+            if self.active.get(conversation) is not finished:
+                return
+            queue = self.queued.get(conversation)
+            if not queue:
+                del self.active[conversation]
+                self.queued.pop(conversation, None)
+                return
+            generation, fn = queue.popleft()
+            self.active[conversation] = generation
+            self._start(generation, fn)
+            waiting = [queued.id for queued, _ in queue]
+        for position, id in enumerate(waiting, 1):
+            self._notify(conversation, "message_queued", {"id": id, "position": position, "queued": len(waiting)})
+    
+    def cancel(self, conversation, reason, drop_queued=False):
+        """Abort the conversation's reply in progress; returns it, or None if there was none.
+        
+        Waiting messages then start in turn unless drop_queued discards them too.
+        """
+        with self.lock:
+            if drop_queued:
+                queue = self.queued.pop(conversation, None)
+                if queue:
+                    self._count_shed("discarded", len(queue))
+            generation = self.active.get(conversation)
+            if generation is None or generation.done or generation.cancelled:
+                return None
+            generation.cancelled = reason
+            self.cancelled[reason] = self.cancelled.get(reason, 0) + 1
+        
+        elapsed = time.perf_counter() - generation.started
+        tokens = max(0, int((self.expected_tokens() or 0) - generation.streamed // CHARS_PER_TOKEN))
+        seconds = max(0.0, (self.expected_seconds(generation.mode) or 0.0) - elapsed)
+        with self.lock:
+            self.tokens_saved += tokens
+            self.seconds_saved += seconds
+        cancelled_generations.inc(label=reason)
+        cancelled_tokens_saved.inc(tokens)
+        cancelled_seconds_saved.inc(seconds)
+        log_event("generation_cancelled", session=conversation, reason=reason, elapsed=round(elapsed, 3))
+        self._notify(conversation, "generation_cancelled", {"reason": reason})
+        
+        if kill_task(generation.task) and not generation.done:
+            # Killed before it ever ran, so its own cleanup won't; advancing twice is harmless
+            generation.done = True
+            self._advance(generation)
+        return generation
+    
+    def _count_shed(self, action, count=1):
+        # Called with the lock held
+        self.shed[action] = self.shed.get(action, 0) + count
+        shed_messages.inc(count, label=action)
+    
+    def _notify(self, conversation, event, data):
+        if self.notify is not None:
+            try:
+                self.notify(conversation, event, data)
+            except Exception as e:
+                logger.error(f"Message queue notification failed: {e}")
+    
+    def depth(self):
+        """Messages waiting across all conversations"""
+        with self.lock:
+            return sum(len(queue) for queue in self.queued.values())
+    
+    def stats(self):
+        with self.lock:
+            return {
+                "active": len(self.active),
+                "queued": sum(len(queue) for queue in self.queued.values()),
+                "max_queued": self.max_queued,
+                "shed_policy": self.shed_policy,
+                "shed": dict(self.shed),
+                "cancelled": dict(self.cancelled),
+                "tokens_saved": self.tokens_saved,
+                "seconds_saved": round(self.seconds_saved, 3)
+            }
+
+class GroqChatBot:
+    def __init__(self, store, context_builder, router, summarizer=None, response_cache=None, cache_mode="off",
+                 semantic_cache=None, single_flight=None, scheduler=None, transport=None, admission=None):
+        # Conversation history backend, prompt packing and optional summaries
+        self.store = store
+        self.context_builder = context_builder
+        
+        # Model choice, request parameters and fallback
+        self.router = router
+        self.summarizer = summarizer
+        
+        # Chat replies are only cached when opted in; with "deterministic" the
+        # cache is bypassed unless sampling is switched off (temperature 0)
+        self.response_cache = response_cache
+        self.cache_mode = cache_mode
+        
+        # Paraphrased first questions are answered from the semantic cache
+        self.semantic_cache = semantic_cache
+        
+        # Identical in-flight requests share one upstream call
+        self.single_flight = single_flight
+        
+        # Rate-limit budgets, fair queueing and retries
+        self.scheduler = scheduler
+        
+        # Pooled HTTP transport shared by every request
+        self.transport = transport
+        
+        # Background calls (summaries) only run while the admission controller has room
+        self.admission = admission
+        
+        # The Groq client is created on first use, so startup never waits for it
+        self._client = None
+        self.client_lock = threading.Lock()
+        
+        # Bound the number of concurrent upstream calls
+        self.upstream_slots = threading.BoundedSemaphore(MaxInflightRequests)
+        
+        # System message template
+        self.system_message = f"""Hello, I am {Username}, You are a very accurate and advanced AI chatbot named {Assistantname} which also has real-time up-to-date information from the internet.
+*** Do not tell time until I ask, do not talk too much, just answer the question.***
+*** Reply in only English, even if the question is in Hindi, reply in English.***
+*** Do not provide notes in the output, just answer the question and never mention your training data. ***"""
+        
+        # Request bodies are assembled from cached per-message JSON
+        self.payloads = PayloadBuilder(self.system_message, max_fragments=PayloadCacheSize)
+    
+    @property
+    def client(self):
+        if self._client is None:
+            with self.client_lock:
+                if self._client is None:
+                    self._client = self.create_client()
+        return self._client
+    
+    def create_client(self):
+        # Retries are left to the scheduler so they respect the shared rate budget
+        client = PreparedGroq(
+            api_key=GroqAPIKey,
+            max_retries=0,
+            http_client=self.transport.client if self.transport else None
+        )
+        # Resolve the client's platform headers up front: computing them the first time takes
+        # a lock that isn't green-thread aware and can deadlock concurrent first requests
+        _ = client.default_headers
+        log_event("groq_client_created", base_url=str(client.base_url))
+        return client
+    
+    def check_upstream(self):
+        """Raise unless Groq answers an authenticated request (the readiness check)"""
+        if not GroqAPIKey:
+            raise StartupError("GroqAPIKey is not set")
+        http = self.transport.client if self.transport else httpx
+        response = http.get(
+            f"{str(self.client.base_url).rstrip('/')}/openai/v1/models",
+            headers=self.client.auth_headers,
+            timeout=self.transport.timeout(5) if self.transport else 5
+        )
+        response.raise_for_status()
+    
+    def answer_prompt(self, prompt, session_id="batch"):
+        """Answer a standalone prompt with no stored history (batch mode); errors are raised"""
+        messages, _, _ = self.context_builder.build(
+            self.system_message, [ChatMessage("user", prompt)], self.router.max_completion_tokens
+        )
+        cache_key = self.cache_key(messages)
+        reply = self.cached_reply(messages, cache_key)
+        if reply is None:
+            started = time.perf_counter()
+            reply = self.make_groq_api_call(messages, session_id=session_id)
+            self.remember_reply(messages, cache_key, reply, time.perf_counter() - started)
+        return reply
+    
+    def add_to_history(self, user_id, role, content):
+        """Append a message to the user's conversation history"""
+        self.store.append(user_id, role, content)
+    
+    def build_messages(self, user_id):
+        """Build the message list sent to Groq from the system prompt and recent history"""
+        history = self.store.recent(user_id, self.context_builder.max_messages)
+        summary = self.summarizer.get(user_id) if self.summarizer else None
+        messages, prompt_tokens, dropped = self.context_builder.build(
+            self.system_message,
+            history,
+            self.router.max_completion_tokens,
+            summary
+        )
+        
+        if self.summarizer:
+            if summary is not None:
+                self.summarizer.record_usage(user_id, summary)
+            # Summaries always go to the default (cheapest) tier
+            self.summarizer.maybe_update(user_id, dropped, self.summary_call)
+        
+        return messages
+    
+    def summary_call(self, messages, **params):
+        """Groq call for a summary update, admitted as background work"""
+        if self.admission is None:
+            return self.make_groq_api_call(messages, tier=self.router.default_tier, **params)
+        admitted_at = self.admission.acquire(background=True)
+        try:
+            return self.make_groq_api_call(messages, tier=self.router.default_tier, **params)
+        finally:
+            self.admission.release(admitted_at)
+    
+    def cache_key(self, messages):
+        """Return the response cache key for a chat request, or None if it shouldn't be cached"""
+        if self.response_cache is None or self.cache_mode == "off":
+            return None
+        params = self.router.params(self.router.classify(messages))
+        if self.cache_mode == "deterministic" and params["temperature"] != 0:
+            return None
+        return ResponseCache.make_key(messages, params)
+    
+    def cached_reply(self, messages, cache_key):
+        """Look a request up in the exact cache, then (for a first turn) the semantic cache"""
+        if cache_key:
+            reply = self.response_cache.get(cache_key)
+            if reply is not None:
+                return reply
+        if self.is_first_turn(messages):
+            return self.semantic_cache.lookup(messages[-1]["content"])
+        return None
+    
+    def remember_reply(self, messages, cache_key, reply, latency):
+        """Store a fresh upstream reply in whichever caches apply to the request"""
+        if cache_key:
+            self.response_cache.put(cache_key, reply, latency)
+        if self.is_first_turn(messages):
+            self.semantic_cache.add(messages[-1]["content"], reply)
+    
+    def is_first_turn(self, messages):
+        # Only the system prompt and the user's question, no earlier history
+        return self.semantic_cache is not None and len(messages) == 2 and messages[-1]["role"] == "user"
+    
+    def describe_error(self, error):
+        """Turn an exception into a user-facing error message"""
+        error_msg = str(error)
+        log_event("chat_error", logging.ERROR, error=type(error).__name__, detail=error_msg)
+        errors_total.inc(label=type(error).__name__)
+        
+        if isinstance(error, RateLimitError):
+            return "⏰ Rate limit exceeded. Please wait and try again."
+        elif "rate" in error_msg.lower() or "limit" in error_msg.lower():
+            return "⏰ Rate limit exceeded. Please wait and try again."
+        elif "quota" in error_msg.lower():
+            return "💳 API quota exceeded. Please check your account."
+        elif "API key" in error_msg:
+            return "🔑 API key error. Please check your configuration."
+        else:
+            return f"❌ Sorry, there was an error: {error_msg}"
+    
+    def get_ai_response(self, user_message, user_id):
+        try:
+            log_event("processing_message", logging.DEBUG, session=user_id, content=user_message)
+            
+            # Add user message to history
+            self.add_to_history(user_id, "user", user_message)
+            
+            # Prepare messages for Groq
+            messages = self.build_messages(user_id)
+            
+            log_event("upstream_request", logging.DEBUG, session=user_id, stream=False)
+            
+            # Answer from the cache when possible, otherwise call Groq
+            cache_key = self.cache_key(messages)
+            ai_message = self.cached_reply(messages, cache_key)
+            if ai_message is None:
+                started = time.perf_counter()
+                ai_message = self.make_groq_api_call(messages, session_id=user_id)
+                self.remember_reply(messages, cache_key, ai_message, time.perf_counter() - started)
+            
+            log_event("reply_complete", session=user_id, stream=False, content=ai_message)
+            
+            # Add AI response to history
+            self.add_to_history(user_id, "assistant", ai_message)
+            
+            return ai_message
+            
+        except Exception as e:
+            return self.describe_error(e)
+    
+    def stream_ai_response(self, user_message, user_id):
+        """Yield the AI response chunk by chunk, storing the assembled reply once done"""
+        chunks = []
+        try:
+            log_event("processing_message", logging.DEBUG, session=user_id, content=user_message)
+            
+            self.add_to_history(user_id, "user", user_message)
+            messages = self.build_messages(user_id)
+            
+            cache_key = self.cache_key(messages)
+            cached = self.cached_reply(messages, cache_key)
+            if cached is not None:
+                # A cached reply is sent as a single chunk
+                chunks.append(cached)
+                yield cached
+            else:
+                log_event("upstream_request", logging.DEBUG, session=user_id, stream=True)
+                
+                started = time.perf_counter()
+                with closing(self.stream_groq_api_call(messages, session_id=user_id)) as stream:
+                    for chunk in stream:
+                        chunks.append(chunk)
+                        yield chunk
+                self.remember_reply(messages, cache_key, "".join(chunks), time.perf_counter() - started)
+                # Streamed chunks carry no usage block, so both sides are estimated
+                prompt_tokens.observe(sum(count_tokens(msg["content"]) for msg in messages))
+                completion_tokens.observe(count_tokens("".join(chunks)))
+            
+            ai_message = "".join(chunks)
+            log_event("reply_complete", session=user_id, stream=True, content=ai_message)
+            
+            self.add_to_history(user_id, "assistant", ai_message)
+            
+        except Exception as e:
+            # Partial output is not stored; the error text ends the bubble instead
+            error_message = self.describe_error(e)
+            yield ("\n" if chunks else "") + error_message
+    
+    def make_groq_api_call(self, messages, session_id=None, tier=None, **params):
+        """Make API call to Groq; keyword arguments override the routed model's parameters"""
+        tier = tier or self.router.classify(messages)
+        if self.single_flight is None:
+            return self.routed_completion(messages, tier, params, session_id)
+        key = SingleFlight.make_key("completion", messages, dict(self.router.params(tier), **params))
+        return self.single_flight.call(key, lambda: self.routed_completion(messages, tier, params, session_id))
+    
+    def routed_completion(self, messages, tier, overrides, session_id=None):
+        """Try the tier's models in order, falling back to the next on errors or timeouts"""
+        last_error = None
+        for model in self.router.candidates(tier):
+            if last_error is not None:
+                self.router.record_fallback()
+                log_event("upstream_fallback", logging.WARNING, session=session_id, model=model.name)
+            started = time.perf_counter()
+            try:
+                reply = self.request_completion(
+                    messages, dict(model.params, **overrides), session_id, self.request_timeout(model)
+                )
+            except AuthenticationError:
+                raise
+            except APIError as e:
+                self.router.record(model, time.perf_counter() - started, ok=False)
+                last_error = e
+                continue
+            latency = time.perf_counter() - started
+            self.router.record(model, latency, ok=True)
+            upstream_latency.observe(latency, model.name)
+            return reply
+        raise last_error
+    
+    def request_timeout(self, model):
+        return self.transport.timeout(model.timeout) if self.transport else model.timeout
+    
+    def warm_up(self, connections):
+        """Open pooled connections to Groq before the first user request"""
+        if self.transport is not None and connections:
+            self.transport.warmup(str(self.client.base_url), self.client.auth_headers, connections)
+            print(f"🔥 Warmed up {connections} upstream connection(s)")
+    
+    def keep_alive(self, interval):
+        """Ping Groq every interval seconds so pooled connections stay open"""
+        self.transport.keep_alive_loop(str(self.client.base_url), self.client.auth_headers, interval, socketio.sleep)
+    
+    def estimate_tokens(self, messages, params):
+        """Prompt tokens plus the most the completion can use, for the TPM budget"""
+        return sum(count_tokens(msg["content"]) for msg in messages) + params["max_tokens"]
+    
+    def create_completion(self, messages, params, timeout=None, stream=False):
+        """POST a chat completion whose body is built by the PayloadBuilder"""
+        return self.client.post(
+            "/openai/v1/chat/completions",
+            body=self.payloads.body(messages, params, stream),
+            options={"timeout": timeout},
+            cast_to=ChatCompletion,
+            stream=stream,
+            stream_cls=Stream[ChatCompletionChunk]
+        )
+    
+    def request_completion(self, messages, params, session_id=None, timeout=None):
+        def create():
+            with self.upstream_slots:
+                return self.create_completion(messages, params, timeout)
+        
+        try:
+            if self.scheduler is None:
+                response = create()
+            else:
+                estimated = self.estimate_tokens(messages, params)
+                response = self.scheduler.run(session_id, estimated, create)
+                if response.usage is not None:
+                    self.scheduler.record_usage(estimated, response.usage.total_tokens)
+            if response.usage is not None:
+                prompt_tokens.observe(response.usage.prompt_tokens)
+                completion_tokens.observe(response.usage.completion_tokens)
+            return response.choices[0].message.content
+        except Exception as e:
+            log_event("upstream_failed", logging.WARNING, session=session_id, error=type(e).__name__, detail=str(e))
+            raise e
+    
+    def stream_groq_api_call(self, messages, session_id=None):
+        """Make a streaming API call to Groq, yielding content deltas as they arrive"""
+        tier = self.router.classify(messages)
+        if self.single_flight is None:
+            return self.routed_completion_stream(messages, tier, session_id)
+        key = SingleFlight.make_key("stream", messages, self.router.params(tier))
+        return self.single_flight.stream(key, lambda: self.routed_completion_stream(messages, tier, session_id))
+    
+    def routed_completion_stream(self, messages, tier, session_id=None):
+        """Stream from the tier's best model; fall back only until the first chunk arrives"""
+        last_error = None
+        for model in self.router.candidates(tier):
+            if last_error is not None:
+                self.router.record_fallback()
+                log_event("upstream_fallback", logging.WARNING, session=session_id, model=model.name)
+            started = time.perf_counter()
+            stream = self.request_completion_stream(messages, model.params, session_id, self.request_timeout(model))
+            try:
+                first = next(stream, None)
+            except AuthenticationError:
+                raise
+            except APIError as e:
+                self.router.record(model, time.perf_counter() - started, ok=False)
+                last_error = e
+                continue
+            
+            with closing(stream):
+                try:
+                    if first is not None:
+                        yield first
+                    for chunk in stream:
+                        yield chunk
+                except APIError:
+                    self.router.record(model, time.perf_counter() - started, ok=False)
+                    raise
+            latency = time.perf_counter() - started
+            self.router.record(model, latency, ok=True)
+            upstream_latency.observe(latency, model.name)
+            return
+        raise last_error
+    
+    def request_completion_stream(self, messages, params, session_id=None, timeout=None):
+        def open_stream():
+            # The slot is held until the stream is consumed or the generator is closed
+            self.upstream_slots.acquire()
+            try:
+                return self.create_completion(messages, params, timeout, stream=True)
+            except BaseException:
+                self.upstream_slots.release()
+                raise
+        
+        stream = None
+        try:
+            # Only opening the stream is retried; once chunks flow, errors end the reply
+            if self.scheduler is None:
+                stream = open_stream()
+            else:
+                stream = self.scheduler.run(
+                    session_id,
+                    self.estimate_tokens(messages, params),
+                    open_stream
+                )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        except Exception as e:
+            log_event("upstream_failed", logging.WARNING, session=session_id, stream=True,
+                      error=type(e).__name__, detail=str(e))
+            raise e
+        finally:
+            if stream is not None:
+                stream.close()
+                self.upstream_slots.release()
+
+# Modern HTML template with contemporary design
+HTML_TEMPLATE = '''
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{{ assistantname }} - Advanced AI Chat</title>
+    <link href="{{ fontawesome_url }}" rel="stylesheet">
+    <link href="{{ stylesheet_url }}" rel="stylesheet">
+</head>
+<body data-assistant-name="{{ assistantname }}">
+    <div class="chat-container">
+        <div class="chat-header">
+            <div class="chat-header-content">
+                <h1>
+                    <div class="ai-icon">
+                        <i class="fas fa-robot"></i>
+                    </div>
+                    {{ assistantname }}
+                </h1>
+                <div id="status" class="status">
+                    <div class="status-indicator"></div>
+                    <span>Connecting...</span>
+                </div>
+            </div>
+        </div>
+        
+        <div id="chat-messages" class="chat-messages">
+            <div class="message ai fade-in">
+                <div class="message-avatar">
+                    <i class="fas fa-robot"></i>
+                </div>
+                <div class="message-bubble">
+                    <div class="message-content">
+                        🚀 Hey there! I'm {{ assistantname }}, your advanced AI assistant. I'm here to help you with anything you need. What would you like to explore today?
+                    </div>
+                </div>
+            </div>
+        </div>
+        
+        <div id="typing" class="typing-indicator">
+            <div class="typing-dots">
+                <span></span>
+                <span></span>
+                <span></span>
+            </div>
+            <span id="typingText">{{ assistantname }} is thinking...</span>
+        </div>
+        
+        <div class="chat-input-container">
+            <div class="input-wrapper">
+                <input type="text" id="messageInput" placeholder="Ask me anything..." maxlength="500">
+                <div class="action-buttons">
+                    <button id="sendButton" class="btn">
+                        <i class="fas fa-paper-plane"></i>
+                        Send
+                    </button>
+                    <button id="clearButton" class="btn">
+                        <i class="fas fa-trash"></i>
+                    </button>
+                </div>
+            </div>
+        </div>
+        
+        <div class="chat-info">
+            <div class="powered-by">
+                <i class="fas fa-bolt"></i>
+                <span>Powered by Groq Lightning Fast AI</span>
+                <i class="fas fa-brain"></i>
+            </div>
+        </div>
+    </div>
+
+    <script src="{{ socketio_url }}"></script>
+    <script src="{{ script_url }}"></script>
+</body>
+</html>
+'''
+
+# Page styles and client script, served as fingerprinted static assets
+STYLESHEET = '''
+:root {
+    --primary-gradient: linear-gradient(135deg, #667eea 0%, #764ba2 50%, #f093fb 100%);
+    --secondary-gradient: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
+    --dark-bg: #0f0f23;
+    --card-bg: rgba(255, 255, 255, 0.95);
+    --glass-bg: rgba(255, 255, 255, 0.1);
+    --text-primary: #2d3748;
+    --text-secondary: #718096;
+    --border-color: rgba(255, 255, 255, 0.2);
+    --success-color: #48bb78;
+    --error-color: #f56565;
+    --shadow-light: 0 20px 60px rgba(0, 0, 0, 0.1);
+    --shadow-heavy: 0 30px 80px rgba(0, 0, 0, 0.3);
+}
+
+* {
+    margin: 0;
+    padding: 0;
+    box-sizing: border-box;
+}
+
+body {
+    font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+    background: var(--dark-bg);
+    background-image: 
+        radial-gradient(circle at 20% 50%, rgba(120, 119, 198, 0.3) 0%, transparent 50%),
+        radial-gradient(circle at 80% 20%, rgba(255, 119, 198, 0.3) 0%, transparent 50%),
+        radial-gradient(circle at 40% 80%, rgba(120, 219, 226, 0.3) 0%, transparent 50%);
+    min-height: 100vh;
+    display: flex;
+    justify-content: center;
+    align-items: center;
+    padding: 20px;
+    overflow: hidden;
+    animation: backgroundShift 20s ease-in-out infinite alternate;
+}
+
+@keyframes backgroundShift {
+    0% {
+        background-position: 0% 0%, 100% 100%, 50% 50%;
+    }
+    100% {
+        background-position: 100% 100%, 0% 0%, 25% 75%;
+    }
+}
+
+.chat-container {
+    background: var(--glass-bg);
+    backdrop-filter: blur(20px);
+    border: 1px solid var(--border-color);
+    border-radius: 24px;
+    box-shadow: var(--shadow-heavy);
+    width: 100%;
+    max-width: 900px;
+    height: 90vh;
+    display: flex;
+    flex-direction: column;
+    overflow: hidden;
+    position: relative;
+    animation: slideInUp 0.8s cubic-bezier(0.16, 1, 0.3, 1);
+}
+
+@keyframes slideInUp {
+    from {
+        opacity: 0;
+        transform: translateY(60px);
+    }
+    to {
+        opacity: 1;
+        transform: translateY(0);
+    }
+}
+
+.chat-header {
+    background: var(--primary-gradient);
+    padding: 25px 30px;
+    text-align: center;
+    position: relative;
+    overflow: hidden;
+}
+
+.chat-header::before {
+    content: '';
+    position: absolute;
+    top: -50%;
+    left: -50%;
+    width: 200%;
+    height: 200%;
+    background: linear-gradient(45deg, transparent, rgba(255,255,255,0.1), transparent);
+    transform: rotate(45deg);
+    animation: shimmer 3s linear infinite;
+}
+
+@keyframes shimmer {
+    0% { transform: translateX(-100%) rotate(45deg); }
+    100% { transform: translateX(100%) rotate(45deg); }
+}
+
+.chat-header-content {
+    position: relative;
+    z-index: 2;
+}
+
+.chat-header h1 {
+    font-size: 2rem;
+    font-weight: 700;
+    color: white;
+    margin-bottom: 8px;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    gap: 12px;
+}
+
+.ai-icon {
+    width: 40px;
+    height: 40px;
+    background: rgba(255,255,255,0.2);
+    border-radius: 12px;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    animation: pulse 2s ease-in-out infinite;
+}
+
+@keyframes pulse {
+    0%, 100% { transform: scale(1); }
+    50% { transform: scale(1.05); }
+}
+
+.status {
+    font-size: 0.95rem;
+    color: rgba(255,255,255,0.9);
+    font-weight: 500;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    gap: 8px;
+}
+
+.status-indicator {
+    width: 8px;
+    height: 8px;
+    background: var(--success-color);
+    border-radius: 50%;
+    animation: statusPulse 2s ease-in-out infinite;
+}
+
+@keyframes statusPulse {
+    0%, 100% { opacity: 1; }
+    50% { opacity: 0.5; }
+}
+
+.chat-messages {
+    flex: 1;
+    padding: 30px;
+    overflow-y: auto;
+    background: transparent;
+    scroll-behavior: smooth;
+}
+
+.message {
+    margin-bottom: 25px;
+    display: flex;
+    align-items: flex-end;
+    gap: 12px;
+    animation: messageSlide 0.5s cubic-bezier(0.16, 1, 0.3, 1);
+}
+
+@keyframes messageSlide {
+    from {
+        opacity: 0;
+        transform: translateY(20px);
+    }
+    to {
+        opacity: 1;
+        transform: translateY(0);
+    }
+}
+
+.message.user {
+    flex-direction: row-reverse;
+}
+
+.message-avatar {
+    width: 40px;
+    height: 40px;
+    border-radius: 50%;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    font-size: 1.2rem;
+    font-weight: 600;
+    flex-shrink: 0;
+}
+
+.message.ai .message-avatar {
+    background: var(--secondary-gradient);
+    color: white;
+}
+
+.message.user .message-avatar {
+    background: var(--primary-gradient);
+    color: white;
+}
+
+.message-bubble {
+    max-width: 70%;
+    position: relative;
+}
+
+.message-content {
+    padding: 16px 22px;
+    border-radius: 18px;
+    position: relative;
+    word-wrap: break-word;
+    line-height: 1.5;
+    font-size: 0.95rem;
+    backdrop-filter: blur(10px);
+    border: 1px solid rgba(255,255,255,0.1);
+}
+
+.message.user .message-content {
+    background: var(--primary-gradient);
+    color: white;
+    border-bottom-right-radius: 6px;
+    box-shadow: 0 8px 32px rgba(102, 126, 234, 0.3);
+}
+
+.message.ai .message-content {
+    background: var(--card-bg);
+    color: var(--text-primary);
+    border-bottom-left-radius: 6px;
+    box-shadow: var(--shadow-light);
+}
+
+.message-time {
+    font-size: 0.75rem;
+    color: rgba(255,255,255,0.7);
+    margin-top: 6px;
+    text-align: right;
+}
+
+.message.ai .message-time {
+    color: var(--text-secondary);
+    text-align: left;
+}
+
+.typing-indicator {
+    display: none;
+    padding: 20px 30px;
+    color: rgba(255,255,255,0.8);
+    font-style: italic;
+}
+
+.typing-indicator.show {
+    display: flex;
+    align-items: center;
+    gap: 10px;
+}
+
+.typing-dots {
+    display: flex;
+    gap: 4px;
+}
+
+.typing-dots span {
+    width: 8px;
+    height: 8px;
+    background: var(--secondary-gradient);
+    border-radius: 50%;
+    animation: typingDots 1.4s ease-in-out infinite both;
+}
+
+.typing-dots span:nth-child(1) { animation-delay: -0.32s; }
+.typing-dots span:nth-child(2) { animation-delay: -0.16s; }
+
+@keyframes typingDots {
+    0%, 80%, 100% {
+        transform: scale(0);
+    }
+    40% {
+        transform: scale(1);
+    }
+}
+
+.chat-input-container {
+    padding: 25px 30px;
+    background: rgba(255,255,255,0.05);
+    backdrop-filter: blur(20px);
+    border-top: 1px solid var(--border-color);
+}
+
+.input-wrapper {
+    display: flex;
+    gap: 12px;
+    align-items: center;
+    background: var(--card-bg);
+    border-radius: 50px;
+    padding: 8px 8px 8px 24px;
+    box-shadow: var(--shadow-light);
+    border: 1px solid rgba(255,255,255,0.2);
+    transition: all 0.3s cubic-bezier(0.16, 1, 0.3, 1);
+}
+
+.input-wrapper:focus-within {
+    box-shadow: 0 0 0 2px rgba(102, 126, 234, 0.3), var(--shadow-light);
+    border-color: rgba(102, 126, 234, 0.5);
+}
+
+#messageInput {
+    flex: 1;
+    border: none;
+    outline: none;
+    font-size: 1rem;
+    background: transparent;
+    color: var(--text-primary);
+    padding: 12px 0;
+}
+
+#messageInput::placeholder {
+    color: var(--text-secondary);
+}
+
+.action-buttons {
+    display: flex;
+    gap: 8px;
+}
+
+.btn {
+    border: none;
+    border-radius: 50px;
+    cursor: pointer;
+    font-weight: 600;
+    font-size: 0.9rem;
+    display: flex;
+    align-items: center;
+    gap: 8px;
+    transition: all 0.3s cubic-bezier(0.16, 1, 0.3, 1);
+    position: relative;
+    overflow: hidden;
+}
+
+.btn::before {
+    content: '';
+    position: absolute;
+    top: 50%;
+    left: 50%;
+    width: 0;
+    height: 0;
+    background: rgba(255,255,255,0.2);
+    border-radius: 50%;
+    transition: all 0.3s cubic-bezier(0.16, 1, 0.3, 1);
+    transform: translate(-50%, -50%);
+}
+
+.btn:hover::before {
+    width: 120%;
+    height: 120%;
+}
+
+.btn:active {
+    transform: scale(0.95);
+}
+
+#sendButton {
+    background: var(--secondary-gradient);
+    color: white;
+    padding: 12px 20px;
+    box-shadow: 0 4px 20px rgba(79, 172, 254, 0.3);
+}
+
+#sendButton:hover {
+    box-shadow: 0 8px 30px rgba(79, 172, 254, 0.4);
+    transform: translateY(-2px);
+}
+
+#sendButton:disabled {
+    opacity: 0.6;
+    cursor: not-allowed;
+    transform: none;
+}
+
+#clearButton {
+    background: linear-gradient(135deg, #ff6b6b 0%, #ff8e8e 100%);
+    color: white;
+    padding: 12px 16px;
+    box-shadow: 0 4px 20px rgba(255, 107, 107, 0.3);
+}
+
+#clearButton:hover {
+    box-shadow: 0 8px 30px rgba(255, 107, 107, 0.4);
+    transform: translateY(-2px);
+}
+
+.load-earlier {
+    display: block;
+    margin: 0 auto 20px;
+    padding: 6px 14px;
+    border: 1px solid rgba(255,255,255,0.2);
+    border-radius: 16px;
+    background: rgba(255,255,255,0.05);
+    color: rgba(255,255,255,0.8);
+    font-size: 0.8rem;
+    cursor: pointer;
+}
+
+.load-earlier:hover {
+    background: rgba(255,255,255,0.1);
+}
+
+.chat-info {
+    text-align: center;
+    padding: 15px;
+    font-size: 0.85rem;
+    color: rgba(255,255,255,0.7);
+    background: rgba(255,255,255,0.03);
+}
+
+.powered-by {
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    gap: 8px;
+}
+
+/* Custom scrollbar */
+.chat-messages::-webkit-scrollbar {
+    width: 6px;
+}
+
+.chat-messages::-webkit-scrollbar-track {
+    background: transparent;
+}
+
+.chat-messages::-webkit-scrollbar-thumb {
+    background: rgba(255,255,255,0.3);
+    border-radius: 10px;
+}
+
+.chat-messages::-webkit-scrollbar-thumb:hover {
+    background: rgba(255,255,255,0.5);
+}
+
+/* Mobile responsive */
+@media (max-width: 768px) {
+    body {
+        padding: 10px;
+    }
+
+    .chat-container {
+        height: 95vh;
+        border-radius: 16px;
+        max-width: none;
+    }
+
+    .chat-header {
+        padding: 20px;
+    }
+
+    .chat-header h1 {
+        font-size: 1.6rem;
+    }
+
+    .chat-messages {
+        padding: 20px;
+    }
+
+    .message-bubble {
+        max-width: 85%;
+    }
+
+    .chat-input-container {
+        padding: 20px;
+    }
+
+    .action-buttons {
+        flex-direction: column;
+    }
+
+    .btn {
+        padding: 10px 16px;
+    }
+}
+
+/* Loading animation */
+@keyframes fadeIn {
+    from { opacity: 0; }
+    to { opacity: 1; }
+}
+
+.fade-in {
+    animation: fadeIn 0.5s ease-in-out;
+}
+
+/* Connection status styles */
+.status.connected {
+    color: var(--success-color);
+}
+
+.status.error {
+    color: var(--error-color);
+}
+'''
+
+CLIENT_SCRIPT = '''
+// Initialize Socket.IO connection; the stored token resumes the conversation after a reload or reconnect
+const SESSION_KEY = 'chatSessionToken';
+const socket = io({
+    auth: (cb) => cb({session: localStorage.getItem(SESSION_KEY)})
+});
+
+// DOM elements
+const messageInput = document.getElementById('messageInput');
+const sendButton = document.getElementById('sendButton');
+const clearButton = document.getElementById('clearButton');
+const chatMessages = document.getElementById('chat-messages');
+const statusDiv = document.getElementById('status');
+const typingDiv = document.getElementById('typing');
+const typingText = document.getElementById('typingText');
+const thinkingText = typingText.textContent;
+
+// Socket event handlers
+socket.on('connect', function() {
+    console.log('✅ Connected to server');
+    updateStatus('Connected & Ready', 'connected');
+});
+
+socket.on('status', function(data) {
+    updateStatus(data.msg, 'connected');
+});
+
+// History cursors: lastSeq is the newest message shown, earliestSeq the oldest
+let lastSeq = null;
+let earliestSeq = null;
+
+socket.on('session', function(data) {
+    localStorage.setItem(SESSION_KEY, data.token);
+    if (data.reset) {
+        // Another tab (or this one) cleared the chat
+        showCleared();
+        lastSeq = 0;
+        earliestSeq = null;
+    } else if (data.resumed && lastSeq === null) {
+        // Fresh page: show the most recent page of the conversation
+        socket.emit('fetch_history', {}, function(page) {
+            renderHistory(page, true);
+            lastSeq = page.after || 0;
+        });
+    } else if (data.resumed && data.last_seq > lastSeq) {
+        // Reconnected: fetch only what was missed
+        fetchMissed();
+    } else if (lastSeq === null) {
+        lastSeq = data.last_seq;
+    }
+});
+
+function fetchMissed() {
+    socket.emit('fetch_history', {after: lastSeq}, function(page) {
+        if (page.error) return;
+        for (const message of page.messages) {
+            addHistoryMessage(message, chatMessages.lastChild);
         }
+        lastSeq = page.after;
+        scrollToBottom();
+        if (page.has_more) fetchMissed();
+    });
+}
+
+function loadEarlier() {
+    socket.emit('fetch_history', {before: earliestSeq}, function(page) {
+        renderHistory(page, false);
+    });
+}
+
+function renderHistory(page, latest) {
+    if (page.error || !page.messages.length) return;
+    const loadButton = document.getElementById('loadEarlier');
+    if (loadButton) loadButton.remove();
+    // Older pages go above what is shown; the greeting stays first
+    let anchor = chatMessages.firstElementChild;
+    for (const message of page.messages) {
+        anchor = addHistoryMessage(message, anchor);
+    }
+    earliestSeq = page.before;
+    if (page.has_more) {
+        const button = document.createElement('button');
+        button.id = 'loadEarlier';
+        button.className = 'load-earlier';
+        button.textContent = 'Load earlier messages';
+        button.addEventListener('click', loadEarlier);
+        chatMessages.firstElementChild.after(button);
+    }
+    if (latest) scrollToBottom();
+}
+
+function addHistoryMessage(message, after) {
+    const messageDiv = buildMessage(message.content, message.role === 'user' ? 'user' : 'ai');
+    after.after(messageDiv);
+    addTimestamp(messageDiv.querySelector('.message-content'), message.timestamp.slice(11, 19));
+    return messageDiv;
+}
+
+socket.on('ai_response', function(data) {
+    hideTyping();
+    addMessage(data.message, 'ai', data.timestamp);
+    if (data.seq) lastSeq = data.seq;
+    enableSending();
+});
+
+// Rate-limit queueing: show where the message is instead of a bare spinner
+socket.on('queue_status', function(data) {
+    if (data.retrying) {
+        typingText.textContent = `Upstream busy, retrying in ${data.retry_in}s...`;
+    } else {
+        typingText.textContent = `Waiting for capacity: #${data.position} of ${data.queue_depth} (${data.waited}s)`;
+    }
+});
+
+// Messages sent while a reply is in progress wait their turn on the server
+let pendingId = null;
+
+socket.on('message_queued', function(data) {
+    if (typingDiv.classList.contains('show')) {
+        typingText.textContent = `Queued behind the current reply: #${data.position} of ${data.queued}`;
+    }
+});
+
+socket.on('message_dropped', function(data) {
+    if (data.id === pendingId) {
+        pendingId = null;
+        hideTyping();
+        addMessage('⚠ Too many messages were waiting, so this one was dropped. Please send it again.', 'ai');
+        enableSending();
+    }
+});
 
-        /* Custom scrollbar */
-        .chat-messages::-webkit-scrollbar {
-            width: 6px;
+// Streaming: chunks are appended to the current AI bubble
+let streamingContent = null;
+
+socket.on('ai_response_chunk', function(data) {
+    if (!streamingContent) {
+        hideTyping();
+        streamingContent = addMessage('', 'ai');
+    }
+    streamingContent.textContent += data.chunk;
+    scrollToBottom();
+});
+
+// The reply was stopped, superseded by a newer message or dropped with a cleared chat
+socket.on('generation_cancelled', function(data) {
+    if (streamingContent) {
+        addTimestamp(streamingContent, 'stopped');
+        streamingContent = null;
+    }
+    if (data.reason !== 'superseded') {
+        hideTyping();
+        enableSending();
+    }
+});
+
+// The server turned the message away instead of letting it wait on a slow upstream
+socket.on('server_busy', function(data) {
+    hideTyping();
+    addMessage(`⏳ The server is busy right now. Please try again in ${data.retry_after}s.`, 'ai');
+    enableSending();
+});
+
+socket.on('ai_response_done', function(data) {
+    hideTyping();
+    if (!streamingContent) {
+        streamingContent = addMessage('', 'ai');
+    }
+    addTimestamp(streamingContent, data.timestamp);
+    streamingContent = null;
+    if (data.seq) lastSeq = data.seq;
+    enableSending();
+});
+
+// Functions
+function sendMessage() {
+    const message = messageInput.value.trim();
+    if (message === '') return;
+
+    // Add user message to chat
+    addMessage(message, 'user');
+
+    // Clear input and disable sending
+    messageInput.value = '';
+    disableSending();
+    showTyping();
+
+    // Send message to server; the ack says whether it started, is queued or was turned away
+    socket.emit('user_message', {message: message}, function(result) {
+        if (result.status === 'rejected') {
+            hideTyping();
+            addMessage(`⚠ Still working on ${result.queued} earlier message(s), so this one was not sent. Please try again shortly.`, 'ai');
+            enableSending();
+        } else {
+            pendingId = result.id;
         }
+    });
+}
+
+function addMessage(content, sender, timestamp = null) {
+    const messageDiv = buildMessage(content, sender);
+    chatMessages.appendChild(messageDiv);
+    const contentDiv = messageDiv.querySelector('.message-content');
+
+    if (timestamp) {
+        addTimestamp(contentDiv, timestamp);
+    }
+
+    scrollToBottom();
+    return contentDiv;
+}
+
+function buildMessage(content, sender) {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `message ${sender} fade-in`;
 
-        .chat-messages::-webkit-scrollbar-track {
-            background: transparent;
-        }
+    const avatarDiv = document.createElement('div');
+    avatarDiv.className = 'message-avatar';
+    avatarDiv.innerHTML = sender === 'ai' ? '<i class="fas fa-robot"></i>' : '<i class="fas fa-user"></i>';
 
-        .chat-messages::-webkit-scrollbar-thumb {
-            background: rgba(255,255,255,0.3);
-            border-radius: 10px;
-        }
+    const bubbleDiv = document.createElement('div');
+    bubbleDiv.className = 'message-bubble';
 
-        .chat-messages::-webkit-scrollbar-thumb:hover {
-            background: rgba(255,255,255,0.5);
-        }
+    const contentDiv = document.createElement('div');
+    contentDiv.className = 'message-content';
+    contentDiv.textContent = content;
 
-        /* Mobile responsive */
-        @media (max-width: 768px) {
-            body {
-                padding: 10px;
-            }
-            
-            .chat-container {
-                height: 95vh;
-                border-radius: 16px;
-                max-width: none;
-            }
-            
-            .chat-header {
-                padding: 20px;
-            }
-            
-            .chat-header h1 {
-                font-size: 1.6rem;
-            }
-            
-            .chat-messages {
-                padding: 20px;
-            }
-            
-            .message-bubble {
-                max-width: 85%;
-            }
-            
-            .chat-input-container {
-                padding: 20px;
-            }
-            
-            .action-buttons {
-                flex-direction: column;
-            }
-            
-            .btn {
-                padding: 10px 16px;
-            }
-        }
+    bubbleDiv.appendChild(contentDiv);
 
-        /* Loading animation */
-        @keyframes fadeIn {
-            from { opacity: 0; }
-            to { opacity: 1; }
-        }
+    messageDiv.appendChild(avatarDiv);
+    messageDiv.appendChild(bubbleDiv);
+    return messageDiv;
+}
 
-        .fade-in {
-            animation: fadeIn 0.5s ease-in-out;
-        }
+function addTimestamp(contentDiv, timestamp) {
+    const timeDiv = document.createElement('div');
+    timeDiv.className = 'message-time';
+    timeDiv.textContent = timestamp;
+    contentDiv.parentNode.appendChild(timeDiv);
+}
 
-        /* Connection status styles */
-        .status.connected {
-            color: var(--success-color);
-        }
+function clearChat() {
+    // The server drops the conversation and moves every open tab to a new token
+    socket.emit('reset_session');
+    showCleared();
+}
 
-        .status.error {
-            color: var(--error-color);
-        }
-    </style>
-</head>
-<body>
-    <div class="chat-container">
-        <div class="chat-header">
-            <div class="chat-header-content">
-                <h1>
-                    <div class="ai-icon">
-                        <i class="fas fa-robot"></i>
-                    </div>
-                    {{ assistantname }}
-                </h1>
-                <div id="status" class="status">
-                    <div class="status-indicator"></div>
-                    <span>Connecting...</span>
-                </div>
-            </div>
-        </div>
-        
-        <div id="chat-messages" class="chat-messages">
-            <div class="message ai fade-in">
-                <div class="message-avatar">
-                    <i class="fas fa-robot"></i>
-                </div>
-                <div class="message-bubble">
-                    <div class="message-content">
-                        🚀 Hey there! I'm {{ assistantname }}, your advanced AI assistant. I'm here to help you with anything you need. What would you like to explore today?
-                    </div>
-                </div>
-            </div>
-        </div>
-        
-        <div id="typing" class="typing-indicator">
-            <div class="typing-dots">
-                <span></span>
-                <span></span>
-                <span></span>
-            </div>
-            <span>{{ assistantname }} is thinking...</span>
-        </div>
-        
-        <div class="chat-input-container">
-            <div class="input-wrapper">
-                <input type="text" id="messageInput" placeholder="Ask me anything..." maxlength="500">
-                <div class="action-buttons">
-                    <button id="sendButton" class="btn">
-                        <i class="fas fa-paper-plane"></i>
-                        Send
-                    </button>
-                    <button id="clearButton" class="btn">
-                        <i class="fas fa-trash"></i>
-                    </button>
-                </div>
+function showCleared() {
+    // Any remaining chunks of an in-flight reply start a fresh bubble
+    streamingContent = null;
+    chatMessages.innerHTML = `
+        <div class="message ai fade-in">
+            <div class="message-avatar">
+                <i class="fas fa-robot"></i>
             </div>
-        </div>
-        
-        <div class="chat-info">
-            <div class="powered-by">
-                <i class="fas fa-bolt"></i>
-                <span>Powered by Groq Lightning Fast AI</span>
-                <i class="fas fa-brain"></i>
+            <div class="message-bubble">
+                <div class="message-content"></div>
             </div>
         </div>
-    </div>
+    `;
+    // The script is shared across deployments, so the name comes from the page
+    chatMessages.querySelector('.message-content').textContent =
+        `🚀 Chat cleared! I'm ${document.body.dataset.assistantName}, ready to help you again. What can I do for you?`;
+}
 
-    <script>
-        // Initialize Socket.IO connection
-        const socket = io();
-        
-        // DOM elements
-        const messageInput = document.getElementById('messageInput');
-        const sendButton = document.getElementById('sendButton');
-        const clearButton = document.getElementById('clearButton');
-        const chatMessages = document.getElementById('chat-messages');
-        const statusDiv = document.getElementById('status');
-        const typingDiv = document.getElementById('typing');
-        
-        // Socket event handlers
-        socket.on('connect', function() {
-            console.log('✅ Connected to server');
-            updateStatus('Connected & Ready', 'connected');
-        });
-        
-        socket.on('status', function(data) {
-            updateStatus(data.msg, 'connected');
-        });
-        
-        socket.on('ai_response', function(data) {
-            hideTyping();
-            addMessage(data.message, 'ai', data.timestamp);
-            enableSending();
-        });
-        
-        // Functions
-        function sendMessage() {
-            const message = messageInput.value.trim();
-            if (message === '') return;
-            
-            // Add user message to chat
-            addMessage(message, 'user');
-            
-            // Clear input and disable sending
-            messageInput.value = '';
-            disableSending();
-            showTyping();
-            
-            // Send message to server
-            socket.emit('user_message', {message: message});
-        }
-        
-        function addMessage(content, sender, timestamp = null) {
-            const messageDiv = document.createElement('div');
-            messageDiv.className = `message ${sender} fade-in`;
-            
-            const avatarDiv = document.createElement('div');
-            avatarDiv.className = 'message-avatar';
-            avatarDiv.innerHTML = sender === 'ai' ? '<i class="fas fa-robot"></i>' : '<i class="fas fa-user"></i>';
-            
-            const bubbleDiv = document.createElement('div');
-            bubbleDiv.className = 'message-bubble';
-            
-            const contentDiv = document.createElement('div');
-            contentDiv.className = 'message-content';
-            contentDiv.textContent = content;
-            
-            bubbleDiv.appendChild(contentDiv);
-            
-            if (timestamp) {
-                const timeDiv = document.createElement('div');
-                timeDiv.className = 'message-time';
-                timeDiv.textContent = timestamp;
-                bubbleDiv.appendChild(timeDiv);
-            }
-            
-            messageDiv.appendChild(avatarDiv);
-            messageDiv.appendChild(bubbleDiv);
-            
-            chatMessages.appendChild(messageDiv);
-            scrollToBottom();
-        }
-        
-        function clearChat() {
-            chatMessages.innerHTML = `
-                <div class="message ai fade-in">
-                    <div class="message-avatar">
-                        <i class="fas fa-robot"></i>
-                    </div>
-                    <div class="message-bubble">
-                        <div class="message-content">
-                            🚀 Chat cleared! I'm {{ assistantname }}, ready to help you again. What can I do for you?
-                        </div>
-                    </div>
-                </div>
-            `;
-        }
-        
-        function scrollToBottom() {
-            chatMessages.scrollTop = chatMessages.scrollHeight;
-        }
-        
-        function disableSending() {
-            sendButton.disabled = true;
-            sendButton.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Sending...';
-            messageInput.disabled = true;
-        }
-        
-        function enableSending() {
-            sendButton.disabled = false;
-            sendButton.innerHTML = '<i class="fas fa-paper-plane"></i> Send';
-            messageInput.disabled = false;
-            messageInput.focus();
-        }
-        
-        function showTyping() {
-            typingDiv.classList.add('show');
-            scrollToBottom();
-        }
-        
-        function hideTyping() {
-            typingDiv.classList.remove('show');
-        }
-        
-        function updateStatus(message, type = '') {
-            const statusSpan = statusDiv.querySelector('span');
-            statusSpan.textContent = message;
-            statusDiv.className = `status ${type}`;
-        }
-        
-        // Event listeners
-        sendButton.addEventListener('click', sendMessage);
-        clearButton.addEventListener('click', clearChat);
-        
-        messageInput.addEventListener('keypress', function(e) {
-            if (e.key === 'Enter' && !sendButton.disabled) {
-                sendMessage();
-            }
-        });
-        
-        messageInput.addEventListener('input', function() {
-            const charCount = this.value.length;
-            const wrapper = this.closest('.input-wrapper');
-            if (charCount > 450) {
-                wrapper.style.borderColor = '#ff6b6b';
-            } else {
-                wrapper.style.borderColor = 'rgba(255,255,255,0.2)';
-            }
-        });
-        
-        // Focus on input when page loads
-        window.addEventListener('load', function() {
-            messageInput.focus();
-        });
-        
-        // Handle connection errors
-        socket.on('connect_error', function() {
-            updateStatus('Connection Failed', 'error');
-        });
-        
-        socket.on('disconnect', function() {
-            updateStatus('Disconnected', 'error');
-        });
-        
-        // Auto-resize input based on content
-        messageInput.addEventListener('input', function() {
-            this.style.height = 'auto';
-            this.style.height = Math.min(this.scrollHeight, 100) + 'px';
-        });
-    </script>
-</body>
-</html>
+function scrollToBottom() {
+    chatMessages.scrollTop = chatMessages.scrollHeight;
+}
+
+// While a reply is being generated the send button stops it instead
+let generating = false;
+
+function disableSending() {
+    generating = true;
+    sendButton.innerHTML = '<i class="fas fa-stop"></i> Stop';
+    messageInput.disabled = true;
+}
+
+function enableSending() {
+    generating = false;
+    sendButton.disabled = false;
+    sendButton.innerHTML = '<i class="fas fa-paper-plane"></i> Send';
+    messageInput.disabled = false;
+    messageInput.focus();
+}
+
+function showTyping() {
+    typingDiv.classList.add('show');
+    scrollToBottom();
+}
+
+function hideTyping() {
+    typingDiv.classList.remove('show');
+    typingText.textContent = thinkingText;
+}
+
+function updateStatus(message, type = '') {
+    const statusSpan = statusDiv.querySelector('span');
+    statusSpan.textContent = message;
+    statusDiv.className = `status ${type}`;
+}
+
+function stopGeneration() {
+    sendButton.disabled = true;
+    socket.emit('cancel_generation', {}, function(result) {
+        // Nothing was running any more (the reply finished meanwhile)
+        if (!result.cancelled) sendButton.disabled = false;
+    });
+}
+
+// Event listeners
+sendButton.addEventListener('click', function() {
+    if (generating) {
+        stopGeneration();
+    } else {
+        sendMessage();
+    }
+});
+clearButton.addEventListener('click', clearChat);
+
+messageInput.addEventListener('keypress', function(e) {
+    if (e.key === 'Enter' && !generating) {
+        sendMessage();
+    }
+});
+
+messageInput.addEventListener('input', function() {
+    const charCount = this.value.length;
+    const wrapper = this.closest('.input-wrapper');
+    if (charCount > 450) {
+        wrapper.style.borderColor = '#ff6b6b';
+    } else {
+        wrapper.style.borderColor = 'rgba(255,255,255,0.2)';
+    }
+});
+
+// Focus on input when page loads
+window.addEventListener('load', function() {
+    messageInput.focus();
+});
+
+// Handle connection errors
+socket.on('connect_error', function() {
+    updateStatus('Connection Failed', 'error');
+});
+
+socket.on('disconnect', function() {
+    updateStatus('Disconnected', 'error');
+});
+
+// Auto-resize input based on content
+messageInput.addEventListener('input', function() {
+    this.style.height = 'auto';
+    this.style.height = Math.min(this.scrollHeight, 100) + 'px';
+});
 '''
 
-@app.route('/')
+SOCKETIO_CDN = "https://cdnjs.cloudflare.com/ajax/libs/socket.io/4.0.1/socket.io.js"
+FONTAWESOME_CDN = "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css"
+
+# Fingerprinted assets never change under the same URL; the page itself is revalidated
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+PAGE_CACHE = "no-cache"
+
+try:
+    import brotli # type: ignore
+except ImportError:
+    brotli = None
+
+class PrecompressedAsset:
+    """A response body prepared once: identity, gzip and (if available) brotli
+    variants, each with its own strong ETag, served with conditional GETs."""
+    
+    def __init__(self, body, content_type, cache_control):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.fingerprint = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(body, quality=11)
+    
+    def etag(self, encoding):
+        return self.fingerprint if encoding == "identity" else f"{self.fingerprint}-{encoding}"
+    
+    def choose_encoding(self, accept_encodings):
+        best, best_quality = "identity", 0
+        for encoding in ["br", "gzip"]:
+            quality = accept_encodings.quality(encoding) if encoding in self.variants else 0
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+    
+    def response(self):
+        encoding = self.choose_encoding(request.accept_encodings)
+        etag = self.etag(encoding)
+        headers = {
+            "Cache-Control": self.cache_control,
+            "ETag": f'"{etag}"',
+            "Vary": "Accept-Encoding"
+        }
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        body = self.variants[encoding]
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(body, content_type=self.content_type, headers=headers)
+
+def vendored_url(filename):
+    """URL of a file under VendorDir with a content fingerprint, or None if it isn't there"""
+    if not VendorDir:
+        return None
+    path = os.path.join(VendorDir, filename)
+    try:
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:16]
+    except OSError:
+        print(f"⚠ {path} not found, loading it from the CDN")
+        return None
+    return f"/vendor/{filename}?v={digest}"
+
+def build_pages(app):
+    """Compress the styles and script under content-hashed names, and render the page once:
+    it only depends on settings. Returns the assets by name and the page."""
+    stylesheet_asset = PrecompressedAsset(STYLESHEET, "text/css; charset=utf-8", IMMUTABLE_CACHE)
+    script_asset = PrecompressedAsset(CLIENT_SCRIPT, "application/javascript; charset=utf-8", IMMUTABLE_CACHE)
+    static_assets = {
+        f"app.{stylesheet_asset.fingerprint}.css": stylesheet_asset,
+        f"app.{script_asset.fingerprint}.js": script_asset
+    }
+    index_page = PrecompressedAsset(
+        app.jinja_env.from_string(HTML_TEMPLATE).render(
+            assistantname=Assistantname,
+            stylesheet_url=f"/assets/app.{stylesheet_asset.fingerprint}.css",
+            script_url=f"/assets/app.{script_asset.fingerprint}.js",
+            socketio_url=vendored_url("socket.io.min.js") or SOCKETIO_CDN,
+            fontawesome_url=vendored_url("css/all.min.css") or FONTAWESOME_CDN
+        ),
+        "text/html; charset=utf-8",
+        PAGE_CACHE
+    )
+    return static_assets, index_page
+
 def index():
-    return render_template_string(HTML_TEMPLATE, assistantname=Assistantname)
+    return index_page.response()
+
+def static_asset(name):
+    asset = static_assets.get(name)
+    if asset is None:
+        abort(404)
+    return asset.response()
+
+def vendor_asset(filename):
+    if not VendorDir:
+        abort(404)
+    # URLs carry a content fingerprint, so vendored files can be cached for good
+    response = send_from_directory(os.path.abspath(VendorDir), filename, max_age=31536000)
+    response.cache_control.immutable = True
+    return response
+
+def stats():
+    return jsonify({
+        'conversations': conversations.stats(),
+        'summaries': summarizer.stats() if summarizer else None,
+        'response_cache': response_cache.stats() if response_cache else None,
+        'semantic_cache': semantic_cache.stats() if semantic_cache else None,
+        'single_flight': single_flight.stats() if single_flight else None,
+        'scheduler': scheduler.stats(),
+        'routing': router.stats(),
+        'transport': transport.stats(),
+        'payloads': chatbot.payloads.stats(),
+        'sessions': sessions.stats(),
+        'generations': generations.stats(),
+        'admission': admission.stats() if admission else None
+    })
+
+def prometheus_metrics():
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+def liveness():
+    # Answers whenever the server can handle requests at all; dependencies are for /readyz
+    return jsonify({'status': 'ok', 'uptime_seconds': round(time.time() - health.started)})
+
+def readiness():
+    # Results of the last background checks, so a slow upstream never slows this down
+    report = health.report()
+    return jsonify(report), 200 if report['ready'] else 503
+
+def session_history(session_id):
+    # The conversation token is the credential, as it is for resuming over Socket.IO
+    if not SessionRegistry.TOKEN_PATTERN.match(session_id) or not conversations.last_seq(session_id):
+        abort(404)
+    try:
+        page = history_page(session_id, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(page, session=session_id))
 
-@socketio.on('connect')
-def handle_connect():
-    print(f'✅ User connected: {request.sid}')
+def export_sessions():
+    """Every conversation as NDJSON, streamed with chunked encoding (gzip if accepted)"""
+    if not ExportToken:
+        abort(404)
+    supplied = request.headers.get('Authorization', '')
+    if not secrets.compare_digest(supplied.encode(), f'Bearer {ExportToken}'.encode()):
+        return jsonify({'error': 'a valid ExportToken bearer token is required'}), 401
+    compress = request.accept_encodings.quality('gzip') > 0
+    headers = {
+        'Cache-Control': 'no-store',
+        'Content-Disposition': 'attachment; filename="history.ndjson"',
+        'Vary': 'Accept-Encoding'
+    }
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    body = export_history(conversations, compress=compress, pause=socketio.sleep)
+    return Response(body, mimetype='application/x-ndjson', headers=headers)
+
+def handle_connect(auth=None):
+    active_sockets.inc()
+    token, resumed = sessions.attach(request.sid, (auth or {}).get('session'))
+    join_room(token)
+    log_event("socket_connected", session=token, sid=request.sid, resumed=resumed)
+    emit('session', {'token': token, 'resumed': resumed, 'last_seq': conversations.last_seq(token)})
     emit('status', {'msg': f'Connected to {Assistantname}!'})
 
-@socketio.on('disconnect')
 def handle_disconnect():
-    print(f'❌ User disconnected: {request.sid}')
+    token = sessions.detach(request.sid)
+    log_event("socket_disconnected", session=token, sid=request.sid)
+    active_sockets.dec()
+    # Nobody is left to read the reply (tabs on other workers aren't seen, but resume from history)
+    if token is not None and not sessions.connected(token):
+        generations.cancel(token, "disconnected", drop_queued=True)
+
+def history_page(token, data):
+    """A page of the conversation before or after the seq cursor in data (the fetch_history
+    payload or the query string); raises ValueError if the cursors aren't integers"""
+    try:
+        limit = max(1, min(int(data.get('limit') or HistoryPageSize), HistoryPageSize))
+        before = int(data['before']) if data.get('before') is not None else None
+        after = int(data['after']) if data.get('after') is not None else None
+    except (TypeError, ValueError):
+        raise ValueError('before, after and limit must be integers')
+    # One extra message tells whether there is another page
+    messages = conversations.page(token, before=before, after=after, limit=limit + 1)
+    has_more = len(messages) > limit
+    messages = messages[:limit] if after is not None else messages[-limit:]
+    return {
+        'messages': [message.to_dict() for message in messages],
+        'has_more': has_more,
+        'before': messages[0].seq if messages else before,
+        'after': messages[-1].seq if messages else after
+    }
+
+def handle_fetch_history(data):
+    """Return a page of the conversation (via the ack) before or after a seq cursor"""
+    try:
+        return history_page(sessions.conversation(request.sid), data or {})
+    except ValueError as e:
+        return {'error': str(e)}
+
+def handle_reset_session():
+    """Clear the chat: drop the conversation and move every tab of it to a new token"""
+    generations.cancel(sessions.conversation(request.sid), "reset", drop_queued=True)
+    old_token, new_token, moved = sessions.reset(request.sid)
+    for sid in moved:
+        leave_room(old_token, sid=sid)
+        join_room(new_token, sid=sid)
+    socketio.emit('session', {'token': new_token, 'resumed': False, 'last_seq': 0, 'reset': True}, to=new_token)
+
+def handle_cancel_generation(data=None):
+    """Stop button: abort the reply being generated for this conversation (queued messages still run)"""
+    return {'cancelled': generations.cancel(sessions.conversation(request.sid), "stopped") is not None}
 
-@socketio.on('user_message')
 def handle_message(data):
     user_message = data['message']
-    user_id = request.sid
+    user_id = sessions.conversation(request.sid)
+    
+    log_event("message_received", session=user_id, content=user_message)
+    messages_total.inc()
     
-    print(f'📨 Message from {user_id}: {user_message}')
+    # Replies are generated in a background task, one at a time per conversation and in order
+    status, generation, position = generations.submit(
+        user_id, user_message, "stream" if StreamResponses else "full", process_message
+    )
+    if status == "rejected":
+        log_event("message_rejected", logging.WARNING, session=user_id, queued=position)
+        return {'status': status, 'queued': position}
+    if generation.started is None:
+        # Every tab of the conversation shows the message waiting (it was the newest, so position is the depth)
+        socketio.emit('message_queued', {'id': generation.id, 'position': position, 'queued': position}, to=user_id)
+    return {'status': status, 'id': generation.id, 'position': position}
+
+def process_message(generation):
+    """Admit one message past the admission controller, then generate its reply"""
+    if admission is None:
+        generate_reply(generation)
+        return
+    try:
+        admission_ticket = admission.acquire()
+    except ServerBusy as busy:
+        # A fast, explicit refusal instead of a reply that would time out
+        log_event("server_busy", logging.WARNING, session=generation.conversation,
+                  reason=busy.reason, retry_after=busy.retry_after)
+        socketio.emit('server_busy', {'reason': busy.reason, 'retry_after': busy.retry_after},
+                      to=generation.conversation)
+        return
+    admitted = time.perf_counter()
+    try:
+        generate_reply(generation)
+    finally:
+        # Time to the first output is the latency signal the limit adapts to
+        latency = generation.first_output - admitted if generation.first_output else None
+        admission.release(admission_ticket, latency)
+
+def generate_reply(generation):
+    """Generate the AI reply for one message and emit it to every socket of the conversation"""
+    user_message = generation.message
+    user_id = generation.conversation
+    received = generation.received
+    if StreamResponses:
+        # Send each chunk as it arrives, then mark the reply as complete
+        # closing() releases the upstream slot and HTTP stream even if an emit fails
+        first_chunk = True
+        with closing(chatbot.stream_ai_response(user_message, user_id)) as chunks:
+            for chunk in chunks:
+                if generation.cancelled:
+                    # Without green threads the cancel can only be noticed here
+                    return
+                generation.streamed += len(chunk)
+                if first_chunk:
+                    generation.first_output = time.perf_counter()
+                    time_to_first_token.observe(generation.first_output - received)
+                    first_chunk = False
+                socketio.emit('ai_response_chunk', {'chunk': chunk}, to=user_id)
+                # Yield to the server so the chunk is flushed now rather than with the whole reply
+                socketio.sleep(0)
+        
+        # seq lets the client fetch only what it missed after a reconnect
+        socketio.emit('ai_response_done', {
+            'timestamp': datetime.now().strftime('%H:%M:%S'),
+            'seq': conversations.last_seq(user_id)
+        }, to=user_id)
+        handler_latency.observe(time.perf_counter() - received, "stream")
+        return
     
     # Get AI response
     ai_response = chatbot.get_ai_response(user_message, user_id)
+    generation.first_output = time.perf_counter()
+    if generation.cancelled:
+        return
     
     # Send response back to client
-    emit('ai_response', {
+    socketio.emit('ai_response', {
         'message': ai_response,
-        'timestamp': datetime.now().strftime('%H:%M:%S')
-    })
+        'timestamp': datetime.now().strftime('%H:%M:%S'),
+        'seq': conversations.last_seq(user_id)
+    }, to=user_id)
+    handler_latency.observe(time.perf_counter() - received, "full")
 
-if __name__ == '__main__':
-    print("🚀 Starting Groq AI Chatbot...")
-    print(f"🤖 Assistant Name: {Assistantname}")
-    print(f"👤 User Name: {Username}")
-    print("🌐 Access at: http://localhost:5000")
+# Built by create_app()
+app = socketio = None
+conversations = context_builder = router = transport = summarizer = response_cache = None
+semantic_cache = single_flight = scheduler = admission = chatbot = sessions = generations = health = None
+static_assets = index_page = None
+
+ROUTES = [
+    ('/', index),
+    ('/assets/<name>', static_asset),
+    ('/vendor/<path:filename>', vendor_asset),
+    ('/api/stats', stats),
+    ('/api/sessions/export', export_sessions),
+    ('/api/sessions/<session_id>/history', session_history),
+    ('/metrics', prometheus_metrics),
+    ('/healthz', liveness),
+    ('/readyz', readiness)
+]
+
+SOCKET_EVENTS = [
+    ('connect', handle_connect),
+    ('disconnect', handle_disconnect),
+    ('fetch_history', handle_fetch_history),
+    ('reset_session', handle_reset_session),
+    ('cancel_generation', handle_cancel_generation),
+    ('user_message', handle_message)
+]
+
+def create_app():
+    """Application factory: patch for eventlet, import the web and Groq libraries, then build
+    the Flask app, the Socket.IO server and every component from the settings.
+    
+    Nothing talks to Groq here; the client is created on first use and
+    start_background_tasks() begins the warmup and health checks. Raises
+    StartupError if a required package is missing. Later calls return the
+    same app.
+    """
+    global app, socketio, conversations, context_builder, router, transport, summarizer, response_cache
+    global semantic_cache, single_flight, scheduler, admission, chatbot, sessions, generations, health
+    global static_assets, index_page
+    if app is not None:
+        return app
+    patch_stdlib()
+    import_dependencies()
+    setup_logging()
+    
+    print("🤖 Initializing Groq chatbot...")
+    app = Flask(__name__)
+    socketio = SocketIO(app, cors_allowed_origins="*", message_queue=MessageQueue)
+    if WorkerID is not None:
+        # Session ids start with the worker index so the supervisor can route follow-up requests
+        generate_id = socketio.server.eio.generate_id
+        socketio.server.eio.generate_id = lambda: f"{WorkerID}.{generate_id()}"
+    
+    # Store conversation history
+    conversations = create_conversation_store()
+    context_builder = ContextBuilder(
+        prompt_budget=PromptTokenBudget,
+        context_window=ContextWindow,
+        max_messages=ContextMaxMessages
+    )
+    router = create_model_router()
+    transport = UpstreamTransport(
+        pool_size=PoolSize,
+        keepalive_connections=KeepAliveConnections,
+        keepalive_expiry=KeepAliveExpiry,
+        connect_timeout=ConnectTimeout,
+        read_timeout=ReadTimeout,
+        http2=UseHTTP2
+    )
+    summarizer = ConversationSummarizer(
+        spawn=socketio.start_background_task,
+        min_messages=SummaryMinMessages,
+        max_tokens=SummaryMaxTokens
+    ) if SummarizeHistory else None
+    response_cache = ResponseCache(
+        max_entries=ResponseCacheSize,
+        ttl=ResponseCacheTTL,
+        path=ResponseCachePath
+    ) if ResponseCacheMode != "off" else None
+    semantic_cache = create_semantic_cache()
+    single_flight = SingleFlight(spawn=socketio.start_background_task) if CoalesceRequests else None
+    scheduler = UpstreamScheduler(
+        requests_per_minute=RequestsPerMinute,
+        tokens_per_minute=TokensPerMinute,
+        max_retries=UpstreamMaxRetries,
+        notify=lambda session_id, status: socketio.emit('queue_status', status, to=session_id)
+    )
+    admission = AdmissionController(
+        min_limit=AdmissionMinLimit,
+        max_limit=MaxInflightRequests,
+        max_wait=AdmissionMaxWait,
+        target=AdmissionQueueTarget
+    ) if AdmissionControl else None
+    chatbot = GroqChatBot(
+        conversations,
+        context_builder,
+        router,
+        summarizer=summarizer,
+        response_cache=response_cache,
+        cache_mode=ResponseCacheMode,
+        semantic_cache=semantic_cache,
+        single_flight=single_flight,
+        scheduler=scheduler,
+        transport=transport,
+        admission=admission
+    )
+
+    sessions = SessionRegistry(
+        conversations,
+        resume_ttl=SessionResumeTTL,
+        summarizer=summarizer,
+        collect_orphans=Workers <= 1
+    )
+
+    generations = GenerationRegistry(
+        socketio.start_background_task,
+        max_queued=MessageQueueDepth,
+        shed_policy=MessageShedPolicy,
+        notify=lambda conversation, event, data: socketio.emit(event, data, to=conversation),
+        expected_tokens=completion_tokens.mean,
+        expected_seconds=handler_latency.mean
+    )
+
+    # Gauges read from the components' own counters when /metrics is scraped
+    metrics.callback_gauge(
+        "chatbot_conversation_sessions", "Sessions in the conversation store",
+        lambda: conversations.stats()["sessions"]
+    )
+    metrics.callback_gauge(
+        "chatbot_conversation_messages", "Messages in the conversation store",
+        lambda: conversations.stats()["messages"]
+    )
+    metrics.callback_gauge(
+        "chatbot_conversation_bytes", "Approximate size of the conversation store in bytes",
+        lambda: conversations.stats()["approx_bytes"]
+    )
+    metrics.callback_gauge(
+        "chatbot_cache_hit_ratio", "Hit rate of the reply caches", lambda: {
+            name: cache.stats()["hit_rate"]
+            for name, cache in [("response", response_cache), ("semantic", semantic_cache), ("payload", chatbot.payloads)]
+            if cache is not None
+        }, label="cache"
+    )
+    metrics.callback_gauge(
+        "chatbot_log_records_dropped", "Log records dropped because the log queue was full",
+        lambda: log_handler.dropped
+    )
+    metrics.callback_gauge(
+        "chatbot_upstream_queue_depth", "Requests waiting for the upstream rate budget",
+        lambda: scheduler.stats()["queue_depth"]
+    )
+    metrics.callback_gauge(
+        "chatbot_admission_limit", "Current adaptive limit on replies in progress",
+        lambda: admission.stats()["limit"] if admission else {}
+    )
+    metrics.callback_gauge(
+        "chatbot_admission_in_flight", "Replies and background calls holding an admission slot",
+        lambda: admission.stats()["in_flight"] if admission else {}
+    )
+    metrics.callback_gauge(
+        "chatbot_message_queue_depth", "Messages waiting behind their conversation's reply in progress",
+        generations.depth
+    )
+    
+    health = HealthMonitor({
+        'store': conversations.ping,
+        'upstream': chatbot.check_upstream
+    }, stale_after=HealthCheckInterval * 3)
+    
+    static_assets, index_page = build_pages(app)
+    for rule, view in ROUTES:
+        app.add_url_rule(rule, view_func=view)
+    for event, handler in SOCKET_EVENTS:
+        socketio.on_event(event, handler)
+    return app
+
+def start_background_tasks():
+    """Warm up upstream connections and start the periodic sweeps, pings and health checks"""
+    socketio.start_background_task(chatbot.warm_up, WarmupConnections)
+    socketio.start_background_task(sessions.collect_loop, 60, socketio.sleep)
+    socketio.start_background_task(health.loop, HealthCheckInterval, socketio.sleep)
+    if KeepAlivePingInterval:
+        socketio.start_background_task(chatbot.keep_alive, KeepAlivePingInterval)
+
+class StickyProxy:
+    """TCP front end for the worker processes.
+    
+    Engine.IO session ids carry the index of the worker that created them, so
+    requests for an existing session (polling or the websocket upgrade) go
+    back to that worker; new sessions go to the worker with the fewest open
+    connections. Plain HTTP requests are forced to one request per connection
+    so a reused keep-alive connection can't carry another session's request
+    to the wrong worker.
+    """
+    
+    SID_WORKER = re.compile(rb"[?&]sid=(\d+)\.")
+    MAX_HEADER_BYTES = 65536
+    
+    def __init__(self, worker_ports):
+        self.worker_ports = worker_ports
+        self.active = [0] * len(worker_ports)
+        self.routed = 0
+        self.unroutable = 0
+    
+    def pick_worker(self, request_line):
+        match = self.SID_WORKER.search(request_line)
+        if match and int(match.group(1)) < len(self.worker_ports):
+            return int(match.group(1))
+        # Least open connections, starting the scan after the last pick so ties rotate
+        count = len(self.worker_ports)
+        order = [(self.routed + offset) % count for offset in range(count)]
+        return min(order, key=lambda index: self.active[index])
+    
+    @staticmethod
+    def close_after_response(head):
+        """Rewrite the request headers to ask the worker to close the connection after replying"""
+        headers, _, rest = head.partition(b"\r\n\r\n")
+        lines = [
+            line for line in headers.split(b"\r\n")
+            if not line.lower().startswith((b"connection:", b"keep-alive:"))
+        ]
+        lines.append(b"Connection: close")
+        return b"\r\n".join(lines) + b"\r\n\r\n" + rest
+    
+    @staticmethod
+    def pipe(source, target):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                target.sendall(data)
+        except OSError:
+            pass
+        finally:
+            # Half-close so the other direction can finish its response
+            try:
+                target.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+    
+    def handle(self, client):
+        upstream = None
+        worker = None
+        try:
+            head = b""
+            while b"\r\n\r\n" not in head:
+                data = client.recv(65536)
+                if not data or len(head) > self.MAX_HEADER_BYTES:
+                    return
+                head += data
+            request_line = head.split(b"\r\n", 1)[0]
+            worker = self.pick_worker(request_line)
+            if b"upgrade: websocket" not in head.lower():
+                head = self.close_after_response(head)
+            try:
+                upstream = eventlet.connect(("127.0.0.1", self.worker_ports[worker]))
+            except OSError:
+                self.unroutable += 1
+                client.sendall(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                return
+            self.active[worker] += 1
+            self.routed += 1
+            upstream.sendall(head)
+            reader = eventlet.spawn(self.pipe, upstream, client)
+            self.pipe(client, upstream)
+            reader.wait()
+        except OSError:
+            pass
+        finally:
+            if upstream is not None:
+                self.active[worker] -= 1
+                upstream.close()
+            client.close()
+    
+    def serve(self, host, port):
+        listener = eventlet.listen((host, port), backlog=2048)
+        pool = eventlet.GreenPool(100000)
+        while True:
+            client, _ = listener.accept()
+            pool.spawn_n(self.handle, client)
+
+class WorkerSupervisor:
+    """Starts Workers copies of this app on Port+1..Port+Workers and restarts any that exit"""
+    
+    def __init__(self, workers, base_port):
+        self.ports = [base_port + 1 + index for index in range(workers)]
+        self.processes = [None] * workers
+        self.restarts = 0
+    
+    def start_worker(self, index):
+        env = dict(os.environ, CHATBOT_WORKER_ID=str(index), CHATBOT_WORKER_PORT=str(self.ports[index]))
+        self.processes[index] = subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env)
+    
+    def monitor(self):
+        while True:
+            eventlet.sleep(1)
+            for index, process in enumerate(self.processes):
+                if process.poll() is not None:
+                    print(f"⚠ Worker {index} exited with code {process.returncode}, restarting")
+                    self.restarts += 1
+                    self.start_worker(index)
+    
+    def stop(self, *args):
+        # Runs as a signal handler inside the event loop, so nothing here may block
+        for process in self.processes:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        log_writer.stop()
+        os._exit(0)
+    
+    def run(self, host, port):
+        for index in range(len(self.ports)):
+            self.start_worker(index)
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        eventlet.spawn_n(self.monitor)
+        print(f"🧩 Routing sessions across {len(self.ports)} workers on ports {self.ports[0]}-{self.ports[-1]}")
+        StickyProxy(self.ports).serve(host, port)
+
+class BatchRunner:
+    """Offline bulk inference: answers every prompt in a JSONL file and appends the
+    results to an output JSONL file in the order they complete.
+    
+    Rows are read only as fast as they are answered and at most `window` of
+    them are tracked at once, so memory stays flat however long the file
+    is. A checkpoint next to the output records the first unfinished line
+    and its byte offset, the finished lines after it and the length of the
+    output. A resumed run cuts the output back to that length, seeks past
+    the finished prefix and skips the other finished lines, so no row is
+    answered or written twice.
+    """
+    
+    CHECKPOINT_INTERVAL = 1.0  # seconds
+    PROGRESS_INTERVAL = 10.0  # seconds
+    
+    def __init__(self, answer, input_path, output_path, concurrency=8, window=None,
+                 prompt_field="prompt", id_field="id"):
+        self.answer = answer
+        self.input_path = os.path.abspath(input_path)
+        self.output_path = output_path
+        self.checkpoint_path = output_path + ".checkpoint"
+        self.concurrency = concurrency
+        self.window = window or concurrency * 8
+        self.prompt_field = prompt_field
+        self.id_field = id_field
+        self.lock = threading.Lock()
+        self.slots = threading.Semaphore(self.window)
+        self.work = Queue(concurrency)
+        self.stopping = threading.Event()
+        # line index -> [byte offset, finished], oldest first
+        self.tracked = OrderedDict()
+        self.next_line = 0
+        self.next_offset = 0
+        self.output = None
+        self.answered = 0
+        self.errors = 0
+        self.skipped = 0
+        self.last_checkpoint = self.last_progress = time.perf_counter()
+    
+    def load_checkpoint(self):
+        """Return the saved state, or None for a fresh run; raises StartupError if the
+        output exists but can't be resumed"""
+        try:
+            with open(self.checkpoint_path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            if os.path.exists(self.output_path) and os.path.getsize(self.output_path):
+                raise StartupError(f"{self.output_path} already exists without a checkpoint; "
+                                   "remove it or choose another output file")
+            return None
+        if state.get("input") != self.input_path:
+            raise StartupError(f"{self.checkpoint_path} belongs to {state.get('input')}, not {self.input_path}")
+        return state
+    
+    def save_checkpoint(self):
+        # Called with the lock held, so the output and the tracked lines agree
+        if self.tracked:
+            line, (offset, _) = next(iter(self.tracked.items()))
+        else:
+            line, offset = self.next_line, self.next_offset
+        state = {
+            "input": self.input_path,
+            "line": line,
+            "offset": offset,
+            "finished": [index for index, (_, finished) in self.tracked.items() if finished],
+            "output_bytes": self.output.tell()
+        }
+        temporary = self.checkpoint_path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(state, f)
+        os.replace(temporary, self.checkpoint_path)
+        self.last_checkpoint = time.perf_counter()
+    
+    def track(self, index, offset, end_offset, finished=False):
+        """Register a line just read; blocks while the window is full and returns
+        False if the run is stopped meanwhile"""
+        while not self.slots.acquire(timeout=0.5):
+            if self.stopping.is_set():
+                return False
+        with self.lock:
+            self.tracked[index] = [offset, finished]
+            self.next_line, self.next_offset = index + 1, end_offset
+            if finished:
+                self._advance()
+        return True
+    
+    def finish(self, index, row):
+        data = (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+        with self.lock:
+            self.output.write(data)
+            self.output.flush()
+            if "error" in row:
+                self.errors += 1
+            else:
+                self.answered += 1
+            self.tracked[index][1] = True
+            self._advance()
+            now = time.perf_counter()
+            if now - self.last_checkpoint >= self.CHECKPOINT_INTERVAL:
+                self.save_checkpoint()
+            if now - self.last_progress >= self.PROGRESS_INTERVAL:
+                self.last_progress = now
+                print(f"⏳ {self.answered + self.errors} rows done ({self.errors} errors), "
+                      f"{len(self.tracked)} in progress")
+    
+    def _advance(self):
+        # Forget finished lines at the front, freeing their window slots
+        while self.tracked:
+            index, (_, finished) = next(iter(self.tracked.items()))
+            if not finished:
+                break
+            self.tracked.popitem(last=False)
+            self.slots.release()
+    
+    def process(self, index, raw):
+        """Answer one input line, returning the output row (with an error instead of a reply on failure)"""
+        row = {"line": index + 1}
+        started = time.perf_counter()
+        try:
+            record = json.loads(raw)
+            if isinstance(record, dict):
+                if self.id_field in record:
+                    row["id"] = record[self.id_field]
+                prompt = record.get(self.prompt_field)
+            else:
+                prompt = record
+            if not isinstance(prompt, str) or not prompt.strip():
+                raise ValueError(f"no '{self.prompt_field}' text in the row")
+            row["reply"] = self.answer(prompt)
+        except Exception as e:
+            row["error"] = f"{type(e).__name__}: {e}"
+        row["seconds"] = round(time.perf_counter() - started, 3)
+        return row
+    
+    def worker(self):
+        while True:
+            item = self.work.get()
+            if item is None:
+                return
+            if self.stopping.is_set():
+                # Left unfinished in the checkpoint, so it is answered on resume
+                continue
+            index, raw = item
+            self.finish(index, self.process(index, raw))
+    
+    def stop(self, *args):
+        # Runs as a signal handler in whichever green thread happens to be current,
+        # so it only sets a flag; raising KeyboardInterrupt there would kill a worker
+        if not self.stopping.is_set():
+            print("⏸ Stopping after the rows in flight, press Ctrl+C again to quit now")
+            self.stopping.set()
+        else:
+            os._exit(130)
+    
+    def run(self):
+        """Answer every unfinished row; returns False if interrupted (the checkpoint is saved)"""
+        state = self.load_checkpoint()
+        finished_ahead = set()
+        output_bytes = 0
+        if state is not None:
+            self.next_line, self.next_offset = state["line"], state["offset"]
+            finished_ahead = set(state["finished"])
+            output_bytes = state["output_bytes"]
+            print(f"↩ Resuming {self.input_path} from line {self.next_line + 1}")
+        
+        # Anything written after the last checkpoint is answered again, so it is cut off
+        self.output = open(self.output_path, "ab")
+        self.output.truncate(output_bytes)
+        self.output.seek(output_bytes)
+        workers = [threading.Thread(target=self.worker, daemon=True) for _ in range(self.concurrency)]
+        for t in workers:
+            t.start()
+        previous = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            with open(self.input_path, "rb") as source:
+                source.seek(self.next_offset)
+                index = self.next_line
+                while not self.stopping.is_set():
+                    offset = source.tell()
+                    raw = source.readline()
+                    if not raw:
+                        break
+                    if index in finished_ahead or not raw.strip():
+                        if index in finished_ahead:
+                            finished_ahead.discard(index)
+                            self.skipped += 1
+                        tracked = self.track(index, offset, source.tell(), finished=True)
+                    else:
+                        tracked = self.track(index, offset, source.tell())
+                        if tracked:
+                            self.work.put((index, raw))
+                    if not tracked:
+                        break
+                    index += 1
+            # Workers finish the rows they are answering and drop anything still queued
+            for _ in workers:
+                self.work.put(None)
+            for t in workers:
+                t.join()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            with self.lock:
+                self.save_checkpoint()
+                self.output.close()
+        return not self.stopping.is_set()
+
+def run_batch(argv):
+    """`python main.py batch in.jsonl out.jsonl`: answer every prompt in a JSONL file"""
+    parser = argparse.ArgumentParser(
+        prog="main.py batch",
+        description="Answer every prompt in a JSONL file, appending results to another JSONL file "
+                    "in completion order. Rerun the same command to resume an interrupted run."
+    )
+    parser.add_argument("input", help="JSONL file, one JSON object (or string) per line")
+    parser.add_argument("output", help="JSONL file the results are appended to")
+    parser.add_argument("--concurrency", type=int, default=MaxInflightRequests,
+                        help="prompts answered at once (default: MaxInflightRequests)")
+    parser.add_argument("--window", type=int, default=None,
+                        help="most rows tracked at once, in flight or waiting for earlier rows (default: 8 x concurrency)")
+    parser.add_argument("--prompt-field", default="prompt", help="key holding the prompt text")
+    parser.add_argument("--id-field", default="id", help="key copied to each result to identify it")
+    args = parser.parse_args(argv)
+    
+    create_app()
+    runner = BatchRunner(
+        chatbot.answer_prompt,
+        args.input,
+        args.output,
+        concurrency=max(1, args.concurrency),
+        window=args.window,
+        prompt_field=args.prompt_field,
+        id_field=args.id_field
+    )
+    tokens_before = prompt_tokens.total(), completion_tokens.total()
+    print(f"📦 Answering {args.input} with {runner.concurrency} at a time")
+    started = time.perf_counter()
+    completed = runner.run()
+    elapsed = time.perf_counter() - started
+    
+    rows = runner.answered + runner.errors
+    used_prompt = round(prompt_tokens.total() - tokens_before[0])
+    used_completion = round(completion_tokens.total() - tokens_before[1])
+    log_event("batch_finished" if completed else "batch_interrupted", input=runner.input_path,
+              rows=rows, errors=runner.errors, skipped=runner.skipped, seconds=round(elapsed, 3),
+              prompt_tokens=used_prompt, completion_tokens=used_completion)
+    print(f"{'✅ Batch complete' if completed else '⏸ Batch interrupted'}: {runner.answered} rows answered, "
+          f"{runner.errors} errors, {runner.skipped} already done")
+    print(f"⏱ {elapsed:.1f}s, {rows / elapsed if elapsed else 0:.1f} rows/s")
+    print(f"🔢 {used_prompt} prompt + {used_completion} completion tokens "
+          f"({(used_prompt + used_completion) / elapsed if elapsed else 0:.0f} tokens/s)")
+    if not completed:
+        print(f"↩ Run the same command again to resume from {runner.checkpoint_path}")
+        return 130
+    return 0
+
+def main():
+    if not GroqAPIKey:
+        print("❌ GroqAPIKey not found in .env file")
+        sys.exit(1)
+    
+    if sys.argv[1:2] == ["batch"]:
+        try:
+            sys.exit(run_batch(sys.argv[2:]))
+        except StartupError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+    
+    if WorkerID is None and Workers > 1:
+        # The supervisor only routes connections, so it never loads the web or Groq libraries
+        patch_stdlib()
+        if eventlet is None:
+            print("❌ Workers > 1 needs eventlet: pip install eventlet")
+            sys.exit(1)
+        setup_logging()
+        print("🚀 Starting Groq AI Chatbot...")
+        print(f"🌐 Access at: http://localhost:{Port}")
+        WorkerSupervisor(Workers, Port).run(Host, Port)
+    
+    try:
+        create_app()
+    except StartupError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    
+    if WorkerID is None:
+        print("🚀 Starting Groq AI Chatbot...")
+        print(f"🤖 Assistant Name: {Assistantname}")
+        print(f"👤 User Name: {Username}")
+        print(f"🌐 Access at: http://localhost:{Port}")
+    else:
+        print(f"🧩 Worker {WorkerID} listening on port {WorkerPort}")
+    
+    start_background_tasks()
     
     try:
-        socketio.run(app, debug=True, host='0.0.0.0', port=5000)
+        if WorkerID is None:
+            socketio.run(app, debug=Debug, host=Host, port=Port)
+        else:
+            # Workers only accept connections from the supervisor and never run the reloader
+            socketio.run(app, debug=Debug, host="127.0.0.1", port=WorkerPort, use_reloader=False)
     except Exception as e:
         print(f"❌ Server error: {e}")
-        input("Press Enter to exit...")
\ No newline at end of file
+        input("Press Enter to exit...")
+
+if __name__ == '__main__':
+    main()